@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+import aiohttp
+
+from cards import Path
+
+ASSET_BASE_URL = os.environ.get('asset_base_url', "https://raw.githubusercontent.com/ShardlessBun/glorybound_cards/")
+ASSET_VERSION = os.environ.get('asset_version', 'v2.2.1')  # Tag (or branch) of the card art repository
+
+
+def asset_url(card_name: str, path_name: str, version: str = ASSET_VERSION, base_url: str = ASSET_BASE_URL) -> str:
+    return f"{base_url}{quote(version)}/{quote(path_name)}/{quote(card_name)}.png"
+
+
+class AssetResolver(object):
+    """
+    Image URLs for every card and path of one art version, quoted once when the catalog is loaded.
+
+    Paths are stored under their own name as the card name, which is how the path images are laid out in the art
+    repository.
+    """
+    version: str
+    base_url: str
+    _urls: Dict[Tuple[str, str], str]  # (path name, card name) -> url
+
+    def __init__(self, paths: Iterable[Path], version: str = ASSET_VERSION, base_url: str = ASSET_BASE_URL):
+        self.version = version
+        self.base_url = base_url
+        self._urls = {}
+        for path in paths:
+            for name in [path.name] + [c.name for c in path.cards]:
+                self._urls[(path.name, name)] = asset_url(name, path.name, version, base_url)
+
+    def __len__(self):
+        return len(self._urls)
+
+    def url(self, card_name: str, path_name: str) -> str:
+        url = self._urls.get((path_name, card_name))
+        if url is None:
+            url = asset_url(card_name, path_name, self.version, self.base_url)
+        return url
+
+    def urls(self) -> Dict[Tuple[str, str], str]:
+        return dict(self._urls)
+
+    async def verify(self, session: aiohttp.ClientSession = None, concurrency: int = 32,
+                     timeout: float = 10) -> Dict[Tuple[str, str], Union[int, str]]:
+        """
+        Sends a HEAD request for every URL, `concurrency` at a time over one pooled session
+
+        :param session: Session to reuse, a new one is opened (and closed) when omitted
+        :param concurrency: Maximum number of requests in flight
+        :param timeout: Seconds before a single request counts as failed
+        :return: The missing assets, (path name, card name) -> HTTP status or error message
+        """
+        if session is None:
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+                return await self.verify(session, concurrency, timeout)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+        async def check(url: str) -> Optional[Union[int, str]]:
+            async with semaphore:
+                try:
+                    async with session.head(url, allow_redirects=True, timeout=client_timeout) as response:
+                        return None if response.status < 400 else response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    return f"{type(e).__name__}: {e}"
+
+        keys = list(self._urls)
+        results = await asyncio.gather(*(check(self._urls[key]) for key in keys))
+        missing = {key: result for key, result in zip(keys, results) if result is not None}
+        if missing:
+            logging.warning(f"{len(missing)} of {len(keys)} card images are missing for art version {self.version}")
+        else:
+            logging.info(f"All {len(keys)} card images found for art version {self.version}")
+        return missing
+
+
+def report_missing(missing: Dict[Tuple[str, str], Union[int, str]]) -> List[str]:
+    return [f"{path_name}/{card_name}: {reason}" for (path_name, card_name), reason in sorted(missing.items())]
+
+
+if __name__ == '__main__':
+    from catalog import load_paths
+
+    parser = argparse.ArgumentParser(description="Check that every card and path has an image")
+    parser.add_argument('--version', default=ASSET_VERSION, help="Art version to check")
+    parser.add_argument('--base-url', default=ASSET_BASE_URL, help="Base URL of the art repository")
+    parser.add_argument('--concurrency', type=int, default=32, help="Maximum number of requests in flight")
+    args = parser.parse_args()
+
+    resolver = AssetResolver(load_paths(), args.version, args.base_url)
+    missing = asyncio.run(resolver.verify(concurrency=args.concurrency))
+    for line in report_missing(missing):
+        print(line)
+    print(f"{len(missing)} of {len(resolver)} images missing")
+    raise SystemExit(1 if missing else 0)
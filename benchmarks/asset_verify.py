@@ -0,0 +1,72 @@
+"""
+Verifies every card image URL of the catalog against a local stand-in for the art repository.
+
+An aiohttp server answers the HEAD requests after a simulated latency, with a 404 for every tenth image, and counts the
+requests in flight. AssetResolver.verify runs at several concurrency limits; for each one this reports the time taken,
+the most requests seen in flight at once, and checks that exactly the missing images were reported.
+
+Run from the repository root: python -m benchmarks.asset_verify [--latency 0.02]
+"""
+import argparse
+import asyncio
+from timeit import default_timer as timer
+from urllib.parse import unquote
+
+from aiohttp import web
+
+from assets import AssetResolver
+from catalog import load_paths
+
+
+class ArtServer(object):
+    def __init__(self, missing: set, latency: float):
+        self.missing = missing
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return web.Response(status=404 if request.path in self.missing else 200)
+        finally:
+            self.in_flight -= 1
+
+
+async def main(latency: float):
+    paths = load_paths()
+    urls = AssetResolver(paths, 'v1', 'http://test/').urls()
+    expected = set(sorted(urls)[::10])
+    server = ArtServer({unquote(urls[key][len('http://test'):]) for key in expected}, latency)
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    resolver = AssetResolver(paths, 'v1', f"http://127.0.0.1:{port}/")
+    print(f"{len(resolver)} images, {len(expected)} missing, {latency * 1e3:.0f}ms per request")
+    print(f"{'concurrency':>12}{'seconds':>10}{'max in flight':>15}{'reported':>10}")
+    try:
+        for concurrency in (1, 8, 32):
+            server.max_in_flight = 0
+            start = timer()
+            missing = await resolver.verify(concurrency=concurrency)
+            elapsed = timer() - start
+            assert set(missing) == expected and set(missing.values()) == {404}
+            assert server.max_in_flight <= concurrency
+            print(f"{concurrency:>12}{elapsed:>10.2f}{server.max_in_flight:>15}{len(missing):>10}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Card image verification against a local server")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds the server takes to answer a request")
+    args = parser.parse_args()
+    asyncio.run(main(args.latency))
@@ -0,0 +1,77 @@
+"""
+Replays realistic partial card names through the old difflib autocomplete and through NameSearch.
+
+Every card name is typed out one keystroke at a time, along with a few misspelled variants. Reports the
+per-keystroke latency distribution of both implementations and how often the intended card is in the results.
+
+Run from the repository root: python -m benchmarks.autocomplete
+"""
+import difflib
+import random
+import statistics
+from timeit import default_timer as timer
+
+from catalog import load_paths
+from search import NameSearch
+
+paths = load_paths()
+names = [c.name for p in paths for c in p.cards]
+name_search = NameSearch(names)
+
+
+def difflib_autocomplete(card_name):
+    cards = {card.name.lower(): card.name for path in paths for card in path.cards}
+
+    if len(card_name) <= 3:
+        cutoff = 0
+    elif 3 < len(card_name) <= 6:
+        cutoff = 0.3
+    else:
+        cutoff = 0.5
+    closest = difflib.get_close_matches(card_name.lower(), list(cards.keys()), n=10, cutoff=cutoff)
+
+    filtered = list(filter(lambda c: card_name.lower() in c, closest))
+    no_matches = list(filter(lambda c: card_name.lower() not in c, closest))
+    filtered.extend(no_matches)
+    return [cards[c] for c in filtered]
+
+
+def misspell(name, rng):
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]  # Swap two neighbouring letters
+
+
+def keystrokes(rng):
+    for name in names:
+        typed = name if rng.random() < 0.8 else misspell(name, rng)
+        if rng.random() < 0.5:
+            typed = typed.lower()
+        for i in range(1, len(typed) + 1):
+            yield name, typed[:i]
+
+
+def replay(fn, inputs):
+    latencies = []
+    found = 0
+    for name, partial in inputs:
+        start = timer()
+        results = fn(partial)
+        latencies.append(timer() - start)
+        found += name in results
+    return latencies, found
+
+
+def main():
+    inputs = list(keystrokes(random.Random(0)))
+    print(f"Replaying {len(inputs)} keystrokes over {len(names)} cards")
+    for label, fn in (('difflib', difflib_autocomplete), ('NameSearch', name_search.search)):
+        latencies, found = replay(fn, inputs)
+        latencies.sort()
+        print(f"{label:<11} mean {statistics.mean(latencies) * 1e6:9.1f} us"
+              f"  p99 {latencies[int(len(latencies) * 0.99)] * 1e6:9.1f} us"
+              f"  max {latencies[-1] * 1e6:9.1f} us"
+              f"  target in results {found / len(inputs):6.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares the per-click cost of the old linear card lookups against CardIndex.
+
+Run from the repository root: python -m benchmarks.card_lookup
+"""
+import random
+import timeit
+
+from cards import CardIndex
+from catalog import load_paths
+
+paths = load_paths()
+index = CardIndex(paths)
+
+
+def linear_find_card(card_name):
+    for path in paths:
+        matches = [c for c in path.cards if c.name == card_name]
+        if len(matches) > 0:
+            return matches[0], path
+    return None, None
+
+
+def linear_pack_select(heirlooms, selected_paths, name):
+    if name in [c.name for c in heirlooms]:
+        return linear_find_card(name)[0]
+    elif name in [p.name for p in selected_paths]:
+        return next((p for p in selected_paths if p.name == name), None)
+    elif name in [c.name for p in selected_paths for c in p.cards]:
+        return linear_find_card(name)[0]
+
+
+def indexed_pack_select(heirloom_names, path_names, card_names, name):
+    if name in heirloom_names:
+        return index.find_card(name)[0]
+    elif name in path_names:
+        return index.path(name)
+    elif name in card_names:
+        return index.find_card(name)[0]
+
+
+def main(clicks: int = 100_000):
+    rng = random.Random(0)
+    names = [c.name for p in paths for c in p.cards]
+    sample = [rng.choice(names) for _ in range(clicks)]
+
+    heirlooms = rng.sample(index.path('Heirloom').cards, 3)
+    pack_paths = rng.sample([p for p in paths if p.name != 'Heirloom'], 3)
+    pack_clicks = [rng.choice([c.name for c in heirlooms] + [p.name for p in pack_paths] +
+                              [c.name for p in pack_paths for c in p.cards]) for _ in range(clicks)]
+    heirloom_names = {c.name for c in heirlooms}
+    path_names = {p.name for p in pack_paths}
+    card_names = {c.name for p in pack_paths for c in p.cards}
+
+    cases = {
+        'find_card (linear)': lambda: [linear_find_card(n) for n in sample],
+        'find_card (CardIndex)': lambda: [index.find_card(n) for n in sample],
+        'pack select (linear)': lambda: [linear_pack_select(heirlooms, pack_paths, n) for n in pack_clicks],
+        'pack select (CardIndex)': lambda: [indexed_pack_select(heirloom_names, path_names, card_names, n)
+                                            for n in pack_clicks],
+    }
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=5))
+        print(f"{name:<26} {best / clicks * 1e6:8.3f} us/click")
+
+
+if __name__ == '__main__':
+    main()
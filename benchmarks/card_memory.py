@@ -0,0 +1,88 @@
+"""
+Measures the memory held by parsed cards with the old per-instance __dict__ model and with the __slots__ model.
+
+The catalog is scaled up synthetically to at least 10k cards by repeating every card under a new name, the way reprints
+and variants of fan-made sets share their costs, types and texts. Reports bytes per card (from tracemalloc, the card
+objects and every string they own), the time to build them and the size of the pickled snapshot.
+
+Run from the repository root: python -m benchmarks.card_memory [--cards 10000]
+"""
+import argparse
+import glob
+import math
+import pickle
+import tracemalloc
+from timeit import default_timer as timer
+
+import strictyaml as yaml
+
+from cards import Card, path_schema
+
+
+class OldCard(object):
+    def __init__(self, d):
+        name, d = d.popitem()
+
+        class MyDict(dict):
+            def __missing__(self, key):
+                return None
+
+            def __getitem__(self, key):
+                val = dict.__getitem__(self, key)
+                if isinstance(val, str):
+                    return val.strip().replace('\n', '\n\n')
+                return val
+
+        d = MyDict(d)
+        self.name = name
+        self.cost = d['cost']
+        self.text = d['text']
+        self.types = [t.strip() for t in (d['types'] or [])]
+        if '\\sequence' in self.text:
+            self.types.append('sequence')
+        self.linked = d['linked']
+        self.linked_type = d['linked type']
+        self.path_card_name = d['path card name'] or self.name
+        self.linked_to = []
+        self.purchase = d['purchase']
+        self.upgrade_cost = d['upgrade cost']
+        self.upgrade = d['upgrade']
+        self.big_art = d['big art']
+
+
+def raw_cards():
+    cards = []
+    for filename in sorted(glob.glob('paths/*.yaml')):
+        with open(filename, 'r') as file:
+            cards.extend(yaml.load(file.read(), path_schema()).data['cards'])
+    return cards
+
+
+def measure(model, raw):
+    tracemalloc.start()
+    start = timer()
+    cards = [model(dict(d)) for d in raw]
+    elapsed = timer() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return cards, size, elapsed
+
+
+def main(count: int):
+    base = raw_cards()
+    copies = math.ceil(count / len(base))
+    raw = [{f"{name} {i}" if i else name: fields} for i in range(copies) for d in base for name, fields in d.items()]
+    print(f"{len(raw)} cards ({len(base)} in the catalog, repeated {copies} times)")
+    print(f"{'model':<10}{'bytes/card':>12}{'total MiB':>12}{'build ms':>12}{'pickle KiB':>12}")
+    for label, model in (('old', OldCard), ('slots', Card)):
+        cards, size, elapsed = measure(model, raw)
+        pickled = len(pickle.dumps(cards, protocol=pickle.HIGHEST_PROTOCOL))
+        print(f"{label:<10}{size / len(cards):>12.0f}{size / 2 ** 20:>12.2f}{elapsed * 1e3:>12.1f}{pickled / 1024:>12.0f}")
+        del cards
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory held by parsed cards")
+    parser.add_argument('--cards', type=int, default=10000, help="Minimum number of cards to build")
+    args = parser.parse_args()
+    main(args.cards)
@@ -0,0 +1,55 @@
+"""
+Compares answering /search queries by scanning every card against the CardSearch inverted index.
+
+The catalog is scaled up synthetically by repeating every path under a new name. The scan does what a query would
+cost without the index: it lowercases and splits every card's text and upgrade and checks each term.
+
+Run from the repository root: python -m benchmarks.card_search [--copies 20]
+"""
+import argparse
+import copy
+import timeit
+
+from catalog import load_paths
+from search import CardSearch, words
+
+QUERIES = ('attack', 'att*', 'type:permanent \\attack', 'cost:SA', 'upgrade<4', 'blocked OR recall',
+           'purchase>=3 -type:oneshot', '(\\burn OR \\drown) NOT type:innate')
+
+
+def scan(paths, terms):
+    matched = []
+    for path in paths:
+        for card in path.cards:
+            found = set(words(card.text)) | set(words(card.upgrade or ''))
+            if all(term in found for term in terms):
+                matched.append((card, path))
+    return matched
+
+
+def main(copies: int):
+    base = load_paths()
+    paths = []
+    for i in range(copies):
+        for path in base:
+            path = copy.copy(path)
+            path.name = f"{path.name} {i}" if i else path.name
+            paths.append(path)
+    count = sum(len(p.cards) for p in paths)
+    build = min(timeit.repeat(lambda: CardSearch(paths), number=1, repeat=3))
+    index = CardSearch(paths)
+    print(f"{count} cards, index built in {build * 1e3:.1f}ms")
+    print(f"{'query':<40}{'matches':>8}{'us/query':>10}")
+    for query in QUERIES:
+        number = 200
+        elapsed = min(timeit.repeat(lambda: index.search(query), number=number, repeat=3)) / number
+        print(f"{query:<40}{len(index.search(query)):>8}{elapsed * 1e6:>10.1f}")
+    elapsed = min(timeit.repeat(lambda: scan(paths, ['attack']), number=5, repeat=3)) / 5
+    print(f"{'scan: attack':<40}{len(scan(paths, ['attack'])):>8}{elapsed * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Card search with and without the inverted index")
+    parser.add_argument('--copies', type=int, default=20, help="Times the catalog is repeated")
+    args = parser.parse_args()
+    main(args.copies)
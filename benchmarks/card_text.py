@@ -0,0 +1,38 @@
+"""
+Measures rendering card text from its markup: building a catalog generation's CardText (parsing and rendering every
+text in both formats), and then serving a rendered text, against parsing and rendering it again for every view.
+
+Run from the repository root: python -m benchmarks.card_text
+"""
+import timeit
+
+import cardtext
+from catalog import load_paths
+
+
+def main():
+    paths = load_paths()
+    texts = [(source, path) for path in paths for card in path.cards for source in (card.text, card.upgrade) if source]
+    print(f"{len(texts)} texts in {len(paths)} paths")
+
+    def cold():
+        cardtext.parse.cache_clear()
+        return cardtext.CardText(paths)
+
+    cold_build = min(timeit.repeat(cold, number=1, repeat=5))
+    warm_build = min(timeit.repeat(lambda: cardtext.CardText(paths), number=1, repeat=5))
+    print(f"CardText build: {cold_build * 1e3:.1f}ms, {warm_build * 1e3:.1f}ms with the parse cache warm")
+
+    text = cardtext.CardText(paths)
+    renderer = text.renderers['markdown']
+    memoized = min(timeit.repeat(lambda: [text.markdown(s, p) for s, p in texts], number=20, repeat=3)) / 20
+    rerendered = min(timeit.repeat(
+        lambda: [renderer.render(cardtext.parse.__wrapped__(s), cardtext.definitions(p.extras))
+                 for s, p in texts], number=5, repeat=3)) / 5
+    print(f"{'markdown per view':<24}{'us/text':>10}")
+    print(f"{'memoized':<24}{memoized / len(texts) * 1e6:>10.2f}")
+    print(f"{'parsed and rendered':<24}{rerendered / len(texts) * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Compares linking a path's cards with the old substring scan over every pair of cards against LinkGraph.
+
+Synthetic paths of growing size are built from the catalog's cards: every fourth card is linked to one or two of the
+cards before it. Reports the time to link each size with both implementations.
+
+Run from the repository root: python -m benchmarks.links
+"""
+import random
+import timeit
+
+from cards import Card, LinkGraph
+
+
+def substring_links(cards):
+    for card in cards:
+        if card.linked:
+            linked_to = [c for c in cards if card.linked.find(c.name) > -1]
+        else:
+            linked_to = [c for c in cards if (c.linked and c.linked.find(card.name) > -1)]
+        card.linked_to = linked_to if len(linked_to) > 0 else None
+
+
+def synthetic_cards(size: int, rng: random.Random):
+    cards = []
+    for i in range(size):
+        fields = {'cost': 'A', 'text': 'Some text'}
+        if i % 4 == 3:
+            targets = rng.sample(range(i), min(i, rng.choice([1, 2])))
+            fields['linked'] = ' or '.join(f"{{Card {t}}}" for t in targets)
+        cards.append(Card({f"Card {i}": fields}))
+    return cards
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'cards':>8}{'substring ms':>16}{'graph ms':>12}")
+    for size in (100, 1000, 5000, 20000):
+        cards = synthetic_cards(size, rng)
+        graph = min(timeit.repeat(lambda: LinkGraph(cards), number=1, repeat=3))
+        if size <= 5000:
+            substring = f"{min(timeit.repeat(lambda: substring_links(cards), number=1, repeat=1)) * 1e3:16.1f}"
+        else:
+            substring = f"{'(skipped)':>16}"
+        print(f"{size:>8}{substring}{graph * 1e3:12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Drives simulated Discord traffic through CardScale and TournamentScale, without a connection to Discord.
+
+A fake Snake collects the scales' commands and listeners, and stand-in contexts record what would have been sent back
+(both from tests/conftest.py).
+Every interaction still goes through the real handler code: slash commands through dis_snek's command machinery,
+button clicks through the ComponentRouter and autocomplete keystrokes through the registered autocomplete callbacks.
+Reports the throughput, the latency distribution of each interaction type and the memory held per open view.
+
+--rtt adds a simulated round trip to Discord to every reply, so that handlers overlap the way they do in production.
+--burst makes every click action a run of that many rapid clicks on one message, each made before the previous one
+was answered, to compare the message edits made with click coalescing (the default) and without it
+(no_click_coalescing=1).
+
+Run from the repository root: python -m benchmarks.loadtest [--users 1000] [--actions 20] [--rtt 0.05] [--burst 1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import tracemalloc
+from collections import defaultdict
+from timeit import default_timer as timer
+
+os.environ.setdefault('state_db', os.path.join(tempfile.mkdtemp(), 'loadtest.db'))
+
+import cardscale  # noqa: E402
+import tournament  # noqa: E402
+from tests import conftest  # noqa: E402
+from tests.conftest import (  # noqa: E402
+    FakeAutocompleteContext, FakeComponentContext, FakeInteractionContext, FakeSnake, FakeUser, snowflakes)
+
+burst = 1
+
+
+class LoadTest(object):
+    def __init__(self, client: FakeSnake, rng: random.Random):
+        self.client = client
+        self.rng = rng
+        self.cards = cardscale.CardScale(client)
+        self.tournaments = tournament.TournamentScale(client)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.card_names = [c.name for p in cardscale.generation.paths for c in p.cards]
+        self.path_names = [p.name for p in cardscale.generation.paths if p.name != 'Heirloom']
+
+    async def timed(self, name: str, coroutine):
+        start = timer()
+        try:
+            await coroutine
+        except Exception:
+            self.errors[name] += 1
+        finally:
+            self.latencies[name].append(timer() - start)
+
+    async def command(self, name: str, user: FakeUser, channel_id: int, **kwargs):
+        ctx = FakeInteractionContext(user, 1, channel_id, **kwargs)
+        await self.timed(f"/{name}", self.client.interactions[name](ctx, **kwargs))
+
+    async def keystrokes(self, user: FakeUser, channel_id: int, command: str, option: str, text: str):
+        """
+        Types `text` into a command option one character at a time, waiting for each list of choices
+        """
+        callback = self.client.interactions[command].autocomplete_callbacks[option]
+        for i in range(1, len(text) + 1):
+            ctx = FakeAutocompleteContext(user, 1, channel_id, **{option: text[:i]})
+            await self.timed(f"autocomplete /{command}", callback(ctx, **ctx.kwargs))
+
+    async def click(self, user: FakeUser):
+        views = self.cards.router.views
+        if not views:
+            return
+        view = views[self.rng.choice(list(views))]
+        clicks = []
+        for i in range(burst):
+            if not view.message.custom_ids:
+                break
+            if i:  # Faster than Discord answers the last one
+                await asyncio.sleep(conftest.rtt * self.rng.uniform(0.1, 0.5))
+            ctx = FakeComponentContext(user, view.message, self.rng.choice(view.message.custom_ids))
+            clicks.append(asyncio.ensure_future(self.timed(f"click {view.kind}", self.cards.router.dispatch(ctx))))
+        await asyncio.gather(*clicks)
+
+    async def card_user(self, user: FakeUser, actions: int):
+        channel_id = next(snowflakes)
+        for _ in range(actions):
+            action = self.rng.random()
+            if action < 0.3:
+                await self.keystrokes(user, channel_id, 'card', 'card_name', self.rng.choice(self.card_names))
+            elif action < 0.45:
+                await self.command('card', user, channel_id, card_name=self.rng.choice(self.card_names))
+            elif action < 0.6:
+                await self.command('path', user, channel_id, path_name=self.rng.choice(self.path_names))
+            elif action < 0.65:
+                await self.command('tournamentpack', user, channel_id, hidden=self.rng.random() < 0.5)
+            else:
+                await self.click(user)
+
+    async def tournament_organizer(self, user: FakeUser, players: int, rounds: int):
+        channel_id = next(snowflakes)
+        await self.command('tournament create', user, channel_id)
+        for i in range(players):
+            await self.command('tournament add', user, channel_id, player_name=f"Player {user.id % 1000}-{i}")
+        for _ in range(rounds):
+            await self.command('tournament next_round', user, channel_id)
+            active = self.tournaments.active_tournaments.get(1, channel_id)
+            for pair in active.tournament.rounds[-1]:
+                if 'bye' not in pair:
+                    name = sorted(pair)[0]
+                    await self.keystrokes(user, channel_id, 'tournament report', 'player_name', name[:8])
+                    await self.command('tournament report', user, channel_id, player_name=name,
+                                       games_won=self.rng.choice([0, 1, 2]), games_lost=self.rng.choice([0, 1, 2]))
+            await self.command('tournament standings', user, channel_id)
+
+
+async def view_memory(test: LoadTest, count: int):
+    """
+    Bytes allocated per open view, measured by opening `count` more path, card and pack views
+    """
+    user = FakeUser(next(snowflakes))
+    router = test.cards.router
+    results = {}
+    linked = next(c.name for p in cardscale.generation.paths for c in p.cards if c.linked_to)
+    for name, kwargs in (('path', {'path_name': 'Archer'}), ('card', {'card_name': linked}),
+                         ('tournamentpack', {'hidden': False})):
+        before_views = len(router.views)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(count):
+            await test.command(name, user, next(snowflakes), **kwargs)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        opened = len(router.views) - before_views
+        results[name] = (after - before) / opened if opened else 0
+    return results
+
+
+def report(test: LoadTest, elapsed: float):
+    total = sum(len(v) for v in test.latencies.values())
+    clicks = sum(len(v) for name, v in test.latencies.items() if name.startswith('click'))
+    print(f"{total} interactions in {elapsed:.2f}s, {total / elapsed:.0f} per second, "
+          f"{len(test.cards.router.views)} open views, {clicks} clicks made {FakeComponentContext.edits} edits")
+    print(f"{'interaction':<32}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, latencies in sorted(test.latencies.items()):
+        q = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        print(f"{name:<32}{len(latencies):>8}{test.errors[name]:>8}{q[49] * 1e3:>10.2f}{q[94] * 1e3:>10.2f}"
+              f"{q[98] * 1e3:>10.2f}{max(latencies) * 1e3:>10.2f}")
+
+
+async def main(users: int, actions: int, tournaments: int, players: int, rounds: int):
+    client = FakeSnake()
+    test = LoadTest(client, random.Random(0))
+    await client.dispatch('startup')
+
+    start = timer()
+    await asyncio.gather(
+        *(test.card_user(FakeUser(next(snowflakes)), actions) for _ in range(users)),
+        *(test.tournament_organizer(FakeUser(next(snowflakes)), players, rounds) for _ in range(tournaments)))
+    elapsed = timer() - start
+    await test.cards.router.flush_edits()
+    report(test, elapsed)
+
+    for name, size in (await view_memory(test, 500)).items():
+        print(f"memory per open /{name} view: {size / 1024:.1f} KiB")
+
+    test.cards.router.expiry.stop()
+    test.cards.router.timeouts.stop()
+    await test.cards.router.store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulated Discord traffic against the scales")
+    parser.add_argument('--users', type=int, default=1000, help="Concurrent users of the card commands")
+    parser.add_argument('--actions', type=int, default=20, help="Interactions per user")
+    parser.add_argument('--tournaments', type=int, default=10, help="Concurrent tournaments")
+    parser.add_argument('--players', type=int, default=32, help="Players per tournament")
+    parser.add_argument('--rounds', type=int, default=5, help="Rounds per tournament")
+    parser.add_argument('--rtt', type=float, default=0.0, help="Simulated round trip to Discord, in seconds")
+    parser.add_argument('--burst', type=int, default=1, help="Rapid clicks on one message per click action")
+    args = parser.parse_args()
+
+    conftest.rtt = args.rtt
+    burst = args.burst
+    random.seed(0)
+    asyncio.run(main(args.users, args.actions, args.tournaments, args.players, args.rounds))
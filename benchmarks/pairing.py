@@ -0,0 +1,81 @@
+"""
+Compares the old best-of-100-shuffles pairing against the matching based Tournament.next_round.
+
+Plays a Swiss-length event (log2(players) rounds, at least 3) at each size and reports the time per round and the
+number of rematches each approach produced.
+
+Run from the repository root: python -m benchmarks.pairing
+"""
+import math
+import random
+from timeit import default_timer as timer
+
+from tournament import Tournament
+
+
+def shuffle_round(players, rng):
+    active_players = players.copy()
+    rng.shuffle(active_players)
+    new_round = []
+    while len(active_players) > 1:
+        new_round.append(frozenset({active_players.pop(), active_players.pop()}))
+    if active_players:
+        new_round.append(frozenset({"bye", active_players.pop()}))
+    return new_round
+
+
+def shuffle_next_round(rounds, players, rng):
+    def evaluate(potential_round):
+        matchup_scores = dict()
+        for i, previous_round in enumerate(rounds):
+            for pair in previous_round:
+                if pair not in matchup_scores:
+                    matchup_scores[pair] = i + 1
+                else:
+                    matchup_scores[pair] *= i + 1
+        return sum(matchup_scores.get(pair, 0) for pair in potential_round)
+
+    if not rounds:
+        return shuffle_round(players, rng)
+    return min((shuffle_round(players, rng) for _ in range(100)), key=evaluate)
+
+
+def rematches(rounds):
+    seen = set()
+    count = 0
+    for r in rounds:
+        for pair in r:
+            if 'bye' not in pair:
+                count += pair in seen
+                seen.add(pair)
+    return count
+
+
+def main():
+    for size in (8, 64, 256, 1024):
+        players = [f"Player {i}" for i in range(size)]
+        n_rounds = max(3, math.ceil(math.log2(size)))
+
+        rng = random.Random(0)
+        rounds = []
+        start = timer()
+        for _ in range(n_rounds):
+            rounds.append(shuffle_next_round(rounds, players, rng))
+        shuffle_time = (timer() - start) / n_rounds
+
+        random.seed(0)
+        tournament = Tournament(None)
+        for p in players:
+            tournament.add(p)
+        start = timer()
+        for _ in range(n_rounds):
+            tournament.next_round()
+        matching_time = (timer() - start) / n_rounds
+
+        print(f"{size:>5} players, {n_rounds:>2} rounds"
+              f"  shuffles {shuffle_time * 1e3:9.1f} ms/round, {rematches(rounds):>3} rematches"
+              f"  matching {matching_time * 1e3:9.1f} ms/round, {rematches(tournament.rounds):>3} rematches")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures how the card commands scale across worker processes, the way launcher.py runs the bot.
+
+Every worker process loads the catalog the launcher compiled and drives the same simulated traffic as
+benchmarks.loadtest through its own CardScale. Reports the combined throughput and the memory each worker holds, for
+a growing number of workers.
+
+Run from the repository root: python -m benchmarks.sharding [--users 200] [--actions 20] [--workers 1 2 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+
+from catalog import load_files
+from launcher import resident_memory
+
+
+def run_worker(version: str, users: int, actions: int, seed: int, start, results):
+    os.environ['catalog_version'] = version
+    from benchmarks import loadtest
+    from tests.conftest import FakeSnake, FakeUser, snowflakes
+
+    async def main():
+        client = FakeSnake()
+        test = loadtest.LoadTest(client, random.Random(seed))
+        await client.dispatch('startup')
+        start.wait()
+        begin = time.time()  # Wall clock, to compare across processes
+        await asyncio.gather(*(test.card_user(FakeUser(next(snowflakes)), actions)
+                               for _ in range(users)))
+        end = time.time()
+        test.cards.router.expiry.stop()
+        test.cards.router.timeouts.stop()
+        await test.cards.router.store.close()
+        return sum(len(v) for v in test.latencies.values()), begin, end
+
+    interactions, begin, end = asyncio.run(main())
+    results.put((interactions, begin, end, resident_memory()))
+
+
+def measure(context, version: str, workers: int, users: int, actions: int):
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(version, users, actions, i, start, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    start.set()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    interactions = sum(r[0] for r in reports)
+    elapsed = max(r[2] for r in reports) - min(r[1] for r in reports)
+    return interactions / elapsed, max(r[3] for r in reports)
+
+
+def main(users: int, actions: int, workers):
+    version = load_files()[0]
+    context = multiprocessing.get_context('spawn')
+    print(f"{os.cpu_count()} cores, {users} users with {actions} actions per worker")
+    print(f"{'workers':>8}{'per second':>12}{'speedup':>10}{'MiB/worker':>12}")
+    base = None
+    for count in workers:
+        throughput, memory = measure(context, version, count, users, actions)
+        base = base or throughput / count
+        print(f"{count:>8}{throughput:>12.0f}{throughput / base:>10.2f}{memory / 2 ** 20:>12.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Card command throughput across worker processes")
+    parser.add_argument('--users', type=int, default=200, help="Concurrent users per worker")
+    parser.add_argument('--actions', type=int, default=20, help="Interactions per user")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Worker counts to measure")
+    args = parser.parse_args()
+    main(args.users, args.actions, args.workers)
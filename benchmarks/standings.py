@@ -0,0 +1,80 @@
+"""
+Measures the cost of reporting results and ranking a large Swiss event, against recomputing the tie-breakers from
+every round on each /tournament standings call.
+
+Run from the repository root: python -m benchmarks.standings
+"""
+import random
+import timeit
+from fractions import Fraction
+from timeit import default_timer as timer
+
+from pairing import BYE
+from standings import FLOOR, match_points
+from tournament import Tournament
+
+
+def recomputed_standings(tournament):
+    points, matches, games_won, games, opponents = {}, {}, {}, {}, {}
+    for name in tournament.history.names:
+        points[name] = matches[name] = games_won[name] = games[name] = 0
+        opponents[name] = []
+    for r, results in zip(tournament.rounds, tournament.results):
+        for pair in r:
+            if BYE in pair:
+                continue
+            a, b = sorted(pair)
+            if a in results:
+                for x, y in ((a, b), (b, a)):
+                    points[x] += match_points(results[x], results[y])
+                    matches[x] += 1
+                    games_won[x] += results[x]
+                    games[x] += results[x] + results[y]
+                    opponents[x].append(y)
+
+    def mw(p):
+        return max(Fraction(points[p], 3 * matches[p]), FLOOR) if matches[p] else FLOOR
+
+    def gw(p):
+        return max(Fraction(games_won[p], games[p]), FLOOR) if games[p] else FLOOR
+
+    def omw(p):
+        return sum(map(mw, opponents[p])) / len(opponents[p]) if opponents[p] else 0
+
+    def ogw(p):
+        return sum(map(gw, opponents[p])) / len(opponents[p]) if opponents[p] else 0
+
+    return sorted(tournament.players, key=lambda p: (points[p], omw(p), gw(p), ogw(p)), reverse=True)
+
+
+def main(size: int = 1024, n_rounds: int = 10):
+    rng = random.Random(0)
+    random.seed(0)
+    tournament = Tournament(None)
+    for i in range(size):
+        tournament.add(f"Player {i}")
+
+    report_time = 0
+    reports = 0
+    for _ in range(n_rounds):
+        for pair in tournament.next_round():
+            if BYE not in pair:
+                name = sorted(pair)[0]
+                games = rng.choice([(2, 0), (2, 1), (1, 2), (0, 2), (1, 1)])
+                start = timer()
+                tournament.report(name, *games)
+                report_time += timer() - start
+                reports += 1
+
+    assert [s.name for s in tournament.standings.ranked(tournament.players)] == recomputed_standings(tournament)
+    incremental = min(timeit.repeat(lambda: tournament.standings.ranked(tournament.players), number=1, repeat=5))
+    full = min(timeit.repeat(lambda: recomputed_standings(tournament), number=1, repeat=5))
+
+    print(f"{size} players, {n_rounds} rounds, {reports} reports")
+    print(f"report                   {report_time / reports * 1e6:9.1f} us")
+    print(f"standings (incremental)  {incremental * 1e3:9.1f} ms")
+    print(f"standings (recomputed)   {full * 1e3:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import typing
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Bounded least-recently-used cache with hit/miss counters.
+
+    Callers put whatever their results depend on (catalog version, tournament version...) into the key, so stale
+    entries are never returned and simply age out.
+    """
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key: typing.Hashable, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: typing.Hashable, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_or_compute(self, key: typing.Hashable, compute: typing.Callable[[], typing.Any]):
+        """
+        Returns the cached value for `key`, calling `compute` and caching its result on a miss
+
+        :param key: Cache key
+        :param compute: Zero argument callable producing the value
+        :return: The cached or freshly computed value
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+_missing = object()
@@ -1,134 +1,260 @@
+import functools
 import glob
+import logging
 import re
 import sys
 import typing
 
-import strictyaml as yaml
-from strictyaml import Map, MapPattern, Str, Seq, Int, Bool, Optional, CommaSeparated, Regex
+from cardtext import MarkupError, macros, parse
 
 
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
 
-schema = Map({
-    'path': Str(),
-    'colors': Regex(r'[0-9a-fA-F]{6}\s*-\s*[0-9a-fA-F]{6}'),
-    'resources': Regex(r'[WSF]{3}'),
-    Optional('extras'): Str(),
-    'cards': Seq(
-        MapPattern(
-            Str(), Map({
-                'cost': Regex(r'[SWFAX]*'),
-                Optional('types'): CommaSeparated(Regex(r'oneshot|permanent|innate|heirloom')),
-                Optional('linked'): Str(),
-                Optional('linked type'): Str(),
-                Optional('path card name'): Str(),
-                'text': Str(),
-                Optional('purchase'): Int(),
-                Optional('upgrade cost'): Int(),
-                Optional('upgrade'): Str(),
-                Optional('big art'): Bool(),
-            })
-        )
-    ),
-    # "c": EmptyDict() | Seq(MapPattern(Str(), Str())),
-})
+@functools.lru_cache(maxsize=None)
+def path_schema():
+    """
+    The strictyaml schema of a path file. strictyaml is slow to import and only needed when the catalog snapshot is
+    out of date, so it is imported on first use
+    """
+    from strictyaml import Map, MapPattern, Str, Seq, Int, Bool, Optional, CommaSeparated, Regex
+
+    return Map({
+        'path': Str(),
+        'colors': Regex(r'[0-9a-fA-F]{6}\s*-\s*[0-9a-fA-F]{6}'),
+        'resources': Regex(r'[WSF]{3}'),
+        Optional('extras'): Str(),
+        'cards': Seq(
+            MapPattern(
+                Str(), Map({
+                    'cost': Regex(r'[SWFAX]*'),
+                    Optional('types'): CommaSeparated(Regex(r'oneshot|permanent|innate|heirloom')),
+                    Optional('linked'): Str(),
+                    Optional('linked type'): Str(),
+                    Optional('path card name'): Str(),
+                    'text': Str(),
+                    Optional('purchase'): Int(),
+                    Optional('upgrade cost'): Int(),
+                    Optional('upgrade'): Str(),
+                    Optional('big art'): Bool(),
+                })
+            )
+        ),
+        # "c": EmptyDict() | Seq(MapPattern(Str(), Str())),
+    })
+
+
+def _normalize(value):
+    """
+    Strips and interns a string field, doubling its newlines so that they survive as paragraph breaks in markdown.
+    Card names, costs and types repeat a lot, and with fan-made sets so do whole texts
+    """
+    if isinstance(value, str):
+        return sys.intern(value.strip().replace('\n', '\n\n'))
+    return value
 
 
 class Card(object):
-    def __init__(self, d):
-        name, d = d.popitem()
-
-        class MyDict(dict):
-            def __missing__(self, key):
-                return None
-
-            def __getitem__(self, key):
-                val = dict.__getitem__(self, key)
-                if isinstance(val, str):
-                    return val.strip().replace('\n', '\n\n')
-                return val
-
-        d = MyDict(d)
-        self.name = name
-        self.cost = d['cost']
-        self.text = d['text']
-        self.types = [t.strip() for t in (d['types'] or [])]
-        if '\\sequence' in self.text:
-            self.types.append('sequence')
-        self.linked = d['linked']
-        self.linked_type = d['linked type']
-        self.path_card_name = d['path card name'] or self.name
-        self.linked_to = []
-        self.purchase = d['purchase']
-        self.upgrade_cost = d['upgrade cost']
-        self.upgrade = d['upgrade']
-        self.big_art = d['big art']
+    """
+    One card, normalized when it is parsed. Never modified once its path has been loaded
+    """
+    __slots__ = ('name', 'cost', 'text', 'types', 'linked', 'linked_type', 'path_card_name', 'linked_to', 'purchase',
+                 'upgrade_cost', 'upgrade', 'big_art')
+
+    name: str
+    cost: str
+    text: str
+    types: typing.Tuple[str, ...]
+    linked: typing.Optional[str]
+    linked_type: typing.Optional[str]
+    path_card_name: str
+    linked_to: typing.Optional[typing.Tuple['Card', ...]]
+    purchase: typing.Optional[int]
+    upgrade_cost: typing.Optional[int]
+    upgrade: typing.Optional[str]
+    big_art: typing.Optional[bool]
+
+    def __init__(self, d, source: str = None):
+        name, d = next(iter(d.items()))
+        self.name = sys.intern(name)
+        self.cost = _normalize(d['cost'])
+        self.text = _normalize(d['text'])
+        types = [sys.intern(t.strip()) for t in d.get('types') or ()]
+        try:
+            sequence = 'sequence' in macros(parse(self.text))
+        except MarkupError as e:  # Shown as it is written, see cardtext.parse_leniently
+            logging.warning(f"{source or 'Card'}: {self.name}: {e}")
+            sequence = '\\sequence' in self.text
+        if sequence:
+            types.append('sequence')
+        self.types = tuple(types)
+        self.linked = _normalize(d.get('linked'))
+        self.linked_type = _normalize(d.get('linked type'))
+        self.path_card_name = _normalize(d.get('path card name')) or self.name
+        self.linked_to = ()
+        self.purchase = d.get('purchase')
+        self.upgrade_cost = d.get('upgrade cost')
+        self.upgrade = _normalize(d.get('upgrade'))
+        self.big_art = d.get('big art')
 
     def __str__(self):
         return f'<{self.name} {{{self.cost}}} [{self.purchase}]:\n  - ({", ".join(self.types)}) \n  - {repr(self.text)} \n  - [{self.upgrade_cost}: {repr(self.upgrade)}]> '
 
 
+class LinkError(ValueError):
+    pass
+
+
+def parse_links(linked: str) -> typing.List[str]:
+    """
+    Names referenced by a card's `linked` field: every {braced} name, or the whole field if nothing is braced
+    """
+    if '{' in linked:
+        return [name.strip() for name in re.findall(r"\{(.*?)\}", linked)]
+    return [linked.strip()]
+
+
+class LinkGraph(object):
+    """
+    Adjacency lists of the links between the cards of one path, built in one pass over the cards with a name lookup
+    for every reference, so it grows linearly with the number of cards and links
+    """
+    parents: typing.Dict[str, typing.List[Card]]  # Cards each card is linked from, in path order
+    children: typing.Dict[str, typing.List[Card]]  # Linked cards pointing at each card, in path order
+
+    def __init__(self, cards: typing.Sequence[Card], source: str = ''):
+        by_name = {}
+        position = {}
+        for i, card in enumerate(cards):
+            by_name.setdefault(card.name, card)
+            position.setdefault(card.name, i)
+        self.parents = {card.name: [] for card in cards}
+        self.children = {card.name: [] for card in cards}
+
+        for card in cards:
+            if not card.linked:
+                continue
+            for name in dict.fromkeys(parse_links(card.linked)):
+                target = by_name.get(name)
+                if target is None:
+                    raise LinkError(f"{source}: {card.name} is linked to {name!r}, which isn't a card of this path")
+                self.parents[card.name].append(target)
+                self.children[target.name].append(card)
+        for linked in self.parents.values():
+            linked.sort(key=lambda c: position[c.name])
+
+
 class Path(object):
+    __slots__ = ('name', 'colors', 'resources', 'cards', 'extras', '_by_name')
+
     name: str
-    colors: tuple[str]
+    colors: typing.Tuple[str, ...]
     resources: str
-    cards: list[Card]
+    cards: typing.Tuple[Card, ...]
     extras: typing.Optional[str]
 
     def __init__(self, name, colors, resources, cards, extras=None):
-        self.name = name
-        self.colors = colors
-        self.resources = resources
-        self.cards = cards
+        self.name = sys.intern(name)
+        self.colors = tuple(sys.intern(c) for c in colors)
+        self.resources = sys.intern(resources)
+        self.cards = tuple(cards)
         self.extras = extras
+        self._by_name = {}
+        for c in self.cards:
+            self._by_name.setdefault(c.name, c)
 
     @classmethod
     def from_file(cls, filename):
         with open(filename, 'r') as file:
-            text = file.read()
+            return cls.from_text(file.read(), filename)
+
+    @classmethod
+    def from_text(cls, text, filename):
+        import strictyaml as yaml
 
-        config = yaml.load(text, schema)
+        config = yaml.load(text, path_schema())
         data = config.data
 
         name = data['path']
         colors = tuple([c.strip() for c in data['colors'].split('-')])
         resources = data['resources']
-        cards = [Card(card) for card in data['cards']]
+        cards = [Card(card, filename) for card in data['cards']]
         extras = data.get('extras', None)
 
         path = Path(name, colors, resources, cards, extras)
-        path.build_links()
+        path.build_links(filename)
         return path
 
     def card_by_name(self, name):
-        matches = [c for c in self.cards if c.name == name]
-        if len(matches) > 0:
-            return matches[0]
-        else:
-            return None
+        return self._by_name.get(name)
 
-    def build_links(self):
+    def build_links(self, source: str = None):
+        """
+        Links the cards both ways: a linked card points at the cards it names, and each of those points back at it
+
+        :param source: Where the path came from, for error messages
+        :raises LinkError: If a card is linked to a card that isn't in the path
+        """
+        graph = LinkGraph(self.cards, source or self.name)
         for c in self.cards:
-            if c.linked:
-                if '{' in c.linked:
-                    linked_cards = re.findall(r"\{(.*?)\}", c.linked)
-                else:
-                    linked_cards = [c.linked]
-                for l in linked_cards:
-                    self.card_by_name(l).linked_to.append(c)
+            linked_to = graph.parents[c.name] if c.linked else graph.children[c.name]
+            c.linked_to = tuple(linked_to) if linked_to else None
+
+
+def load_path(filename: str, text: str = None) -> Path:
+    """
+    Parses one path file and links its cards. Links never cross paths, so every file can be loaded on its own
+
+    :param filename: The yaml file to parse
+    :param text: The contents of the file, when they have already been read
+    :return: The parsed path
+    """
+    if text is not None:
+        return Path.from_text(text, filename)
+    return Path.from_file(filename)
 
 
 def all_paths() -> typing.List[Path]:
-    paths = [Path.from_file(f) for f in glob.glob('paths/*.yaml')]
+    return [load_path(f) for f in glob.glob('paths/*.yaml')]
+
+
+class CardIndex(object):
+    """
+    Constant time lookups over every card and path, built once when the catalog is loaded
+    """
+    paths: typing.Dict[str, Path]
+    cards: typing.Dict[str, typing.Tuple[Card, Path]]
+    linked: typing.Dict[str, typing.Tuple[Card, ...]]
+    folded: typing.Dict[str, str]
+
+    def __init__(self, paths: typing.List[Path]):
+        self.paths = {}
+        self.cards = {}
+        self.linked = {}
+        self.folded = {}
+        for path in paths:
+            self.paths[path.name] = path
+            for card in path.cards:
+                # Keep the first occurrence, same as the old scan through every path
+                self.cards.setdefault(card.name, (card, path))
+                self.linked.setdefault(card.name, tuple(card.linked_to or ()))
+                self.folded.setdefault(card.name.casefold(), card.name)
+
+    def find_card(self, name: str) -> typing.Union[typing.Tuple[Card, Path], typing.Tuple[None, None]]:
+        """
+        Looks up a card by its exact name, falling back to a case-insensitive match
+
+        :param name: Name of the card
+        :return: Tuple of the card and the path it belongs to, or (None, None) if there is no such card
+        """
+        found = self.cards.get(name)
+        if found is None:
+            found = self.cards.get(self.folded.get(name.casefold()))
+        return found or (None, None)
 
-    for path in paths:
-        for card in path.cards:
-            if card.linked:
-                linked_to = [c for c in path.cards if card.linked.find(c.name) > -1]
-            else:
-                linked_to = [c for c in path.cards if (c.linked and c.linked.find(card.name) > -1)]
-            card.linked_to = linked_to if len(linked_to) > 0 else None
+    def path(self, name: str) -> typing.Optional[Path]:
+        return self.paths.get(name)
 
-    return paths
+    def linked_to(self, card: Card) -> typing.Tuple[Card, ...]:
+        return self.linked.get(card.name, ())
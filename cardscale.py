@@ -1,19 +1,15 @@
-import asyncio.exceptions
-import difflib
-import glob
+import asyncio
+import functools
 import logging
+import os
 import random
-from datetime import datetime, timedelta
-from timeit import default_timer as timer
-from typing import List, Union, Tuple
-from urllib.parse import quote
+from typing import Dict, Iterable, List, Optional, Set, Union, Tuple
 
 from dis_snek import Snake
 from dis_snek.models import (
     slash_command,
     InteractionContext,
     ComponentContext,
-    Embed,
     ActionRow,
     Button,
     ButtonStyles,
@@ -21,25 +17,138 @@ from dis_snek.models import (
     SlashCommandChoice,
     AutocompleteContext,
     Message,
-    Color,
-    OptionTypes, Scale,
+    Embed,
+    File,
+    OptionTypes, listen,
 )
+from dis_snek.models.events import Component
+
+from assets import AssetResolver, report_missing
+from cards import Card, CardIndex, Path
+from cardtext import CardText
+from cache import LRUCache
+from imagecache import IMAGE_BASE_URL, IMAGE_CACHE_DIR, ImageCache
+from catalog import CatalogWatcher, load_files, path_names
+from dispatch import ComponentRouter, OpenView, custom_id
+from store import get_store, shard_kind
+from render import RenderCache
+from search import CardSearch, NameSearch, QueryError, normalize
+from shards import ShardScale
+from startup import timer as startup_timer
+
+# Log in first and load the catalog in the background, answering commands with WARMING_UP until it is loaded
+LAZY_START = bool(os.environ.get('lazy_start'))
+WARMING_UP = "Warming up, try again in a few seconds"
+LOAD_FAILED = "Error: the card data could not be loaded, try again later"
+LOAD_RETRY_INTERVAL = 30.0  # Seconds between attempts at startup, when the lazy load fails
+
+
+class CatalogGeneration(object):
+    """
+    Everything derived from one version of the card data. Never modified once built: a hot reload builds a new
+    generation and swaps it in, while views that are already open keep the one they were created with
+    """
+    __slots__ = ('version', 'files', 'paths', 'index', 'name_search', 'text', 'card_search', 'assets', 'images',
+                 'renders')
+
+    version: str
+    files: Dict[str, Path]
+    paths: Tuple[Path, ...]
+    index: CardIndex
+    name_search: NameSearch
+    text: CardText
+    card_search: CardSearch
+    assets: AssetResolver
+    images: Optional[ImageCache]
+    renders: RenderCache
+
+    def __init__(self, version: str, files: Dict[str, Path]):
+        self.version = version
+        self.files = files
+        self.paths = tuple(files.values())
+        self.index = CardIndex(list(self.paths))
+        self.name_search = NameSearch(self.index.cards)
+        self.text = CardText(self.paths)
+        self.card_search = CardSearch(self.paths, self.text)
+        self.assets = AssetResolver(self.paths)
+        self.images = ImageCache(self.assets, IMAGE_CACHE_DIR, IMAGE_BASE_URL) if IMAGE_CACHE_DIR else None
+        self.renders = RenderCache(list(self.paths), self.assets, self.images, self.text)
+
+    def find_card(self, card_name: str) -> Union[Tuple[Card, Path], Tuple[None, None]]:
+        return self.index.find_card(card_name)
+
+
+def load_generation() -> CatalogGeneration:
+    with startup_timer.phase('catalog'):
+        return CatalogGeneration(*load_files(version=os.environ.get('catalog_version')))
+
+
+generation: Optional[CatalogGeneration] = None if LAZY_START else load_generation()
+_loading: Optional[asyncio.Future] = None
+_load_failed = False  # The last lazy load raised, the next catalog_ready() tries again
+autocomplete_cache = LRUCache(maxsize=2048)
+scales: List['CardScale'] = []  # One per shard client of this process, the first one watches the card data
 
-from cards import Card, Path, all_paths
 
-paths = all_paths()
+def find_card(card_name: str) -> Union[Tuple[Card, Path], Tuple[None, None]]:
+    return generation.find_card(card_name)
 
 
-def find_card(card_name: str) -> Union[Tuple[Card, Path], Tuple[None, None]]:
-    for path in paths:
-        card = path.card_by_name(card_name)
-        if card:
-            return card, path
-    return None, None
+def catalog_ready() -> asyncio.Future:
+    """
+    Resolves once the catalog is loaded. With lazy_start the first call starts loading it on a worker thread, and every
+    shard client of the process waits on that one load. A load that fails is logged and raises to its waiters, and the
+    next call starts another
+    """
+    global _loading
+    if _loading is None:
+        _loading = asyncio.ensure_future(_load_lazily())
+        _loading.add_done_callback(lambda f: f.cancelled() or f.exception())  # Logged already, if nobody waits
+    return _loading
 
 
-def path_by_name(valid_paths: List[Path], path_name: str) -> Path:
-    return next((p for p in valid_paths if p.name == path_name), None)
+async def wait_for_catalog():
+    """
+    Waits until the catalog is loaded, retrying a failed load every LOAD_RETRY_INTERVAL seconds
+    """
+    while True:
+        try:
+            return await catalog_ready()
+        except Exception:
+            await asyncio.sleep(LOAD_RETRY_INTERVAL)
+
+
+async def _load_lazily():
+    global generation, _loading, _load_failed
+    if generation is not None:
+        return
+    try:
+        generation = await asyncio.get_event_loop().run_in_executor(None, load_generation)
+    except Exception:
+        logging.exception("Could not load the catalog")
+        _loading, _load_failed = None, True
+        raise
+    _load_failed = False
+    logging.info(f"Loaded catalog version {generation.version[:12]}")
+
+
+def needs_catalog(callback):
+    """
+    Decorator for the command and autocomplete callbacks of CardScale, which answer WARMING_UP (or no choices) instead
+    while the catalog is still loading, and LOAD_FAILED after a failed load, which they retry
+    """
+    @functools.wraps(callback)
+    async def wrapper(self, ctx, *args, **kwargs):
+        if generation is None:
+            if isinstance(ctx, AutocompleteContext):
+                await ctx.send(choices=[])
+            else:
+                await ctx.send(LOAD_FAILED if _load_failed else WARMING_UP, ephemeral=True)
+            if _load_failed:
+                catalog_ready()
+            return
+        return await callback(self, ctx, *args, **kwargs)
+    return wrapper
 
 
 # def build_links(raw_paths: List[Path]):
@@ -52,110 +161,14 @@ def path_by_name(valid_paths: List[Path], path_name: str) -> Path:
 #             card.linked_to = linked_to if len(linked_to) > 0 else None
 
 
-def card_url(card_name: str, path_name: str) -> str:
-    base_url = "https://raw.githubusercontent.com/ShardlessBun/glorybound_cards/"
-    version_string = 'v2.2.1'  # todo: add this as an environment variable
-    url = f"{base_url}{quote(version_string)}/{quote(path_name)}/{quote(card_name)}.png"
-    return url
-
-
-def action_rows_from_path(path: Path, disabled_card: str = None) -> List[ActionRow]:
-    rows = list()
-    if not disabled_card:
-        disabled_card = path.name
-
-    # Make path button
-    rows.append(ActionRow(Button(
-        label=path.name,
-        custom_id=path.name,
-        style=ButtonStyles.SUCCESS,
-        disabled=True if disabled_card == path.name else False
-    )))
-
-    # Make standard & linked card buttons
-    std_cards = list()
-    linked_cards = list()
-    for card in path.cards:
-        if not card.linked:
-            btn = Button(
-                label=card.name,
-                custom_id=card.name,
-                style=ButtonStyles.PRIMARY,
-                disabled=True if disabled_card == card.name else False
-            )
-            std_cards.append(btn)
-
-        else:
-            linked_cards.append(Button(
-                label=card.name,
-                custom_id=card.name,
-                style=ButtonStyles.SECONDARY,
-                disabled=True if disabled_card == card.name else False
-            ))
-    rows.append(ActionRow(*std_cards))
-    if len(linked_cards) > 0:
-        rows.append(ActionRow(*linked_cards))
-
-    return rows
-
-
-def components_from_linked(card: Card) -> List[Button]:
-    buttons = [Button(
-        label=card.name,
-        custom_id=card.name,
-        style=ButtonStyles.SECONDARY if card.linked else ButtonStyles.PRIMARY,
-        disabled=True
-    )]
-    for c in (card.linked_to or []):
-        buttons.append(
-            Button(
-                label=c.name,
-                custom_id=c.name,
-                style=ButtonStyles.SECONDARY if c.linked else ButtonStyles.PRIMARY
-            )
-        )
-    return buttons
-
-
-def build_embed(path: Path, card: Card = None) -> Embed:
-    embed = Embed(color=Color(int(path.colors[0], 16)))
-    if card:
-        embed.title = card.name
-        if card.linked:
-            embed.color = Color(int(path.colors[1], 16))
-        embed.set_image(url=card_url(card.name, path.name))
-    else:
-        embed.title = f"Path of the {path.name}"
-        embed.set_image(url=card_url(path.name, path.name))
-
-    return embed
-
-
-def path_choices(allowed_paths: List[Path]) -> List[SlashCommandChoice]:
+def path_choices(names: Iterable[str]) -> List[SlashCommandChoice]:
     """
-    Converts a list of Path objects into SlashCommandChoices
+    Converts path names into SlashCommandChoices, leaving out the heirlooms
 
-    :param allowed_paths: List of allowed Paths
+    :param names: Names of the paths
     :return: List of slash command choices choices formatted for Discord
     """
-    allowed_paths.sort(key=lambda x: x.name)
-    return [SlashCommandChoice(path.name, path.name) for path in allowed_paths]
-
-
-def determine_timeout(interaction_timeout: int) -> int:
-    static_timeout = 60 * 5  # 5 minute limit between component interactions
-    return static_timeout if static_timeout < interaction_timeout else interaction_timeout
-
-
-def disable_all_but_id(interaction_components: Union[List[ActionRow], List[Button]],
-                       custom_id: str) -> Union[List[ActionRow], List[Button]]:
-    for cmp in interaction_components:
-        if isinstance(cmp, Button):
-            cmp.disabled = True if cmp.custom_id == custom_id else False
-        else:
-            for button in cmp.components:
-                button.disabled = True if button.custom_id == custom_id else False
-    return interaction_components
+    return [SlashCommandChoice(name, name) for name in sorted(names) if name != 'Heirloom']
 
 
 def disable_all(interaction_components: Union[List[ActionRow], List[Button]]) -> Union[List[ActionRow], List[Button]]:
@@ -171,25 +184,35 @@ def disable_all(interaction_components: Union[List[ActionRow], List[Button]]) ->
 class CardView(object):
     _card: Tuple[Card, Path]
     _selected: Tuple[Card, Path]
+    _generation: CatalogGeneration
 
-    def __init__(self, card_name: str):
-        card = find_card(card_name)
+    def __init__(self, card_name: str, catalog: CatalogGeneration = None):
+        self._generation = catalog or generation
+        card = self._generation.find_card(card_name)
         if not card[0]:
             raise ValueError
         self._card = card
         self._selected = card
 
     def select(self, card_name: str):
-        self._selected = find_card(card_name)
+        selected = self._generation.find_card(card_name)
+        if selected[0]:
+            self._selected = selected
 
-    def components(self) -> ActionRow:
-        buttons = components_from_linked(self._card[0])
-        for b in buttons:
-            b.disabled = True if b.custom_id == self._selected[0].name else False
-        return ActionRow(*buttons)
+    def components(self) -> dict:
+        return self._generation.renders.linked_row(self._card[0], self._selected[0].name)
 
-    def embed(self) -> Embed:
-        return build_embed(self._selected[1], self._selected[0])
+    def embed(self) -> dict:
+        return self._generation.renders.embed(self._selected[1], self._selected[0])
+
+    def attachment(self, embed: dict) -> Optional[File]:
+        """
+        Sends the cached image as an attachment instead of linking it, for views that are never edited
+        """
+        images = self._generation.images
+        if not images or self.interactable():
+            return None
+        return images.attach(embed, self._selected[0].name, self._selected[1].name)
 
     def interactable(self) -> bool:
         """
@@ -200,30 +223,6 @@ class CardView(object):
             return len(self._card[0].linked_to) > 0
         return False
 
-    async def await_interactions(self, msg: Message, snek: Snake):
-        expires: datetime = datetime.now() + timedelta(minutes=30)  # Global timeout at 30 minutes since interaction
-
-        while True:
-            try:
-                interaction_timeout = expires - datetime.now()
-                event = await snek.wait_for_component(messages=msg,
-                                                      timeout=determine_timeout(interaction_timeout.seconds))
-
-            except asyncio.exceptions.TimeoutError:
-                logging.debug(f"Interaction for msg id [ {msg.id} ] timed out")
-                rows = disable_all(msg.components)
-                await msg.edit(content="Timed Out", components=rows)
-                break
-            else:
-                start = timer()
-                button_ctx: ComponentContext = event.context
-                self.select(button_ctx.custom_id)
-                end = timer()
-                print(f"msg id [ {msg.id} ]: {button_ctx.author} interacted with [ {button_ctx.custom_id} ]. "
-                      f"Response time: [ {end - start}s ]")
-                # logging.debug(f"msg id [ {msg.id} ]: {button_ctx.author} clicked on: {button_ctx.custom_id}")
-                await button_ctx.edit_origin(embeds=self.embed(), components=self.components())
-
 
 class TournamentPackView(object):
     _heirlooms: List[Card]
@@ -231,68 +230,270 @@ class TournamentPackView(object):
     _selected: Union[Card, Path]
     _selected_heirloom: Card
     _selected_path: Path
+    _heirloom_names: Set[str]
+    _path_names: Set[str]
+    _card_names: Set[str]
+    _generation: CatalogGeneration
 
-    def __init__(self, heirlooms: List[Card], selected_paths: List[Path]):
+    def __init__(self, heirlooms: List[Card], selected_paths: List[Path], catalog: CatalogGeneration = None):
+        self._generation = catalog or generation
         self._heirlooms = heirlooms
         self._paths = selected_paths
+        self._heirloom_names = {c.name for c in heirlooms}
+        self._path_names = {p.name for p in selected_paths}
+        self._card_names = {c.name for p in selected_paths for c in p.cards}
         self._selected = selected_paths[0]
         self._selected_heirloom = heirlooms[0]
         self._selected_path = selected_paths[0]
 
     def select(self, name: str):
-        if name in [c.name for c in self._heirlooms]:
-            self._selected_heirloom = find_card(name)[0]
-        elif name in [p.name for p in self._paths]:
-            p = path_by_name(self._paths, name)
+        if name in self._heirloom_names:
+            self._selected_heirloom = self._generation.find_card(name)[0]
+        elif name in self._path_names:
+            p = self._generation.index.path(name)
             self._selected = p
             self._selected_path = p
-        elif name in [c.name for p in self._paths for c in p.cards]:
-            self._selected = find_card(name)[0]
+        elif name in self._card_names:
+            # The card's own path, in case the click came from buttons rendered before another path was selected
+            self._selected, self._selected_path = self._generation.find_card(name)
         else:
             return NameError
 
-    def components(self) -> List[ActionRow]:
-        components = []
-        heirloom_row = ActionRow()
-        for heirloom in self._heirlooms:
-            heirloom_row.add_components(
-                Button(
-                    label=heirloom.name,
-                    custom_id=heirloom.name,
-                    style=ButtonStyles.SECONDARY,
-                    disabled=True if heirloom.name == self._selected_heirloom.name else False
-                ))
-        components.append(heirloom_row)
-        paths_row = ActionRow()
-        for path in self._paths:
-            paths_row.add_components(
-                Button(
-                    label=path.name,
-                    custom_id=path.name,
-                    style=ButtonStyles.SUCCESS,
-                    disabled=True if path.name == self._selected.name else False
-                ))
-        components.append(paths_row)
-        cards_rows = action_rows_from_path(self._selected_path, self._selected.name)
-        cards_rows.pop(0)
-        components.extend(cards_rows)
+    def components(self) -> List[dict]:
+        renders = self._generation.renders
+        components = [
+            renders.button_row('pack', [h.name for h in self._heirlooms], ButtonStyles.SECONDARY,
+                               self._selected_heirloom.name),
+            renders.button_row('pack', [p.name for p in self._paths], ButtonStyles.SUCCESS, self._selected.name),
+        ]
+        cards_rows = renders.path_rows(self._selected_path, self._selected.name, 'pack')
+        components.extend(cards_rows[1:])
         return components
 
-    def embeds(self) -> List[Embed]:
-        heirloom_embed = build_embed(path_by_name(paths, 'Heirloom'), self._selected_heirloom)
+    def embeds(self) -> List[dict]:
+        renders = self._generation.renders
+        heirloom_embed = renders.embed(self._generation.index.path('Heirloom'), self._selected_heirloom, True)
 
         if isinstance(self._selected, Path):
-            card_embed = build_embed(self._selected)
+            card_embed = renders.embed(self._selected, thumbnail=True)
         else:
-            card_embed = build_embed(self._selected_path, self._selected)
+            card_embed = renders.embed(self._selected_path, self._selected, True)
 
         return [heirloom_embed, card_embed]
 
-
-class CardScale(Scale):
+    def to_dict(self) -> dict:
+        return {
+            'heirlooms': [c.name for c in self._heirlooms],
+            'paths': [p.name for p in self._paths],
+            'selected': self._selected.name,
+            'selected_heirloom': self._selected_heirloom.name,
+            'selected_path': self._selected_path.name,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TournamentPackView':
+        heirlooms = [find_card(name)[0] for name in data['heirlooms']]
+        selected_paths = [generation.index.path(name) for name in data['paths']]
+        if None in heirlooms or None in selected_paths:
+            raise ValueError("Card data changed since the pack was generated")
+
+        view = cls(heirlooms, selected_paths)
+        for name in (data['selected_path'], data['selected'], data['selected_heirloom']):
+            view.select(name)
+        return view
+
+
+class SearchView(object):
+    """
+    One page of /search results. The matches are found once, when the search is made, and the buttons page through
+    them
+    """
+    page_size: int = 10
+    query: str
+    page: int
+    results: List[Tuple[Card, Path]]
+    _generation: CatalogGeneration
+
+    def __init__(self, query: str, catalog: CatalogGeneration = None, page: int = 0):
+        self._generation = catalog or generation
+        self.query = query
+        self.results = self._generation.card_search.search(query)
+        self.page = max(min(page, self.pages - 1), 0)
+
+    @property
+    def pages(self) -> int:
+        return max(-(-len(self.results) // self.page_size), 1)
+
+    def select(self, action: str):
+        if action == 'next':
+            self.page = min(self.page + 1, self.pages - 1)
+        elif action == 'prev':
+            self.page = max(self.page - 1, 0)
+
+    def embed(self) -> dict:
+        lines = []
+        for card, path in self.results[self.page * self.page_size:(self.page + 1) * self.page_size]:
+            line = f"**{card.name}**  {path.name}  {{{card.cost or '-'}}}"
+            if card.types:
+                line += f"  *{', '.join(card.types)}*"
+            lines.append(line)
+        embed = Embed(title=f"Search: {self.query}", description='\n'.join(lines))
+        embed.set_footer(f"Page {self.page + 1}/{self.pages}, {len(self.results)} cards")
+        return embed.to_dict()
+
+    def components(self) -> List[dict]:
+        if self.pages == 1:
+            return []
+        return [ActionRow(
+            Button(label="Previous", custom_id=custom_id('search', 'prev'), style=ButtonStyles.SECONDARY,
+                   disabled=self.page == 0),
+            Button(label="Next", custom_id=custom_id('search', 'next'), style=ButtonStyles.SECONDARY,
+                   disabled=self.page == self.pages - 1),
+        ).to_dict()]
+
+    def to_dict(self) -> dict:
+        return {'query': self.query, 'page': self.page}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SearchView':
+        return cls(data['query'], page=data['page'])
+
+
+class CardScale(ShardScale):
+    router: ComponentRouter
+    watcher: CatalogWatcher
+    _pinned: Dict[int, CatalogGeneration]  # Generation of path and card views that were open during a reload
 
     def __init__(self, client: Snake):
         self.client = client
+        self.router = ComponentRouter(get_store(), state_kind=shard_kind('view', client),
+                                      coalesce_clicks=not os.environ.get('no_click_coalescing'))
+        self.watcher = None
+        self._pinned = {}
+        self._started = False
+        scales.append(self)
+        self.router.register('path', self.path_clicked, self.disable_view)
+        self.router.register('card', self.card_clicked, self.disable_view)
+        self.router.register('pack', self.pack_clicked, self.disable_pack, stateless=False,
+                             load_state=TournamentPackView.from_dict)
+        self.router.register('search', self.search_clicked, self.disable_view, stateless=False,
+                             load_state=SearchView.from_dict)
+
+    @listen()
+    async def on_login(self):
+        catalog_ready()  # Loads while the gateway connects
+
+    @listen()
+    async def on_startup(self):
+        if self._started:
+            return  # Already restored and watching
+        self._started = True
+        await self.router.store.connect()
+        await wait_for_catalog()  # Restored views are rebuilt from the catalog
+        await self.router.restore()
+        if self.update_path_choices() and self.client.sync_interactions:
+            await self.client.synchronise_interactions()  # The path files disagreed with their `path:` lines
+        if scales[0] is not self:
+            return  # The catalog is shared by the whole process, so only one scale watches and checks it
+        if os.environ.get('hot_reload') and self.watcher is None:
+            self.watcher = CatalogWatcher(generation.version, generation.files, self.reload_catalog,
+                                          float(os.environ.get('hot_reload_interval', 2.0)))
+            self.watcher.start()
+        if os.environ.get('verify_assets'):
+            asyncio.ensure_future(self.verify_assets(generation))
+        if generation.images:
+            asyncio.ensure_future(self.prefetch_images(generation.images))
+
+    async def prefetch_images(self, images: ImageCache):
+        try:
+            failed = await images.prefetch()
+        except Exception as e:
+            logging.warning(f"Could not prefetch card images: {e}")
+            return
+        for line in report_missing(failed):
+            logging.warning(f"Could not cache card image {line}")
+
+    async def verify_assets(self, catalog: CatalogGeneration):
+        """
+        Checks that every card image can be fetched, and shows the cards whose images can't as text
+        """
+        try:
+            missing = await catalog.assets.verify()
+        except Exception as e:
+            logging.warning(f"Could not verify card images: {e}")
+            return
+        for line in report_missing(missing):
+            logging.warning(f"Missing card image {line}")
+        catalog.renders.fall_back_to_text(missing)
+
+    async def reload_catalog(self, version: str, files: Dict[str, Path]):
+        """
+        Swaps in a new catalog generation for every shard of the process
+        """
+        global generation
+        new = await asyncio.get_event_loop().run_in_executor(None, CatalogGeneration, version, files)
+        old, generation = generation, new
+        autocomplete_cache.clear()
+        if os.environ.get('verify_assets'):
+            asyncio.ensure_future(self.verify_assets(generation))
+        if generation.images:
+            asyncio.ensure_future(self.prefetch_images(generation.images))
+        for scale in scales:
+            await scale.catalog_reloaded(old)
+
+    async def catalog_reloaded(self, old: CatalogGeneration):
+        """
+        Path and card views keep their state in their custom_ids, so the ones currently open are pinned to the old
+        generation; pack views hold on to theirs already
+        """
+        for message_id, view in self.router.views.items():
+            if view.kind in ('path', 'card'):
+                self._pinned.setdefault(message_id, old)
+
+        if self.update_path_choices() and self.client.sync_interactions:  # Only one shard pushes the commands
+            await self.client.synchronise_interactions()
+
+    def update_path_choices(self) -> bool:
+        """
+        Sets the choices of /path to the paths of the current generation
+
+        :return: True if they changed, and have to be synchronised with Discord
+        """
+        option = next(o for o in self.path_image.options if o.name == 'path_name')
+        choices = path_choices(p.name for p in generation.paths)
+        if [c.value for c in option.choices] == [c.value for c in choices]:
+            return False
+        option.choices = choices
+        return True
+
+    def generation_of(self, view: OpenView) -> CatalogGeneration:
+        return self._pinned.get(view.message_id, generation) if view else generation
+
+    @listen()
+    async def on_component(self, event: Component):
+        if generation is None:
+            await event.context.send(LOAD_FAILED if _load_failed else WARMING_UP, ephemeral=True)
+            if _load_failed:
+                catalog_ready()
+            return
+        await self.router.dispatch(event.context)
+
+    async def view_message(self, view: OpenView) -> Message:
+        if view.message is None:  # Restored from the store and not clicked on since
+            view.message = await self.client.cache.get_message(view.channel_id, view.message_id)
+        return view.message
+
+    async def disable_view(self, view: OpenView):
+        self._pinned.pop(view.message_id, None)
+        msg = await self.view_message(view)
+        rows = disable_all(msg.components)
+        await msg.edit(content="Timed Out", components=rows)
+
+    async def disable_pack(self, view: OpenView):
+        if not view.hidden:  # Hidden messages can't be edited once the interaction token is gone
+            msg = await self.view_message(view)
+            rows = disable_all(msg.components)
+            await msg.edit(content="Timed Out", embeds=[], components=rows)
 
     @slash_command(name="path",
                    description="Display an entire path")
@@ -300,45 +501,31 @@ class CardScale(Scale):
                   opt_type=OptionTypes.STRING,
                   description="Path to be displayed",
                   required=True,
-                  choices=path_choices([p for p in all_paths() if p.name != 'Heirloom']))
+                  choices=path_choices([p.name for p in generation.paths] if generation else path_names()))
+    @needs_catalog
     async def path_image(self, ctx: InteractionContext, path_name: str, ephemeral: bool = False):
-        path = next((p for p in paths if p.name == path_name), None)
+        path = generation.index.path(path_name)
+        if not path:  # Removed by a hot reload, but Discord hasn't picked up the new choices yet
+            await ctx.send(f"Error: path \'{path_name}\' not found", ephemeral=True)
+            return
 
-        embed = build_embed(path)
-        rows = action_rows_from_path(path)
+        embed = generation.renders.embed(path)
+        rows = generation.renders.path_rows(path)
         msg = await ctx.send(embeds=embed, components=rows)
-        expires: datetime = datetime.now() + timedelta(minutes=30,
-                                                       seconds=0)  # Disable the whole thing after 30 minutes
-
-        # Now wait for component interactions
-        while True:
-            try:
-                interaction_timeout = expires - datetime.now()
-                event = await self.client.wait_for_component(messages=msg,
-                                                             timeout=determine_timeout(interaction_timeout.seconds))
-            except asyncio.exceptions.TimeoutError:
-                logging.debug(f"Interaction for msg id [ {msg.id} ] timed out")
-
-                # Try to clean up the buttons no matter the exception
-                rows = disable_all(rows)
-                await msg.edit(content="Timed Out", components=rows)
-                break
-            else:
-                start = timer()
-                button_ctx: ComponentContext = event.context
-                logging.debug(f"msg id [ {msg.id} ]: {button_ctx.author} clicked on: {button_ctx.custom_id}")
-
-                if button_ctx.custom_id == path.name:
-                    cmp_embed = build_embed(path)
-                else:
-                    card = path.card_by_name(button_ctx.custom_id)
-                    cmp_embed = build_embed(path, card)
-
-                rows = disable_all_but_id(rows, button_ctx.custom_id)
-                end = timer()
-                print(f"msg id [ {msg.id} ]: {button_ctx.author} interacted with [ {button_ctx.custom_id} ]. "
-                      f"Response time: [ {end - start}s ]")
-                await button_ctx.edit_origin(embeds=cmp_embed, components=rows)
+        self.router.open(msg, 'path')
+
+    async def path_clicked(self, button_ctx: ComponentContext, view: OpenView, parts: List[str]):
+        path_name, selected = parts
+        logging.debug(f"msg id [ {button_ctx.message.id} ]: {button_ctx.author} clicked on: {selected}")
+        catalog = self.generation_of(view)
+        path = catalog.index.path(path_name)
+        card = path.card_by_name(selected) if path else None
+        if not path or (not card and selected != path.name):  # The path's own button shows the path image again
+            return
+
+        cmp_embed = catalog.renders.embed(path, card)
+        rows = catalog.renders.path_rows(path, selected)
+        await self.router.edit(button_ctx, view, embeds=cmp_embed, components=rows)
 
     @slash_command(name="card",
                    description="Displays a card and all cards linked to it")
@@ -347,6 +534,7 @@ class CardScale(Scale):
                   required=True,
                   opt_type=OptionTypes.STRING,
                   autocomplete=True)
+    @needs_catalog
     async def card_image(self, ctx: InteractionContext, card_name: str, ephemeral: bool = False):
         card, path = find_card(card_name)
         if not card:
@@ -355,11 +543,27 @@ class CardScale(Scale):
 
         card_view = CardView(card.name)
 
-        msg = await ctx.send(embeds=card_view.embed(), components=card_view.components())
+        await self.send_card_view(ctx, card_view)
+
+    async def send_card_view(self, ctx: InteractionContext, card_view: CardView):
+        embed = card_view.embed()
+        file = card_view.attachment(embed)
+        msg = await ctx.send(embeds=embed, components=card_view.components(), file=file)
         if card_view.interactable():
-            await card_view.await_interactions(msg, self.client)
+            self.router.open(msg, 'card')
+
+    async def card_clicked(self, button_ctx: ComponentContext, view: OpenView, parts: List[str]):
+        card_name, selected = parts
+        logging.debug(f"msg id [ {button_ctx.message.id} ]: {button_ctx.author} clicked on: {selected}")
+        try:
+            card_view = CardView(card_name, self.generation_of(view))
+        except ValueError:
+            return
+        card_view.select(selected)
+        await self.router.edit(button_ctx, view, embeds=card_view.embed(), components=card_view.components())
 
     @card_image.autocomplete("card_name")
+    @needs_catalog
     async def autocomplete_cardname(self, ctx: AutocompleteContext, card_name: str):
         """
         Sends a list of autocomplete options back to Discord based on the partial card name provided
@@ -368,21 +572,10 @@ class CardScale(Scale):
         :param card_name: The substring to match against
         """
 
-        cards = {card.name.lower(): card.name for path in paths for card in path.cards}
-
-        if len(card_name) <= 3:
-            cutoff = 0
-        elif 3 < len(card_name) <= 6:
-            cutoff = 0.3
-        else:
-            cutoff = 0.5
-        closest = difflib.get_close_matches(card_name.lower(), list(cards.keys()), n=10, cutoff=cutoff)
-
-        filtered = list(filter(lambda c: card_name.lower() in c, closest))
-        no_matches = list(filter(lambda c: card_name.lower() not in c, closest))
-        filtered.extend(no_matches)
-
-        closest_dicts = [{"name": cards[c], "value": cards[c]} for c in filtered]
+        catalog = generation
+        closest_dicts = autocomplete_cache.get_or_compute(
+            (catalog.version, normalize(card_name)),
+            lambda: [{"name": c, "value": c} for c in catalog.name_search.search(card_name)])
         await ctx.send(choices=closest_dicts)
 
     @slash_command(name="tournamentpack",
@@ -391,63 +584,73 @@ class CardScale(Scale):
                   opt_type=OptionTypes.BOOLEAN,
                   description="Whether this should be hidden from other users. True by default.",
                   required=False)
+    @needs_catalog
     async def generate_paths(self, ctx: InteractionContext, hidden: bool = True):
-        heirlooms = random.sample(path_by_name(paths, 'Heirloom').cards, 3)
-        randpaths = random.sample([p for p in paths if p.name != 'Heirloom'], 3)
+        catalog = generation
+        heirlooms = random.sample(catalog.index.path('Heirloom').cards, 3)
+        randpaths = random.sample([p for p in catalog.paths if p.name != 'Heirloom'], 3)
 
-        pack_view = TournamentPackView(heirlooms, randpaths)
+        pack_view = TournamentPackView(heirlooms, randpaths, catalog)
         msg = await ctx.send(embeds=pack_view.embeds(), components=pack_view.components(), ephemeral=hidden)
-        expires: datetime = datetime.now() + timedelta(minutes=30)  # Global timeout at 30 minutes since interaction
-
-        while True:
-            try:
-                interaction_timeout = expires - datetime.now()
-                event = await self.client.wait_for_component(messages=msg,
-                                                             timeout=determine_timeout(interaction_timeout.seconds))
-            except asyncio.exceptions.TimeoutError:
-                if not hidden:
-                    logging.debug(f"Interaction for msg id [ {msg.id} ] timed out")
-
-                    rows = disable_all(msg.components)
-                    await msg.edit(content="Timed Out", embeds=[], components=rows)
-                    break
-            else:
-                start = timer()
-                button_ctx: ComponentContext = event.context
-                # logging.debug(f"msg id [ {msg.id} ]: {button_ctx.author} clicked on: {button_ctx.custom_id}")
-
-                pack_view.select(button_ctx.custom_id)
-                end = timer()
-                print(f"msg id [ {msg.id} ]: {button_ctx.author} interacted with [ {button_ctx.custom_id} ]. "
-                      f"Response time: [ {end - start}s ]")
-                # logging.debug(f"msg id [ {msg.id} ]: {button_ctx.author} interacted with [ {button_ctx.custom_id} ]. "
-                #               f"Response time: [ {end - start}s ]")
-                await button_ctx.edit_origin(embeds=pack_view.embeds(), components=pack_view.components())
+        self.router.open(msg, 'pack', state=pack_view, hidden=hidden)
+
+    async def pack_clicked(self, button_ctx: ComponentContext, view: OpenView, parts: List[str]):
+        if not view:
+            await button_ctx.send("Error: this tournament pack has expired", ephemeral=True)
+            return
+
+        logging.debug(f"msg id [ {button_ctx.message.id} ]: {button_ctx.author} clicked on: {parts[-1]}")
+        pack_view: TournamentPackView = view.state
+        pack_view.select(parts[-1])
+        await self.router.edit(button_ctx, view, embeds=pack_view.embeds(), components=pack_view.components())
+
+    @slash_command(name="search",
+                   description="Search the cards by text, type, cost and more")
+    @slash_option(name="query",
+                  opt_type=OptionTypes.STRING,
+                  description="e.g. type:permanent \\attack, cost:SA, upgrade<4, blocked OR recall",
+                  required=True)
+    @needs_catalog
+    async def search_cards(self, ctx: InteractionContext, query: str):
+        try:
+            search_view = SearchView(query)
+        except QueryError as e:
+            await ctx.send(f"Error: {e}", ephemeral=True)
+            return
+        if not search_view.results:
+            await ctx.send(f"No cards match \'{query}\'", ephemeral=True)
+            return
+
+        msg = await ctx.send(embeds=search_view.embed(), components=search_view.components())
+        if search_view.pages > 1:
+            self.router.open(msg, 'search', state=search_view)
+
+    async def search_clicked(self, button_ctx: ComponentContext, view: OpenView, parts: List[str]):
+        if not view:
+            await button_ctx.send("Error: this search has expired", ephemeral=True)
+            return
+
+        search_view: SearchView = view.state
+        search_view.select(parts[-1])
+        await self.router.edit(button_ctx, view, embeds=search_view.embed(), components=search_view.components())
 
     @slash_command(name="random_heirloom",
                    description="Displays a random heirloom")
+    @needs_catalog
     async def random_heirloom(self, ctx: InteractionContext):
-        heirlooms = next(p for p in paths if p.name == "Heirloom")
+        heirlooms = generation.index.path('Heirloom')
         r_heirloom = random.choice(heirlooms.cards)
 
-        cardview = CardView(r_heirloom.name)
-
-        msg = await ctx.send(embeds=cardview.embed(), components=cardview.components())
-
-        if cardview.interactable():
-            await cardview.await_interactions(msg, self.client)
+        await self.send_card_view(ctx, CardView(r_heirloom.name))
 
     @slash_command(name="random_card",
                    description="Displays a random (non-heirloom) card")
+    @needs_catalog
     async def random_pathcard(self, ctx: InteractionContext):
-        r_cardname = random.choice([card.name for path in paths if path.name != "Heirloom" for card in path.cards])
-
-        cardview = CardView(r_cardname)
-
-        msg = await ctx.send(embeds=cardview.embed(), components=cardview.components())
+        r_cardname = random.choice([card.name for path in generation.paths if path.name != "Heirloom"
+                                    for card in path.cards])
 
-        if cardview.interactable():
-            await cardview.await_interactions(msg, self.client)
+        await self.send_card_view(ctx, CardView(r_cardname))
 
 
 def setup(snek):
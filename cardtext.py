@@ -0,0 +1,328 @@
+import functools
+import logging
+import os
+import re
+import typing
+
+import jinja2
+
+CARD_TEXT_TEMPLATES = os.environ.get('card_text_templates')
+
+# Discord markdown for every macro of the card files, as jinja2 templates over the rendered `args`, the optional
+# [bracketed] `option`, and for sequence steps the step's `index` and `content`
+MARKDOWN_TEMPLATES = {
+    'attack': '⚔️{{ args[0] }}',
+    'block': '🛡️',
+    'mana': '`{{ args[0] }}`',
+    'sequence': '**Sequence:**',
+    'step': '\n{{ index }}. {{ content }}',
+    'upgrade': '{{ args[0] }} (⬆️ {{ args[1] }})',
+    'upgradeicon': '⬆️',
+    'textbf': '**{{ args[0] }}**',
+    'textsb': '**{{ args[0] }}**',
+    'textit': '_{{ args[0] }}_',
+    'textcolor': '{{ args[1] }}',
+    'par': '\n',
+    'linebreak': '\n',
+    'vspace': '',
+    'newcommand': '',
+}
+
+PLAIN_TEMPLATES = {
+    'attack': 'attack {{ args[0] }}',
+    'block': 'block',
+    'mana': '{{ "{" ~ args[0] ~ "}" }}',
+    'sequence': 'Sequence:',
+    'step': '\n{{ index }}. {{ content }}',
+    'upgrade': '{{ args[0] }} / {{ args[1] }}',
+    'upgradeicon': 'upgrade',
+    'textbf': '{{ args[0] }}',
+    'textsb': '{{ args[0] }}',
+    'textit': '{{ args[0] }}',
+    'textcolor': '{{ args[1] }}',
+    'par': '\n',
+    'linebreak': '\n',
+    'vspace': '',
+    'newcommand': '',
+}
+
+
+class MarkupError(ValueError):
+    pass
+
+
+class Text(typing.NamedTuple):
+    value: str
+
+
+class Param(typing.NamedTuple):
+    index: int  # #1 is 1
+
+
+class Macro(typing.NamedTuple):
+    name: str
+    args: typing.Tuple[typing.Tuple['Node', ...], ...]  # Every {braced} argument right after the name
+    option: typing.Optional[str]  # The [bracketed] option between the name and the arguments, e.g. \textcolor[HTML]
+
+
+class Step(typing.NamedTuple):
+    children: typing.Tuple['Node', ...]  # One [bracketed] step of a sequence
+
+
+Node = typing.Union[Text, Param, Macro, Step]
+Nodes = typing.Tuple[Node, ...]
+
+_tokens = re.compile(r'\\([a-zA-Z]+)|\\(.)|#(\d)|([{}\[\]])|([^\\{}\[\]#]+|#)', re.DOTALL)
+
+
+def tokenize(source: str) -> typing.List[typing.Tuple[str, str]]:
+    """
+    Splits markup into (kind, value) tokens: macro, text, param and the brackets themselves
+    """
+    tokens = []
+    for macro, escaped, param, bracket, text in _tokens.findall(source):
+        if macro:
+            tokens.append(('macro', macro))
+        elif param:
+            tokens.append(('param', param))
+        elif bracket:
+            tokens.append((bracket, bracket))
+        elif tokens and tokens[-1][0] == 'text':
+            tokens[-1] = ('text', tokens[-1][1] + (escaped or text))
+        else:
+            tokens.append(('text', escaped or text))
+    return tokens
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(source: str) -> Nodes:
+    """
+    Parses card text into its syntax tree. Texts are interned and repeat across reloads, so the trees are cached
+
+    :param source: Card text, upgrade text or path extras
+    :return: The top level nodes
+    :raises MarkupError: If a brace or bracket isn't closed, or is closed without being opened
+    """
+    nodes, i = _parse(tokenize(source or ''), 0, None, source)
+    return nodes
+
+
+_malformed: typing.Set[str] = set()  # Texts whose broken markup was logged already
+
+
+def parse_leniently(source: str, where: str = None) -> Nodes:
+    """
+    Parses like `parse`, but keeps a text whose markup is broken as it is, logging the error once, so that one typo in
+    a card file costs that card its formatting instead of failing the whole catalog
+
+    :param source: Card text, upgrade text or path extras
+    :param where: Where the text comes from, for the log
+    :return: The top level nodes, or a single Text of the whole source
+    """
+    try:
+        return parse(source)
+    except MarkupError as e:
+        if source not in _malformed:
+            _malformed.add(source)
+            logging.warning(f"{where}: {e}" if where else str(e))
+        return (Text(source),)
+
+
+def _parse(tokens: typing.List[typing.Tuple[str, str]], i: int, closer: typing.Optional[str],
+           source: str) -> typing.Tuple[Nodes, int]:
+    nodes = []
+    while i < len(tokens):
+        kind, value = tokens[i]
+        i += 1
+        if kind == closer:
+            return tuple(nodes), i
+        if kind == 'macro':
+            option = None
+            args = []
+            while i < len(tokens) and (tokens[i][0] == '{' or (tokens[i][0] == '[' and option is None)):
+                if tokens[i][0] == '{':
+                    arg, i = _parse(tokens, i + 1, '}', source)
+                    args.append(arg)
+                    continue
+                end = next((j for j in range(i, len(tokens)) if tokens[j][0] == ']'), None)
+                if end is None:
+                    raise MarkupError(f"Unclosed [ after \\{value} in {source!r}")
+                option = ''.join(v for _, v in tokens[i + 1:end])
+                i = end + 1
+            nodes.append(Macro(value, tuple(args), option))
+        elif kind == 'param':
+            nodes.append(Param(int(value)))
+        elif kind == '{':
+            group, i = _parse(tokens, i, '}', source)
+            nodes.extend(group)
+        elif kind == '[' and closer is None:
+            step, i = _parse(tokens, i, ']', source)
+            nodes.append(Step(step))
+        elif kind == '}' or (kind == ']' and closer is None):
+            raise MarkupError(f"Unmatched {kind} in {source!r}")
+        elif nodes and isinstance(nodes[-1], Text):
+            nodes[-1] = Text(nodes[-1].value + value)
+        else:
+            nodes.append(Text(value))
+    if closer:
+        raise MarkupError(f"Unclosed {'{' if closer == '}' else '['} in {source!r}")
+    return tuple(nodes), i
+
+
+def macros(nodes: Nodes) -> typing.Set[str]:
+    """
+    Names of every macro used in a syntax tree, including inside arguments and steps
+    """
+    names = set()
+    for node in nodes:
+        if isinstance(node, Macro):
+            names.add(node.name)
+            for arg in node.args:
+                names |= macros(arg)
+        elif isinstance(node, Step):
+            names |= macros(node.children)
+    return names
+
+
+class Definition(typing.NamedTuple):
+    arity: int
+    body: Nodes
+
+
+def definitions(extras: typing.Optional[str], where: str = None) -> typing.Dict[str, Definition]:
+    """
+    Macros a path defines in its extras with \\newcommand{\\name}[arity]{body}
+    """
+    defined = {}
+    for node in parse_leniently(extras or '', where):
+        if isinstance(node, Macro) and node.name == 'newcommand' and len(node.args) == 2:
+            name = next((n.name for n in node.args[0] if isinstance(n, Macro)), None)
+            if name:
+                defined[name] = Definition(int(node.option or 0), node.args[1])
+    return defined
+
+
+def escape_markdown(text: str) -> str:
+    return re.sub(r'([*_~`|>\\])', r'\\\1', text)
+
+
+def _tidy(text: str) -> str:
+    """
+    Drops the spaces left around line breaks and the blank lines between sequence steps
+    """
+    text = re.sub(r'[ \t]*\n[ \t]*', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+class TextRenderer(object):
+    """
+    Renders syntax trees to one output format. Macros a path defines are expanded unless a template overrides them,
+    so \\burn{burned} comes out as whatever \\textcolor{...}{\\textbf{burned}} renders to
+    """
+    templates: typing.Dict[str, jinja2.Template]
+
+    def __init__(self, templates: typing.Dict[str, str], escape: typing.Callable[[str], str] = None):
+        environment = jinja2.Environment(autoescape=False, keep_trailing_newline=True)
+        self.templates = {name: environment.from_string(source) for name, source in templates.items()}
+        self.escape = escape or (lambda text: text)
+        self._unknown = set()
+
+    def render(self, nodes: Nodes, defined: typing.Dict[str, Definition] = None) -> str:
+        return _tidy(self._render(nodes, defined or {}, ()))
+
+    def _render(self, nodes: Nodes, defined: typing.Dict[str, Definition], params: typing.Tuple[str, ...]) -> str:
+        out = []
+        steps = 0
+        for node in nodes:
+            if isinstance(node, Text):
+                out.append(self.escape(node.value))
+            elif isinstance(node, Param):
+                out.append(params[node.index - 1] if node.index <= len(params) else '')
+            elif isinstance(node, Step):
+                steps += 1
+                content = self._render(node.children, defined, params).strip()
+                out.append(self.templates['step'].render(index=steps, content=content))
+            else:
+                args = [self._render(arg, defined, params) for arg in node.args]
+                definition = defined.get(node.name)
+                if definition and node.name not in self.templates:
+                    out.append(self._render(definition.body, defined, tuple(args[:definition.arity])))
+                elif node.name in self.templates:
+                    out.append(self.templates[node.name].render(args=args, option=node.option))
+                else:
+                    if node.name not in self._unknown:
+                        self._unknown.add(node.name)
+                        logging.warning(f"No template for \\{node.name}, rendering its arguments as they are")
+                    out.append(''.join(args))
+        return ''.join(out)
+
+
+def load_templates(filename: str = CARD_TEXT_TEMPLATES) -> typing.Dict[str, typing.Dict[str, str]]:
+    """
+    The templates of both formats, with the overrides of a yaml file, e.g.
+    markdown:
+      attack: "<:attack:1234> {{ args[0] }}"
+
+    :param filename: File of overrides by format and macro, defaults to the `card_text_templates` environment variable
+    :return: Format -> macro -> template
+    """
+    templates = {'markdown': dict(MARKDOWN_TEMPLATES), 'plain': dict(PLAIN_TEMPLATES)}
+    if filename:
+        import strictyaml as yaml  # Slow to import, and the overrides are optional
+        from strictyaml import MapPattern, Str
+
+        with open(filename, 'r') as file:
+            overrides = yaml.load(file.read(), MapPattern(Str(), MapPattern(Str(), Str()))).data
+        for output, macro_templates in overrides.items():
+            if output not in templates:
+                raise ValueError(f"{filename}: unknown output format {output!r}, expected markdown or plain")
+            templates[output].update(macro_templates)
+    return templates
+
+
+class CardText(object):
+    """
+    Card and upgrade texts rendered to Discord markdown and to plain text, once per catalog generation.
+
+    Every text is parsed once (and the trees are shared between generations), rendered in both formats with the
+    macros its path defines, and kept, so showing a card or indexing it never touches the markup again.
+    """
+    _rendered: typing.Dict[typing.Tuple[str, str, str], str]  # (format, path name, source) -> output
+
+    def __init__(self, paths: typing.Iterable[typing.Any], templates: typing.Dict[str, typing.Dict[str, str]] = None):
+        templates = templates or load_templates()
+        self.renderers = {'markdown': TextRenderer(templates['markdown'], escape_markdown),
+                          'plain': TextRenderer(templates['plain'])}
+        self._rendered = {}
+        for path in paths:
+            defined = definitions(path.extras, f"{path.name} extras")
+            for card in path.cards:
+                for source in (card.text, card.upgrade):
+                    if source is None:
+                        continue
+                    nodes = parse_leniently(source, f"{path.name}: {card.name}")
+                    for output, renderer in self.renderers.items():
+                        self._rendered[(output, path.name, source)] = renderer.render(nodes, defined)
+
+    def render(self, source: typing.Optional[str], path: typing.Any, output: str = 'markdown') -> str:
+        """
+        One rendered text of a path's card
+
+        :param source: The card's text or upgrade text
+        :param path: The path of the card, for the macros it defines
+        :param output: markdown or plain
+        :return: The rendered text, empty for a missing text
+        """
+        if source is None:
+            return ''
+        rendered = self._rendered.get((output, path.name, source))
+        if rendered is None:
+            rendered = self._rendered[(output, path.name, source)] = self.renderers[output].render(
+                parse_leniently(source, path.name), definitions(path.extras, f"{path.name} extras"))
+        return rendered
+
+    def markdown(self, source: typing.Optional[str], path: typing.Any) -> str:
+        return self.render(source, path, 'markdown')
+
+    def plain(self, source: typing.Optional[str], path: typing.Any) -> str:
+        return self.render(source, path, 'plain')
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import re
+import typing
+
+from cards import Path, load_path
+
+SNAPSHOT_FILE = os.environ.get('catalog_snapshot', 'paths/catalog.pickle')
+SNAPSHOT_VERSION = 4  # Bump whenever Card or Path change shape, so that old snapshots are rebuilt
+
+
+def yaml_files() -> typing.List[str]:
+    return sorted(glob.glob('paths/*.yaml'))
+
+
+def content_hash(files: typing.List[str] = None) -> str:
+    """
+    Hashes the contents of every path file, so that any edit to the card data invalidates the snapshot
+
+    :param files: Files to hash, defaults to every yaml file in paths/
+    :return: Hex digest of the snapshot version and the file contents
+    """
+    return hash_contents(read_files(files if files is not None else yaml_files()))
+
+
+def read_files(files: typing.List[str]) -> typing.Dict[str, bytes]:
+    contents = {}
+    for filename in files:
+        with open(filename, 'rb') as file:
+            contents[filename] = file.read()
+    return contents
+
+
+def hash_contents(contents: typing.Dict[str, bytes]) -> str:
+    """
+    Hashes path files that have already been read, see content_hash
+
+    :param contents: The bytes of every file, keyed by file name in the order they should be hashed
+    :return: Hex digest of the snapshot version and the file contents
+    """
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    for filename, data in contents.items():
+        digest.update(filename.encode())
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def parse_files(files: typing.List[str]) -> typing.Dict[str, Path]:
+    return {filename: load_path(filename) for filename in files}
+
+
+def write_snapshot(digest: str, files: typing.Dict[str, Path], filename: str = SNAPSHOT_FILE):
+    tmp_filename = f"{filename}.tmp"
+    try:
+        with open(tmp_filename, 'wb') as file:
+            pickle.dump((digest, files), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)  # Never leave a half-written snapshot behind
+    except OSError as e:
+        logging.warning(f"Could not write catalog snapshot to {filename}: {e}")
+
+
+def build_snapshot(filename: str = SNAPSHOT_FILE) -> typing.Dict[str, Path]:
+    """
+    Parses every path file and writes the result to the snapshot file
+
+    :param filename: Where the snapshot should be written
+    :return: The freshly parsed paths, keyed by the file they were parsed from
+    """
+    digest = content_hash()
+    files = parse_files(yaml_files())
+    write_snapshot(digest, files, filename)
+    return files
+
+
+def load_files(filename: str = SNAPSHOT_FILE, version: str = None) -> typing.Tuple[str, typing.Dict[str, Path]]:
+    """
+    Loads every path from the snapshot if it is still up to date, otherwise parses the yaml files and rebuilds it.
+    Every process that loads it unpickles a copy of its own
+
+    :param filename: Location of the snapshot file
+    :param version: The expected catalog version, when the caller already knows it (the launcher builds the snapshot
+        before starting its workers), so that the yaml files aren't read again to hash them
+    :return: Tuple of the catalog version (content hash) and the paths keyed by the file they were parsed from
+    """
+    current = version or content_hash()
+    try:
+        with open(filename, 'rb') as file:
+            digest, files = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, TypeError, ImportError) as e:
+        logging.info(f"Catalog snapshot unavailable ({e}), rebuilding")
+    else:
+        if digest == current:
+            return digest, files
+        logging.info("Catalog snapshot is out of date, rebuilding")
+
+    return current, build_snapshot(filename)
+
+
+def path_names(files: typing.List[str] = None) -> typing.List[str]:
+    """
+    The name of every path, read from the `path:` line of each file without parsing it, for what has to be known
+    before the catalog is loaded, like the choices of /path
+
+    :param files: Files to read, defaults to every yaml file in paths/
+    :return: The path names, in file order
+    """
+    names = []
+    for filename in (files if files is not None else yaml_files()):
+        with open(filename, 'r') as file:
+            match = re.search(r'^path:[ \t]*(.+?)[ \t]*$', file.read(), re.MULTILINE)
+        if match:
+            names.append(match.group(1).strip('\'"'))
+    return names
+
+
+def load_catalog(filename: str = SNAPSHOT_FILE) -> typing.Tuple[str, typing.List[Path]]:
+    """
+    Loads every path, see load_files
+
+    :param filename: Location of the snapshot file
+    :return: Tuple of the catalog version (content hash) and the list of all paths
+    """
+    digest, files = load_files(filename)
+    return digest, list(files.values())
+
+
+def load_paths(filename: str = SNAPSHOT_FILE) -> typing.List[Path]:
+    return load_catalog(filename)[1]
+
+
+class CatalogWatcher(object):
+    """
+    Hot reload for the card data. Polls the modification times of paths/*.yaml and re-parses only the files that
+    changed (on a worker thread), then hands the complete new set of paths to `on_reload`.
+
+    A file that fails to parse (e.g. saved halfway through an edit) is logged and skipped until it changes again, and
+    the path it held stays in the catalog as it was. The other files changed in the same poll are reloaded anyway.
+    The catalog version is hashed from the same bytes the paths were parsed from, so that it always describes them.
+    """
+    interval: float
+    version: str
+    files: typing.Dict[str, Path]
+
+    def __init__(self, version: str, files: typing.Dict[str, Path],
+                 on_reload: typing.Callable[[str, typing.Dict[str, Path]], typing.Awaitable],
+                 interval: float = 2.0, snapshot: str = SNAPSHOT_FILE):
+        self.version = version
+        self.files = files
+        self.on_reload = on_reload
+        self.interval = interval
+        self.snapshot = snapshot
+        self._stats = self._stat()  # Before reading, so that an edit made in between is picked up by the first poll
+        self._contents = read_files([f for f in self._stats if f in files])  # What the paths in use were parsed from
+        self._failed = {}  # Stats of the files that failed to parse, so that they are only retried once they change
+        self._task: typing.Optional[asyncio.Task] = None
+        if hash_contents(self._contents) != version:
+            self._stats = {}  # Edited since the catalog was loaded, parse everything again on the first poll
+
+    @staticmethod
+    def _stat() -> typing.Dict[str, typing.Tuple[int, int]]:
+        stats = {}
+        for filename in yaml_files():
+            try:
+                st = os.stat(filename)
+            except OSError:  # Deleted since the glob
+                continue
+            stats[filename] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    @staticmethod
+    def _parse(files: typing.List[str]) -> typing.Tuple[typing.Dict[str, typing.Tuple[bytes, Path]],
+                                                        typing.Dict[str, Exception]]:
+        """
+        Reads and parses every file on its own
+
+        :return: Tuple of the bytes and path of every file that parsed, and the error of every file that didn't
+        """
+        parsed, failed = {}, {}
+        for filename in files:
+            try:
+                with open(filename, 'rb') as file:
+                    data = file.read()
+                parsed[filename] = (data, load_path(filename, data.decode()))
+            except Exception as e:
+                failed[filename] = e
+        return parsed, failed
+
+    async def poll(self) -> bool:
+        """
+        Checks the path files once, reloading the catalog if any of them changed
+
+        :return: True if a new catalog was handed to `on_reload`
+        """
+        stats = self._stat()
+        changed = [f for f, st in stats.items() if st != self._stats.get(f) and st != self._failed.get(f)]
+        deleted = [f for f in self._stats if f not in stats]
+        self._failed = {f: st for f, st in self._failed.items() if f in stats}
+        if not changed and not deleted:
+            return False
+
+        loop = asyncio.get_event_loop()
+        parsed, failed = await loop.run_in_executor(None, self._parse, changed)
+        for filename, e in failed.items():
+            logging.warning(f"Not reloading {filename}, failed to parse it: {e}")
+            self._failed[filename] = stats[filename]
+        for filename in deleted:
+            del self._stats[filename]
+        for filename in parsed:
+            self._stats[filename] = stats[filename]
+            self._failed.pop(filename, None)
+
+        files, contents = {}, {}
+        for filename in sorted(stats):
+            if filename in parsed:
+                contents[filename], files[filename] = parsed[filename]
+            elif filename in self.files and filename in self._contents:
+                files[filename], contents[filename] = self.files[filename], self._contents[filename]
+        version = hash_contents(contents)
+        if version == self.version:
+            return False  # Touched, but not changed
+
+        self.version, self.files, self._contents = version, files, contents
+        reloaded = [f for f in changed if f in parsed] + deleted
+        logging.info(f"Reloaded {', '.join(reloaded)}, catalog version {version[:12]}")
+        await loop.run_in_executor(None, write_snapshot, version, files, self.snapshot)
+        await self.on_reload(version, files)
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logging.warning(f"Catalog hot reload failed: {e}")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prebuild the compiled card catalog snapshot")
+    parser.add_argument('--output', default=SNAPSHOT_FILE, help="Where to write the snapshot")
+    parser.add_argument('--check', action='store_true',
+                        help="Only check whether the snapshot is up to date (exit code 1 if it is not)")
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            with open(args.output, 'rb') as f:
+                up_to_date = pickle.load(f)[0] == content_hash()
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, TypeError, ImportError):
+            up_to_date = False
+        print(f"{args.output} is {'up to date' if up_to_date else 'out of date'}")
+        raise SystemExit(0 if up_to_date else 1)
+
+    built = build_snapshot(args.output)
+    print(f"Wrote {sum(len(p.cards) for p in built.values())} cards from {len(built)} paths to {args.output}")
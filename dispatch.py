@@ -0,0 +1,299 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from dis_snek.models import ComponentContext, Message
+
+from expiry import ExpiryScheduler, RateLimitedQueue
+from metrics import registry
+from store import StateStore
+
+SEPARATOR = '|'
+
+ClickHandler = Callable[[ComponentContext, Optional['OpenView'], List[str]], Awaitable[Any]]
+TimeoutHandler = Callable[['OpenView'], Awaitable[Any]]
+
+
+class ViewHandlers(NamedTuple):
+    on_click: ClickHandler
+    on_timeout: Optional[TimeoutHandler]
+    stateless: bool
+    load_state: Optional[Callable[[dict], Any]]
+
+
+def custom_id(kind: str, *parts: str) -> str:
+    """
+    Encodes the view type and the state needed to handle a click into a component custom_id
+
+    :param kind: The view type, used to pick the click handler
+    :param parts: Names making up the state of the view
+    :return: The custom_id, e.g. "card|Swift Arrow|Keep At Range"
+    """
+    return SEPARATOR.join((kind, *parts))
+
+
+def parse_custom_id(cid: str) -> Tuple[str, List[str]]:
+    kind, *parts = cid.split(SEPARATOR)
+    return kind, parts
+
+
+class OpenView(object):
+    """
+    Bookkeeping for one interactive message. Views whose state is fully encoded in their custom_ids leave `state` empty.
+    `message` is only known once the view has been opened or clicked on by this process, and `displayed` once the
+    router has edited it
+    """
+    __slots__ = ('kind', 'channel_id', 'message_id', 'expires', 'state', 'hidden', 'message', 'displayed')
+
+    kind: str
+    channel_id: int
+    message_id: int
+    expires: float  # time.monotonic() timestamp after which the view is disabled, no matter how recently it was used
+    state: Any
+    hidden: bool
+    message: Optional[Message]
+    displayed: Optional[dict]  # The edit_origin arguments of the last edit, to skip edits that change nothing
+
+    def __init__(self, kind: str, channel_id: int, message_id: int, expires: float, state: Any = None,
+                 hidden: bool = False, message: Message = None):
+        self.kind = kind
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.expires = expires
+        self.state = state
+        self.hidden = hidden
+        self.message = message
+        self.displayed = None
+
+    def to_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'channel_id': self.channel_id,
+            'message_id': self.message_id,
+            'expires_at': time.time() + self.expires - time.monotonic(),  # Monotonic time doesn't survive a restart
+            'state': self.state.to_dict() if self.state is not None else None,
+            'hidden': self.hidden,
+        }
+
+
+class PendingEdit(object):
+    """
+    The clicks on a message that came in while it was being edited, to be shown by its next edit
+    """
+    __slots__ = ('payload', 'ctx', 'acknowledging', 'acknowledged', 'task')
+
+    payload: Optional[dict]  # edit_origin arguments of the latest click, None when there is nothing left to show
+    ctx: Optional[ComponentContext]  # The latest acknowledged click, whose token makes the next edit
+    acknowledging: int  # Clicks whose deferred update hasn't been answered yet
+    task: Optional[asyncio.Task]  # Makes the edits that follow the first one
+
+    def __init__(self):
+        self.payload = None
+        self.ctx = None
+        self.acknowledging = 0
+        self.acknowledged = asyncio.Event()
+        self.task = None
+
+
+class ComponentRouter(object):
+    """
+    Single entry point for every component interaction.
+
+    Clicks are routed by the view type encoded in the custom_id, and the per-message state lives in one dict keyed by
+    message id, so nothing is parked waiting on any particular message. Views expire from one shared scheduler, and
+    their "Timed Out" edits are spaced out so that a burst of expirations doesn't run into Discord's rate limits.
+    When a store is given, open views are persisted so a restarted worker keeps handling clicks on existing messages.
+
+    Click handlers show their result through `edit`, which coalesces the edits of rapid clicks on one message.
+    """
+    idle_timeout: float = 5 * 60  # Limit between component interactions
+    lifetime: float = 30 * 60  # Disable the whole thing after 30 minutes
+    views: Dict[int, OpenView]
+    expiry: ExpiryScheduler
+    timeouts: RateLimitedQueue
+    store: Optional[StateStore]
+    state_kind: str  # Kind the views are stored under
+    coalesce_clicks: bool  # Whether the clicks on a message that is being edited are shown by one edit after it
+
+    def __init__(self, store: StateStore = None, timeout_edits_per_second: float = 5, state_kind: str = 'view',
+                 coalesce_clicks: bool = True):
+        self.views = {}
+        self.expiry = ExpiryScheduler(self._expire)
+        self.timeouts = RateLimitedQueue(timeout_edits_per_second)
+        self.store = store
+        self.state_kind = state_kind
+        self.coalesce_clicks = coalesce_clicks
+        self._handlers: Dict[str, ViewHandlers] = {}
+        self._edits: Dict[int, PendingEdit] = {}  # Message id -> its coalesced edit
+
+    def register(self, kind: str, on_click: ClickHandler, on_timeout: TimeoutHandler = None, stateless: bool = True,
+                 load_state: Callable[[dict], Any] = None):
+        """
+        Registers the handlers for one view type
+
+        :param kind: The view type, as encoded in custom_ids
+        :param on_click: Called with the ComponentContext, the OpenView (if it is still tracked) and the custom_id parts
+        :param on_timeout: Called with the OpenView once it expires
+        :param stateless: Whether clicks can be handled from the custom_id alone, e.g. after a restart
+        :param load_state: Rebuilds a view's state from the dict its `to_dict` returned, when restoring from the store
+        """
+        on_click = registry.timed(f"component {kind}")(on_click)
+        self._handlers[kind] = ViewHandlers(on_click, on_timeout, stateless, load_state)
+
+    def open(self, message: Message, kind: str, state: Any = None, hidden: bool = False) -> OpenView:
+        # dis_snek doesn't expose the channel id of a message publicly, and the channel itself may not be cached
+        view = OpenView(kind, int(message._channel_id), int(message.id), time.monotonic() + self.lifetime, state,
+                        hidden, message)
+        self.views[view.message_id] = view
+        self._schedule(view)
+        self.save(view)
+        return view
+
+    def close(self, message_id: int) -> Optional[OpenView]:
+        self.expiry.cancel(message_id)
+        if self.store:
+            self.store.delete(self.state_kind, message_id)
+        return self.views.pop(message_id, None)
+
+    def save(self, view: OpenView):
+        if self.store:
+            self.store.put(self.state_kind, view.message_id, view.to_dict())
+
+    async def restore(self):
+        """
+        Reloads every view that was open when the previous worker stopped, and schedules their expiry
+        """
+        if not self.store:
+            return
+
+        now, wall_now = time.monotonic(), time.time()
+        for key, data in (await self.store.load(self.state_kind)).items():
+            handlers = self._handlers.get(data['kind'])
+            try:
+                if handlers is None:
+                    raise KeyError(data['kind'])
+                state = None
+                if data['state'] is not None:
+                    state = handlers.load_state(data['state'])
+            except Exception as e:  # Unknown view type, or the cards it showed are gone
+                logging.info(f"Dropping stored view for msg id [ {key} ]: {e!r}")
+                self.store.delete(self.state_kind, key)
+                continue
+
+            view = OpenView(data['kind'], data['channel_id'], data['message_id'],
+                            now + data['expires_at'] - wall_now, state, data['hidden'])
+            self.views[view.message_id] = view
+            self._schedule(view)
+        logging.info(f"Restored {len(self.views)} open views")
+
+    def _schedule(self, view: OpenView):
+        self.expiry.schedule(view.message_id, min(time.monotonic() + self.idle_timeout, view.expires))
+
+    async def _expire(self, message_ids: List[int]):
+        for message_id in message_ids:
+            view = self.views.pop(message_id, None)
+            if not view:
+                continue
+            logging.debug(f"Interaction for msg id [ {message_id} ] timed out")
+            if self.store:
+                self.store.delete(self.state_kind, message_id)
+            on_timeout = self._handlers[view.kind].on_timeout
+            if on_timeout:
+                self.timeouts.put(functools.partial(on_timeout, view))
+
+    async def dispatch(self, ctx: ComponentContext) -> bool:
+        """
+        Routes a component interaction to the handler registered for its view type
+
+        :param ctx: The ComponentContext of the interaction
+        :return: True if the interaction was handled
+        """
+        kind, parts = parse_custom_id(ctx.custom_id)
+        handler = self._handlers.get(kind)
+        if handler is None:
+            return False
+
+        view = self.views.get(int(ctx.message.id))
+        if view:
+            view.message = ctx.message
+            self._schedule(view)
+        elif handler.stateless:
+            view = self.open(ctx.message, kind)  # e.g. opened by a worker that ran without a store
+        await handler.on_click(ctx, view, parts)
+        if view and view.state is not None:
+            self.save(view)
+        return True
+
+    async def edit(self, ctx: ComponentContext, view: Optional[OpenView], **payload):
+        """
+        Shows the result of a click. A click on a message that isn't being edited edits it right away, unless the
+        message already shows exactly that. The clicks that come in while the edit is in flight are only acknowledged,
+        with a deferred update, and once it is done one more edit shows the latest of them. Clicking quickly through a
+        view costs an edit per round trip to Discord, instead of an edit per click queueing up behind the rate limit
+
+        :param ctx: The ComponentContext of the click
+        :param view: The view clicked on, which remembers what it shows
+        :param payload: The arguments of ComponentContext.edit_origin
+        """
+        if not self.coalesce_clicks:
+            await ctx.edit_origin(**payload)
+            return
+
+        message_id = int(ctx.message.id)
+        pending = self._edits.get(message_id)
+        if pending is not None:
+            pending.payload = payload  # Set before acknowledging, so that the clicks are applied in the order they came
+            pending.acknowledging += 1
+            try:
+                await ctx.defer(edit_origin=True)
+                pending.ctx = ctx
+            finally:
+                pending.acknowledging -= 1
+                pending.acknowledged.set()
+            return
+
+        pending = self._edits[message_id] = PendingEdit()
+        try:
+            if view is not None and view.displayed == payload:
+                await ctx.defer(edit_origin=True)  # Nothing to change, only acknowledge the click
+            else:
+                await ctx.edit_origin(**payload)
+                if view is not None:
+                    view.displayed = payload
+        finally:
+            if pending.payload is None:
+                del self._edits[message_id]
+            else:
+                pending.task = asyncio.ensure_future(self._follow_up(message_id, pending, view))
+
+    async def _follow_up(self, message_id: int, pending: PendingEdit, view: Optional[OpenView]):
+        """
+        Edits the message with the latest of the clicks that came in during the previous edit, until none come in
+        """
+        try:
+            while pending.payload is not None:
+                while pending.acknowledging:
+                    pending.acknowledged.clear()
+                    await pending.acknowledged.wait()
+                payload, ctx = pending.payload, pending.ctx
+                pending.payload, pending.ctx = None, None
+                if ctx is None or (view is not None and view.displayed == payload):
+                    continue  # None of the clicks could be acknowledged, or they changed nothing
+                try:
+                    await ctx.edit_origin(**payload)
+                except Exception as e:
+                    logging.warning(f"Could not edit msg id [ {message_id} ]: {e!r}")
+                    continue
+                if view is not None:
+                    view.displayed = payload
+        finally:
+            del self._edits[message_id]
+
+    async def flush_edits(self):
+        """
+        Waits for the pending edits to be made
+        """
+        tasks = [pending.task for pending in self._edits.values() if pending.task]
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class ExpiryScheduler(object):
+    """
+    Expires keys from a single background task instead of one timer per key.
+
+    Deadlines live in a heap with lazy deletion: rescheduling a key just pushes a new entry, and stale entries are
+    skipped when they surface. Deadlines are rounded up to `resolution` seconds so that keys expiring close together
+    are handed to `on_expire` as one batch, and the task only wakes up when something is actually due.
+    """
+    resolution: float
+    _heap: List[Tuple[float, int, Hashable]]
+    _deadlines: Dict[Hashable, float]
+
+    def __init__(self, on_expire: Callable[[List[Hashable]], Awaitable], resolution: float = 1.0):
+        self.on_expire = on_expire
+        self.resolution = resolution
+        self._heap = []
+        self._deadlines = {}
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, key: Hashable, deadline: float):
+        """
+        Schedules (or reschedules) a key to expire
+
+        :param key: The key to expire
+        :param deadline: time.monotonic() timestamp at which the key expires
+        """
+        deadline = -(-deadline // self.resolution) * self.resolution  # Round up into the next batch
+        self._deadlines[key] = deadline
+        self._seq += 1
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._deadlines):
+            self._compact()
+
+        self._ensure_running()
+        if self._heap[0][0] == deadline:
+            self._wakeup.set()  # New earliest deadline, so the runner has to recompute how long to sleep
+
+    def cancel(self, key: Hashable):
+        self._deadlines.pop(key, None)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> List[Hashable]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if self._heap:
+                timeout = max(self._heap[0][0] - time.monotonic(), 0)
+            else:
+                timeout = None
+            # asyncio.wait instead of wait_for, which can swallow a cancellation when the event is set at the same time
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait((waiter,), timeout=timeout)
+            finally:
+                waiter.cancel()
+
+            due = self._pop_due(time.monotonic())
+            if due:
+                try:
+                    await self.on_expire(due)
+                except Exception as e:
+                    logging.warning(f"Failed to expire {len(due)} keys: {e}")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+class RateLimitedQueue(object):
+    """
+    Runs queued coroutine factories one after another, at most `rate` per second, from a single background task
+    """
+    rate: float
+
+    def __init__(self, rate: float = 5):
+        self.rate = rate
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def put(self, job: Callable[[], Awaitable]):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.ensure_future(self._run())
+        self._queue.put_nowait(job)
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            started = time.monotonic()
+            try:
+                await job()
+            except Exception as e:
+                logging.warning(f"Rate limited job failed: {e}")
+            await asyncio.sleep(max(1 / self.rate - (time.monotonic() - started), 0))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
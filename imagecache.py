@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import threading
+from typing import Dict, Optional, Set, Tuple, Union
+
+import aiohttp
+from dis_snek.models import File
+
+from assets import AssetResolver, asset_url, report_missing
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed for the thumbnails, full size images are cached without it
+    Image = None
+
+IMAGE_CACHE_DIR = os.environ.get('image_cache')  # Where downloaded card images are kept, the cache is off when unset
+IMAGE_BASE_URL = os.environ.get('image_base_url')  # Public URL the cache directory is served from, if any
+THUMBNAIL_WIDTH = int(os.environ.get('thumbnail_width', 300))
+THUMBNAIL_DIR = 'thumbnails'
+
+
+def _safe(name: str) -> str:
+    return name.replace('/', '_').replace('\\', '_')
+
+
+class ImageCache(object):
+    """
+    Card images downloaded once from the art repository and kept on disk.
+
+    The directory is laid out like the art repository, <version>/<path>/<card>.png, with resized copies under
+    thumbnails/<version>/<path>/<card>.png, so serving it as static files from `base_url` gives the same URLs with a
+    different base. Without a base URL, cached images can be sent as attachments instead.
+    """
+    assets: AssetResolver
+    directory: str
+    base_url: Optional[str]
+    thumbnail_width: int
+    _cached: Set[Tuple[str, str]]  # (path name, card name) of the images on disk
+    _thumbnails: Set[Tuple[str, str]]
+
+    def __init__(self, assets: AssetResolver, directory: str, base_url: str = None,
+                 thumbnail_width: int = THUMBNAIL_WIDTH):
+        self.assets = assets
+        self.directory = directory
+        self.base_url = base_url
+        self.thumbnail_width = thumbnail_width
+        self._cached = {key for key in assets.urls() if os.path.isfile(self.file(*key))}
+        self._thumbnails = {key for key in assets.urls() if os.path.isfile(self.file(*key, thumbnail=True))}
+
+    def __len__(self):
+        return len(self._cached)
+
+    def file(self, path_name: str, card_name: str, thumbnail: bool = False) -> str:
+        root = os.path.join(self.directory, THUMBNAIL_DIR) if thumbnail else self.directory
+        return os.path.join(root, _safe(self.assets.version), _safe(path_name), f"{_safe(card_name)}.png")
+
+    def url(self, card_name: str, path_name: str, thumbnail: bool = False) -> Optional[str]:
+        """
+        URL of a cached image on the public mirror
+
+        :param card_name: Name of the card, or of the path for the path image
+        :param path_name: Name of the path
+        :param thumbnail: Whether the resized copy is wanted, falls back to the full size image
+        :return: The mirror URL, or None when there is no mirror or the image isn't cached yet
+        """
+        if not self.base_url:
+            return None
+        key = (path_name, card_name)
+        if thumbnail and key in self._thumbnails:
+            return asset_url(card_name, path_name, self.assets.version, f"{self.base_url}{THUMBNAIL_DIR}/")
+        if key in self._cached:
+            return asset_url(card_name, path_name, self.assets.version, self.base_url)
+        return None
+
+    def attach(self, embed: dict, card_name: str, path_name: str) -> Optional[File]:
+        """
+        Points an embed's image at an attachment of the cached file, when there is no public mirror to link to.
+        Only meant for messages that are never edited, as an edit can't swap the attachment out
+
+        :param embed: Serialized embed, modified in place
+        :param card_name: Name of the card, or of the path for the path image
+        :param path_name: Name of the path
+        :return: The file to send with the message, or None if the embed keeps its URL
+        """
+        if self.base_url or (path_name, card_name) not in self._cached or 'image' not in embed:
+            return None
+        file_name = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', card_name)}.png"
+        embed['image'] = {'url': f"attachment://{file_name}"}
+        return File(self.file(path_name, card_name), file_name=file_name)
+
+    def _store(self, key: Tuple[str, str], data: Optional[bytes]):
+        """
+        Writes a downloaded image (or with no data, reads the cached one) and its thumbnail. Blocking, so it is run
+        in an executor
+        """
+        filename = self.file(*key)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"  # Workers and overlapping prefetches share the directory
+        if data is not None:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(f"{filename}.{suffix}", 'wb') as file:
+                file.write(data)
+            os.replace(f"{filename}.{suffix}", filename)
+
+        if Image is not None and key not in self._thumbnails:
+            thumbnail = self.file(*key, thumbnail=True)
+            os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+            with Image.open(filename) as image:
+                height = round(image.height * self.thumbnail_width / image.width)
+                image.resize((self.thumbnail_width, height), Image.LANCZOS).save(f"{thumbnail}.{suffix}", 'PNG')
+            os.replace(f"{thumbnail}.{suffix}", thumbnail)
+            self._thumbnails.add(key)
+        self._cached.add(key)
+
+    async def prefetch(self, session: aiohttp.ClientSession = None, concurrency: int = 8,
+                       timeout: float = 30) -> Dict[Tuple[str, str], Union[int, str]]:
+        """
+        Downloads every image that isn't cached yet, `concurrency` at a time over one pooled session, and makes the
+        missing thumbnails
+
+        :param session: Session to reuse, a new one is opened (and closed) when omitted
+        :param concurrency: Maximum number of downloads in flight
+        :param timeout: Seconds before a single download counts as failed
+        :return: The images that could not be cached, (path name, card name) -> HTTP status or error message
+        """
+        if session is None:
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+                return await self.prefetch(session, concurrency, timeout)
+
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+        async def fetch(key: Tuple[str, str], url: str) -> Optional[Union[int, str]]:
+            async with semaphore:
+                data = None
+                if key not in self._cached:
+                    try:
+                        async with session.get(url, timeout=client_timeout) as response:
+                            if response.status >= 400:
+                                return response.status
+                            data = await response.read()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        return f"{type(e).__name__}: {e}"
+                try:
+                    await loop.run_in_executor(None, self._store, key, data)
+                except Exception as e:
+                    return f"{type(e).__name__}: {e}"
+
+        wanted = [(key, url) for key, url in self.assets.urls().items()
+                  if key not in self._cached or (Image is not None and key not in self._thumbnails)]
+        results = await asyncio.gather(*(fetch(key, url) for key, url in wanted))
+        failed = {key: result for (key, _), result in zip(wanted, results) if result is not None}
+        logging.info(f"Cached {len(wanted) - len(failed)} card images for art version {self.assets.version}, "
+                     f"{len(failed)} failed")
+        return failed
+
+
+if __name__ == '__main__':
+    from catalog import load_paths
+
+    parser = argparse.ArgumentParser(description="Download every card image into the image cache")
+    parser.add_argument('--directory', default=IMAGE_CACHE_DIR or 'images', help="Cache directory")
+    parser.add_argument('--concurrency', type=int, default=8, help="Maximum number of downloads in flight")
+    args = parser.parse_args()
+
+    cache = ImageCache(AssetResolver(load_paths()), args.directory)
+    failed = asyncio.run(cache.prefetch(concurrency=args.concurrency))
+    for line in report_missing(failed):
+        print(line)
+    print(f"{len(cache)} of {len(cache.assets)} images cached in {args.directory}")
+    raise SystemExit(1 if failed else 0)
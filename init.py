@@ -1,23 +1,18 @@
-import logging
 import os
+import signal
+import sys
 
-from dis_snek import Snake
-from dis_snek.models import slash_command, InteractionContext, Button, ButtonStyles, Embed
+import startup
 
+startup.install()  # Before anything else is imported, so that the startup report covers every module
 
-snek = Snake(
-    sync_interactions=True,  # sync application commands with discord
-    delete_unused_application_cmds=True,  # Delete commands that arent listed here
-    debug_scope=os.environ.get('test_scope', False)  # Override the commands scope, and only create them in this guild
-)
+from dis_snek import Snake, Listener  # noqa: E402
+from dis_snek.models import slash_command, InteractionContext, Button, ButtonStyles, Embed  # noqa: E402
 
-logging.basicConfig(filename='app.log', level=logging.DEBUG, filemode='w',
-                    format='%(asctime)s: %(name)s - %(levelname)s - %(message)s',
-                    datefmt='%m/%d/%Y %I:%M:%S %p')
+from logs import setup_logging  # noqa: E402
+from store import get_store  # noqa: E402
 
 
-@slash_command(name="invite",
-               description="Gives a link you can use to invite this bot to your server")
 async def invite_link(ctx: InteractionContext):
     await ctx.send(content="Click to add me to your server",
                    components=Button(
@@ -27,6 +22,51 @@ async def invite_link(ctx: InteractionContext):
                            "scope=bot%20applications.commands"
                    ))
 
-snek.grow_scale("cardscale")
-# snek.grow_scale("tournament")
-snek.start(os.environ['bot_token'])
+
+async def on_login():
+    startup.timer.begin('gateway')
+
+
+async def on_startup():
+    startup.timer.end('gateway')
+    from cardscale import wait_for_catalog
+    await wait_for_catalog()  # Loading in the background with lazy_start
+    startup.timer.log_report()
+
+
+def create_snake(shard_id: int = 0, total_shards: int = 1) -> Snake:
+    """
+    Builds the client for one gateway shard with every scale grown. The launcher runs several of them per process
+
+    :param shard_id: The shard this client connects as
+    :param total_shards: The number of shards of the whole bot
+    :return: The client, ready to start
+    """
+    startup.timer.end('imports')
+    startup.timer.begin('scales')
+    snek = Snake(
+        sync_interactions=shard_id == 0,  # sync application commands with discord, once for the whole bot
+        delete_unused_application_cmds=shard_id == 0,  # Delete commands that arent listed here
+        debug_scope=os.environ.get('test_scope', False),  # Override the commands scope, only create them in this guild
+        shard_id=shard_id,
+        total_shards=total_shards,
+    )
+    invite = slash_command(name="invite", description="Gives a link you can use to invite this bot to your server")
+    snek.add_interaction(invite(invite_link))
+    snek.add_listener(Listener.create('login')(on_login))
+    snek.add_listener(Listener.create('startup')(on_startup))
+    snek.grow_scale("cardscale")
+    snek.grow_scale("metrics")
+    # snek.grow_scale("tournament")
+    startup.timer.end('scales')
+    return snek
+
+
+if __name__ == '__main__':
+    setup_logging()  # Log file, rotation and per-logger levels come from the log_* environment variables
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Unwind, so that the store gets closed
+    snek = create_snake()
+    try:
+        snek.start(os.environ['bot_token'])
+    finally:
+        snek.loop.run_until_complete(get_store().close())  # Writes out the views opened in the last flush interval
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+import aiohttp
+
+from catalog import load_files
+from logs import setup_logging, setup_worker_logging
+
+WORKER_LOG_FORMAT = '%(asctime)s: %(processName)s %(name)s - %(levelname)s - %(message)s'
+GATEWAY_URL = 'https://discord.com/api/v9/gateway/bot'
+IDENTIFY_INTERVAL = 5.0  # Discord lets max_concurrency shards identify every 5 seconds
+STALE_REPORTS = 3  # Health intervals without a report after which a worker is considered stuck
+
+
+def assign_shards(total_shards: int, workers: int) -> List[List[int]]:
+    """
+    Splits the shards between the workers round robin, so that each one gets about as many guilds
+
+    :param total_shards: The number of shards of the whole bot
+    :param workers: The number of worker processes
+    :return: The shard ids of every worker, there are never more workers than shards
+    """
+    return [list(range(i, total_shards, workers)) for i in range(min(workers, total_shards))]
+
+
+async def recommended_shards(token: str) -> Tuple[int, int]:
+    """
+    Asks Discord how many shards the bot should run, and how many of them may identify at once
+
+    :param token: The bot token
+    :return: Tuple of the shard count and max_concurrency
+    """
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers={'Authorization': f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data['shards'], data['session_start_limit']['max_concurrency']
+
+
+def resident_memory() -> int:
+    """
+    Bytes of memory the process currently holds, or at its peak where /proc isn't available
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Worker(object):
+    """
+    One worker process: a client per shard it owns, all on one event loop. Each shard waits for the launcher's
+    permission before identifying, and the worker reports its health every `interval` seconds
+    """
+    def __init__(self, index: int, shards: List[int], total_shards: int, reports, permits, interval: float):
+        self.index = index
+        self.shards = shards
+        self.total_shards = total_shards
+        self.reports = reports
+        self.permits = permits
+        self.interval = interval
+        self.clients = {}
+
+    async def run(self, token: str):
+        from init import create_snake  # The launcher process itself never loads the bot
+        from store import get_store
+
+        loop = asyncio.get_event_loop()
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        reporter = asyncio.ensure_future(self._report_periodically())
+        logins = []
+        try:
+            for shard_id in self.shards:
+                await self.wait_for_identify(shard_id)
+                client = create_snake(shard_id, self.total_shards)
+                self.clients[shard_id] = client
+                logins.append(asyncio.ensure_future(client.login(token)))
+            await asyncio.gather(*logins)
+        finally:
+            reporter.cancel()
+            for task in logins:
+                task.cancel()
+            await get_store().close()  # Writes out the views opened in the last flush interval
+
+    async def wait_for_identify(self, shard_id: int):
+        self.reports.put(('identify', self.index, shard_id))
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                # Polls, so that a shutdown never waits on a thread blocked on the queue
+                if await loop.run_in_executor(None, self.permits.get, True, 1.0) == shard_id:
+                    return
+            except queue.Empty:
+                pass
+
+    def health(self) -> dict:
+        from metrics import registry
+
+        shards = {}
+        for shard_id, client in self.clients.items():
+            try:
+                latency = float(client.average_latency)
+            except (AttributeError, TypeError):  # Not connected yet
+                latency = math.inf
+            shards[shard_id] = {'ready': client.is_ready, 'latency': latency, 'guilds': len(client.cache.guild_cache)}
+        return {
+            'pid': os.getpid(),
+            'shards': shards,
+            'memory': resident_memory(),
+            'interactions': sum(h.count for h in registry.histograms.values()),
+            'errors': sum(h.errors for h in registry.histograms.values()),
+        }
+
+    async def _report_periodically(self):
+        while True:
+            self.reports.put(('health', self.index, self.health()))
+            await asyncio.sleep(self.interval)
+
+
+def run_worker(index: int, shards: List[int], total_shards: int, version: str, log_queue, reports, permits,
+               interval: float):
+    """
+    Entry point of a worker process
+    """
+    os.environ['catalog_version'] = version  # Load the launcher's snapshot without hashing the yaml files again
+    if os.environ.get('metrics_port'):
+        os.environ['metrics_port'] = str(int(os.environ['metrics_port']) + index)  # One endpoint per worker
+    setup_worker_logging(log_queue)
+    worker = Worker(index, shards, total_shards, reports, permits, interval)
+    try:
+        asyncio.run(worker.run(os.environ['bot_token']))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        pass
+    except Exception:
+        logging.exception(f"Worker {index} failed")
+        sys.exit(1)
+
+
+class Launcher(object):
+    """
+    Runs the bot as several worker processes, each owning a share of the gateway shards.
+
+    The catalog snapshot is compiled once before any worker starts, and every worker unpickles its own copy of it
+    instead of parsing the yaml files. Workers talk to the launcher over one report queue: they ask before identifying a shard,
+    so that the whole bot keeps to Discord's identify rate limit, and send a health report every `health_interval`
+    seconds, which the launcher logs. A worker that exits or stops reporting is restarted with the same shards.
+    Every process logs through the launcher to the one log file.
+    """
+    total_shards: int
+    assignments: List[List[int]]  # Worker index -> its shard ids
+    health: Dict[int, dict]  # Worker index -> its last health report
+    _identifies: Deque[Tuple[int, int]]  # (worker index, shard id) waiting to identify
+    _last_identify: Dict[int, float]  # Rate limit bucket -> time.monotonic() of its last identify
+
+    def __init__(self, total_shards: int, workers: int, max_concurrency: int = 1, health_interval: float = 30.0):
+        self.total_shards = total_shards
+        self.assignments = assign_shards(total_shards, workers)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.health_interval = health_interval
+        self.context = multiprocessing.get_context('spawn')  # Workers start clean instead of copying the launcher
+        self.reports = self.context.Queue()
+        self.log_queue = self.context.Queue()
+        self.version = None
+        self.processes = {}
+        self.permits = {}
+        self.health = {}
+        self.last_report = {}
+        self._identifies = deque()
+        self._last_identify = {}
+
+    def run(self):
+        setup_logging(log_queue=self.log_queue, log_format=WORKER_LOG_FORMAT)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.version = load_files()[0]
+        logging.info(f"Running {self.total_shards} shards on {len(self.assignments)} workers, "
+                     f"catalog version {self.version[:12]}")
+        for index in range(len(self.assignments)):
+            self.start_worker(index)
+
+        next_check = time.monotonic() + self.health_interval
+        try:
+            while True:
+                try:
+                    self.handle(*self.reports.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+                self.grant_identifies()
+                if time.monotonic() >= next_check:
+                    next_check += self.health_interval
+                    self.check_workers()
+        finally:
+            self.stop()
+
+    def start_worker(self, index: int):
+        self.permits[index] = self.context.Queue()
+        self._identifies = deque(request for request in self._identifies if request[0] != index)
+        process = self.context.Process(
+            target=run_worker, name=f"worker-{index}", daemon=True,
+            args=(index, self.assignments[index], self.total_shards, self.version, self.log_queue, self.reports,
+                  self.permits[index], self.health_interval))
+        process.start()
+        self.processes[index] = process
+        self.last_report[index] = time.monotonic()
+        logging.info(f"Started worker {index} (pid {process.pid}) for shards {self.assignments[index]}")
+
+    def handle(self, kind: str, index: int, data):
+        if kind == 'identify':
+            self._identifies.append((index, data))
+        elif kind == 'health':
+            self.health[index] = data
+            self.last_report[index] = time.monotonic()
+
+    def grant_identifies(self):
+        """
+        Lets the waiting shards identify, one per rate limit bucket every IDENTIFY_INTERVAL seconds
+        """
+        now = time.monotonic()
+        waiting = deque()
+        while self._identifies:
+            index, shard_id = self._identifies.popleft()
+            bucket = shard_id % self.max_concurrency
+            if now - self._last_identify.get(bucket, -IDENTIFY_INTERVAL) >= IDENTIFY_INTERVAL:
+                self._last_identify[bucket] = now
+                self.permits[index].put(shard_id)
+            else:
+                waiting.append((index, shard_id))
+        self._identifies = waiting
+
+    def check_workers(self):
+        """
+        Logs every worker's last health report, and restarts the workers that exited or stopped reporting
+        """
+        now = time.monotonic()
+        for index, process in self.processes.items():
+            logging.info(self.summary(index))
+            if not process.is_alive():
+                logging.warning(f"Worker {index} exited with code {process.exitcode}, restarting it")
+            elif now - self.last_report[index] > STALE_REPORTS * self.health_interval:
+                logging.warning(f"Worker {index} hasn't reported for {now - self.last_report[index]:.0f}s, "
+                                f"restarting it")
+                process.kill()
+                process.join()
+            else:
+                continue
+            self.health.pop(index, None)
+            self.start_worker(index)
+
+    def summary(self, index: int) -> str:
+        health = self.health.get(index)
+        if not health:
+            return f"Worker {index}: no report yet"
+        shards = health['shards']
+        latencies = [s['latency'] for s in shards.values() if math.isfinite(s['latency'])]
+        latency = f"{max(latencies) * 1e3:.0f}ms" if latencies else "-"
+        return (f"Worker {index} (pid {health['pid']}): {sum(s['ready'] for s in shards.values())}/"
+                f"{len(self.assignments[index])} shards ready, {sum(s['guilds'] for s in shards.values())} guilds, "
+                f"worst latency {latency}, {health['memory'] / 2 ** 20:.0f} MiB, "
+                f"{health['interactions']} interactions, {health['errors']} errors")
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the bot as sharded worker processes")
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('shard_count', 0)),
+                        help="Total number of shards, 0 for Discord's recommendation")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('worker_count', 0)),
+                        help="Number of worker processes, 0 for one per core")
+    parser.add_argument('--max-concurrency', type=int, default=int(os.environ.get('max_concurrency', 0)),
+                        help="Shards that may identify at once, 0 for Discord's value (1 with --shards)")
+    parser.add_argument('--health-interval', type=float, default=float(os.environ.get('health_interval', 30)),
+                        help="Seconds between health reports")
+    args = parser.parse_args()
+
+    shards, max_concurrency = args.shards, args.max_concurrency or 1
+    if not shards:
+        shards, recommended_concurrency = asyncio.run(recommended_shards(os.environ['bot_token']))
+        max_concurrency = args.max_concurrency or recommended_concurrency
+    Launcher(shards, args.workers or os.cpu_count() or 1, max_concurrency, args.health_interval).run()
@@ -0,0 +1,109 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Dict, Optional
+
+LOG_FORMAT = '%(asctime)s: %(name)s - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without formatting them. The stock QueueHandler formats the whole line on the
+    calling thread, which is the event loop; here only the message arguments are merged in, so that the record is
+    safe to pickle or to read after the caller's objects change, and the formatter runs on the listener thread
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """
+    Parses per-logger levels, e.g. "dis.snek=INFO,aiohttp.access=WARNING"
+
+    :param spec: Comma separated logger=LEVEL pairs, a bare level applies to the root logger
+    :return: Logger name ('' for the root logger) -> level
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.rpartition('=')
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level {level!r} for logger {name.strip() or 'root'}")
+        levels[name.strip()] = logging.getLevelName(level)
+    return levels
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(filename: str = None, levels: str = None, max_bytes: int = None, backups: int = None,
+                  log_queue=None, log_format: str = LOG_FORMAT):
+    """
+    Logs through a queue: the calling thread only enqueues the record, and a background thread formats it and writes
+    it to a rotating log file. Every argument but the last two defaults to its environment variable
+
+    :param filename: Log file, `log_file` (app.log)
+    :param levels: Per-logger levels, `log_levels` (DEBUG for everything)
+    :param max_bytes: Size at which the log file is rotated, `log_max_bytes` (10 MB)
+    :param backups: Number of rotated files kept, `log_backups` (5)
+    :param log_queue: Queue to read the records from, e.g. a multiprocessing queue shared with worker processes
+        that log through setup_worker_logging
+    :param log_format: Format of the lines written
+    """
+    global _listener
+    filename = filename or os.environ.get('log_file', 'app.log')
+    max_bytes = max_bytes if max_bytes is not None else int(os.environ.get('log_max_bytes', 10 * 1024 * 1024))
+    backups = backups if backups is not None else int(os.environ.get('log_backups', 5))
+
+    file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups,
+                                                        encoding='utf-8', delay=True)
+    file_handler.setFormatter(logging.Formatter(log_format, LOG_DATE_FORMAT))
+    if os.path.isfile(filename) and os.path.getsize(filename):
+        file_handler.doRollover()  # Every run starts a fresh file, the previous one is kept as the first backup
+
+    if _listener:
+        stop_logging()
+    else:
+        atexit.register(stop_logging)
+    log_queue = log_queue if log_queue is not None else queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    setup_worker_logging(log_queue, levels)
+
+
+def setup_worker_logging(log_queue, levels: str = None):
+    """
+    Hands every record to the queue read by setup_logging's listener, in this process or in the launcher, which
+    writes the one log file
+
+    :param log_queue: The queue the listener reads
+    :param levels: Per-logger levels, `log_levels` (DEBUG for everything)
+    """
+    levels = parse_levels(levels if levels is not None else os.environ.get('log_levels', 'DEBUG'))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(levels.pop('', logging.DEBUG))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+def stop_logging():
+    """
+    Writes out whatever is still queued and stops the listener thread
+    """
+    global _listener
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
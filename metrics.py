@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+from dis_snek import Snake
+from dis_snek.models import InteractionCommand, listen
+
+from shards import ShardScale
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram(object):
+    """
+    Latencies counted in log-spaced buckets, `factor` apart from `minimum` seconds up, so that quantiles come out within
+    one bucket width (about 19% with the default factor) no matter how many observations there are
+    """
+    __slots__ = ('minimum', 'factor', 'buckets', 'count', 'errors', 'total')
+
+    minimum: float
+    factor: float
+    buckets: Dict[int, int]  # Bucket index -> count, bucket i holds latencies up to minimum * factor ** i
+    count: int
+    errors: int
+    total: float
+
+    def __init__(self, minimum: float = 1e-4, factor: float = 2 ** 0.25):
+        self.minimum = minimum
+        self.factor = factor
+        self.buckets = {}
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        i = max(math.ceil(math.log(seconds / self.minimum, self.factor)), 0) if seconds > self.minimum else 0
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile of the observed latencies
+
+        :param q: The quantile, between 0 and 1
+        :return: The upper bound of the bucket the quantile falls in, 0 if nothing was observed
+        """
+        rank = q * self.count
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= rank:
+                return self.minimum * self.factor ** i
+        return 0.0
+
+
+class Metrics(object):
+    """
+    Latency histograms, call counts and error counts for every handler, by name
+    """
+    histograms: Dict[str, LatencyHistogram]
+
+    def __init__(self):
+        self.histograms = {}
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.observe(seconds, error)
+
+    def timed(self, name: str) -> Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]]:
+        """
+        Decorator recording the latency of a coroutine function, and whether it raised
+
+        :param name: Name the handler is reported under
+        """
+        def decorator(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = True
+                try:
+                    result = await func(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    self.observe(name, time.perf_counter() - start, error)
+            wrapper.metrics_name = name
+            return wrapper
+        return decorator
+
+    def instrument(self, command: InteractionCommand):
+        """
+        Wraps a registered command's callback and its autocomplete callbacks, once
+        """
+        if not hasattr(command.callback, 'metrics_name'):
+            command.callback = self.timed(f"/{command.resolved_name}")(command.callback)
+        for option, callback in list(getattr(command, 'autocomplete_callbacks', {}).items()):
+            if not hasattr(callback, 'metrics_name'):
+                name = f"autocomplete /{command.resolved_name} {option}"
+                command.autocomplete_callbacks[option] = self.timed(name)(callback)
+
+    def summary(self) -> List[str]:
+        lines = []
+        for name, h in sorted(self.histograms.items()):
+            p50, p95, p99 = (h.quantile(q) * 1e3 for q in QUANTILES)
+            lines.append(f"{name}: {h.count} calls, {h.errors} errors, "
+                         f"p50 {p50:.1f}ms, p95 {p95:.1f}ms, p99 {p99:.1f}ms")
+        return lines
+
+    def prometheus(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format, as a summary per handler plus an error counter
+        """
+        lines = ['# HELP glorybot_handler_seconds Time spent handling an interaction',
+                 '# TYPE glorybot_handler_seconds summary']
+        for name, h in sorted(self.histograms.items()):
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for q in QUANTILES:
+                lines.append(f'glorybot_handler_seconds{{handler="{label}",quantile="{q}"}} {h.quantile(q):.6f}')
+            lines.append(f'glorybot_handler_seconds_sum{{handler="{label}"}} {h.total:.6f}')
+            lines.append(f'glorybot_handler_seconds_count{{handler="{label}"}} {h.count}')
+        lines += ['# HELP glorybot_handler_errors_total Interactions whose handler raised',
+                  '# TYPE glorybot_handler_errors_total counter']
+        for name, h in sorted(self.histograms.items()):
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'glorybot_handler_errors_total{{handler="{label}"}} {h.errors}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Metrics()
+_exporting = False  # The log reports and the endpoint are per process, however many shard clients it runs
+
+
+class MetricsScale(ShardScale):
+    """
+    Instruments every registered command and autocomplete once the bot is ready, and exports the metrics: a summary
+    logged every `metrics_interval` seconds, and a Prometheus endpoint on /metrics when `metrics_port` is set
+    """
+    def __init__(self, client: Snake):
+        self.client = client
+        self.interval = float(os.environ.get('metrics_interval', 300))
+        self.port = os.environ.get('metrics_port')
+        self._task: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    @listen()
+    async def on_startup(self):
+        global _exporting
+        for commands in self.client.interactions.values():
+            for command in commands.values():
+                registry.instrument(command)
+
+        if _exporting:
+            return
+        _exporting = True
+        if self.interval > 0:
+            self._task = asyncio.ensure_future(self._report())
+        if self.port:
+            app = web.Application()
+            app.router.add_get('/metrics', self._serve)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, port=int(self.port)).start()
+            logging.info(f"Serving metrics on port {self.port}")
+
+    async def _serve(self, request: web.Request) -> web.Response:
+        return web.Response(text=registry.prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for line in registry.summary():
+                logging.info(line)
+
+
+def setup(snek):
+    MetricsScale(snek)
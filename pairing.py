@@ -0,0 +1,536 @@
+import random
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+BYE = 'bye'
+
+
+def max_weight_matching(edges: Sequence[Tuple[int, int, int]], maxcardinality: bool = False) -> List[int]:
+    """
+    Maximum weight matching in a general graph, using Edmonds' blossom algorithm with the primal-dual method
+    described by Galil ("Efficient algorithms for finding maximum matching in graphs", 1986). O(n^3).
+
+    Weights must be integers; they are doubled internally so that every dual variable stays integral.
+
+    :param edges: List of (i, j, weight) tuples with vertices numbered from 0
+    :param maxcardinality: Only consider matchings of maximum cardinality, and find the heaviest among those
+    :return: List where mate[v] is the vertex matched to v, or -1 if v is single
+    """
+    if not edges:
+        return []
+
+    nvertex = 0
+    maxweight = 0
+    doubled = []
+    for i, j, wt in edges:
+        wt *= 2
+        doubled.append((i, j, wt))
+        if i >= nvertex or j >= nvertex:
+            nvertex = max(i, j) + 1
+        if wt > maxweight:
+            maxweight = wt
+    edges = doubled
+    nedge = len(edges)
+
+    # Edge k has endpoints 2k and 2k+1; endpoint[p] is the vertex at endpoint p
+    endpoint = []
+    # neighbend[v] lists the remote endpoints of the edges attached to v
+    neighbend = [[] for _ in range(nvertex)]
+    for k, (i, j, _) in enumerate(edges):
+        endpoint.append(i)
+        endpoint.append(j)
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+
+    mate = nvertex * [-1]  # Remote endpoint of the matched edge, or -1
+    # Labels of top-level blossoms and of vertices: 0 free, 1 S (outer), 2 T (inner)
+    label = (2 * nvertex) * [0]
+    labelend = (2 * nvertex) * [-1]  # Endpoint through which a labeled blossom got its label
+    inblossom = list(range(nvertex))  # Top-level blossom containing each vertex
+    blossomparent = (2 * nvertex) * [-1]
+    blossomchilds = (2 * nvertex) * [None]
+    blossombase = list(range(nvertex)) + nvertex * [-1]
+    blossomendps = (2 * nvertex) * [None]
+    bestedge = (2 * nvertex) * [-1]  # Least-slack edge to a different S-blossom
+    blossombestedges = (2 * nvertex) * [None]
+    unusedblossoms = list(range(nvertex, 2 * nvertex))
+    dualvar = nvertex * [maxweight] + nvertex * [0]
+    allowedge = nedge * [False]
+    queue = []
+
+    def slack(k):
+        i, j, wt = edges[k]
+        return dualvar[i] + dualvar[j] - 2 * wt
+
+    def blossom_leaves(b):
+        if b < nvertex:
+            yield b
+        else:
+            for t in blossomchilds[b]:
+                if t < nvertex:
+                    yield t
+                else:
+                    yield from blossom_leaves(t)
+
+    def assign_label(w, t, p):
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        bestedge[w] = bestedge[b] = -1
+        if t == 1:
+            queue.extend(blossom_leaves(b))
+        elif t == 2:
+            # The base of a T-blossom is matched, its mate becomes an S-vertex
+            base = blossombase[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v, w):
+        # Trace back from v and w to find either a new blossom (returns its base) or an augmenting path (returns -1)
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if labelend[b] == -1:
+                v = -1  # Reached a single root
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                v = endpoint[labelend[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base, k):
+        v, w, _ = edges[k]
+        bb = inblossom[base]
+        bv = inblossom[v]
+        bw = inblossom[w]
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        for v in blossom_leaves(b):
+            if label[inblossom[v]] == 2:
+                queue.append(v)  # Former T-vertices are now S-vertices and have to be scanned
+            inblossom[v] = b
+
+        bestedgeto = (2 * nvertex) * [-1]
+        for bv in path:
+            if blossombestedges[bv] is None:
+                nblists = [[p // 2 for p in neighbend[v]] for v in blossom_leaves(bv)]
+            else:
+                nblists = [blossombestedges[bv]]
+            for nblist in nblists:
+                for k in nblist:
+                    i, j, _ = edges[k]
+                    if inblossom[j] == b:
+                        i, j = j, i
+                    bj = inblossom[j]
+                    if bj != b and label[bj] == 1 and (bestedgeto[bj] == -1 or slack(k) < slack(bestedgeto[bj])):
+                        bestedgeto[bj] = k
+            blossombestedges[bv] = None
+            bestedge[bv] = -1
+        blossombestedges[b] = [k for k in bestedgeto if k != -1]
+        bestedge[b] = -1
+        for k in blossombestedges[b]:
+            if bestedge[b] == -1 or slack(k) < slack(bestedge[b]):
+                bestedge[b] = k
+
+    def expand_blossom(b, endstage):
+        for s in blossomchilds[b]:
+            blossomparent[s] = -1
+            if s < nvertex:
+                inblossom[s] = s
+            elif endstage and dualvar[s] == 0:
+                expand_blossom(s, endstage)
+            else:
+                for v in blossom_leaves(s):
+                    inblossom[v] = s
+
+        if not endstage and label[b] == 2:
+            # Relabel the children along the even path from the entry child to the base
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            p = labelend[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^ endptrick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowedge[blossomendps[b][j - endptrick] // 2] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                allowedge[p // 2] = True
+                j += jstep
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            bestedge[bv] = -1
+            j += jstep
+            # Children on the odd path may still be reachable through one of their vertices
+            while blossomchilds[b][j] != entrychild:
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    j += jstep
+                    continue
+                for v in blossom_leaves(bv):
+                    if label[v] != 0:
+                        break
+                if label[v] != 0:
+                    label[v] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assign_label(v, 2, labelend[v])
+                j += jstep
+
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        blossombestedges[b] = None
+        bestedge[b] = -1
+        unusedblossoms.append(b)
+
+    def augment_blossom(b, v):
+        # Swap matched and unmatched edges along the path from v to the base of blossom b
+        t = v
+        while blossomparent[t] != b:
+            t = blossomparent[t]
+        if t >= nvertex:
+            augment_blossom(t, v)
+        i = j = blossomchilds[b].index(t)
+        if i & 1:
+            j -= len(blossomchilds[b])
+            jstep = 1
+            endptrick = 0
+        else:
+            jstep = -1
+            endptrick = 1
+        while j != 0:
+            j += jstep
+            t = blossomchilds[b][j]
+            p = blossomendps[b][j - endptrick] ^ endptrick
+            if t >= nvertex:
+                augment_blossom(t, endpoint[p])
+            j += jstep
+            t = blossomchilds[b][j]
+            if t >= nvertex:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+        blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    def augment_matching(k):
+        v, w, _ = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = inblossom[s]
+                if bs >= nvertex:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if labelend[bs] == -1:
+                    break  # Reached a single root
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                if bt >= nvertex:
+                    augment_blossom(bt, j)
+                mate[j] = labelend[bt]
+                p = labelend[bt] ^ 1
+
+    # Every maximum weight edge is tight with the initial duals, so greedily matching them keeps the invariants and
+    # leaves far fewer stages to run. Pairing graphs are mostly made of such edges.
+    for k, (i, j, wt) in enumerate(edges):
+        if wt == maxweight and mate[i] == -1 and mate[j] == -1 and i != j:
+            mate[i] = 2 * k + 1
+            mate[j] = 2 * k
+
+    for _ in range(nvertex):
+        # Each stage either augments the matching by one edge or proves it is optimal
+        label[:] = (2 * nvertex) * [0]
+        bestedge[:] = (2 * nvertex) * [-1]
+        blossombestedges[nvertex:] = nvertex * [None]
+        allowedge[:] = nedge * [False]
+        queue[:] = []
+        for v in range(nvertex):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                assign_label(v, 1, -1)
+
+        augmented = False
+        while True:
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbend[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    if inblossom[v] == inblossom[w]:
+                        continue
+                    if not allowedge[k]:
+                        kslack = slack(k)
+                        if kslack <= 0:
+                            allowedge[k] = True
+                    if allowedge[k]:
+                        if label[inblossom[w]] == 0:
+                            assign_label(w, 2, p ^ 1)
+                        elif label[inblossom[w]] == 1:
+                            base = scan_blossom(v, w)
+                            if base >= 0:
+                                add_blossom(base, k)
+                            else:
+                                augment_matching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            # w is inside a T-blossom but hasn't been reached from outside it yet
+                            label[w] = 2
+                            labelend[w] = p ^ 1
+                    elif label[inblossom[w]] == 1:
+                        b = inblossom[v]
+                        if bestedge[b] == -1 or kslack < slack(bestedge[b]):
+                            bestedge[b] = k
+                    elif label[w] == 0:
+                        if bestedge[w] == -1 or kslack < slack(bestedge[w]):
+                            bestedge[w] = k
+
+            if augmented:
+                break
+
+            # No augmenting path with the current duals, so adjust them. Pick the smallest of the four delta types
+            deltatype = -1
+            delta = deltaedge = deltablossom = None
+            if not maxcardinality:
+                deltatype = 1
+                delta = min(dualvar[:nvertex])
+            for v in range(nvertex):
+                if label[inblossom[v]] == 0 and bestedge[v] != -1:
+                    d = slack(bestedge[v])
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 2
+                        deltaedge = bestedge[v]
+            for b in range(2 * nvertex):
+                if blossomparent[b] == -1 and label[b] == 1 and bestedge[b] != -1:
+                    d = slack(bestedge[b]) // 2
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 3
+                        deltaedge = bestedge[b]
+            for b in range(nvertex, 2 * nvertex):
+                if (blossombase[b] >= 0 and blossomparent[b] == -1 and label[b] == 2
+                        and (deltatype == -1 or dualvar[b] < delta)):
+                    delta = dualvar[b]
+                    deltatype = 4
+                    deltablossom = b
+            if deltatype == -1:
+                # Only possible with maxcardinality: no more augmenting paths, finish with a final dual update
+                deltatype = 1
+                delta = max(0, min(dualvar[:nvertex]))
+
+            for v in range(nvertex):
+                if label[inblossom[v]] == 1:
+                    dualvar[v] -= delta
+                elif label[inblossom[v]] == 2:
+                    dualvar[v] += delta
+            for b in range(nvertex, 2 * nvertex):
+                if blossombase[b] >= 0 and blossomparent[b] == -1:
+                    if label[b] == 1:
+                        dualvar[b] += delta
+                    elif label[b] == 2:
+                        dualvar[b] -= delta
+
+            if deltatype == 1:
+                break  # Optimum reached
+            elif deltatype == 2:
+                allowedge[deltaedge] = True
+                i, j, _ = edges[deltaedge]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif deltatype == 3:
+                allowedge[deltaedge] = True
+                i, j, _ = edges[deltaedge]
+                queue.append(i)
+            elif deltatype == 4:
+                expand_blossom(deltablossom, False)
+
+        if not augmented:
+            break
+
+        # Expand S-blossoms whose dual variable dropped to zero
+        for b in range(nvertex, 2 * nvertex):
+            if blossomparent[b] == -1 and blossombase[b] >= 0 and label[b] == 1 and dualvar[b] == 0:
+                expand_blossom(b, True)
+
+    return [endpoint[mate[v]] if mate[v] >= 0 else -1 for v in range(nvertex)]
+
+
+class MatchupHistory(object):
+    """
+    Pairwise history of a tournament, updated once per round.
+
+    Player names are mapped to integer ids (the bye included), and the recency-weighted penalty of every matchup
+    lives in a dense id-indexed matrix, so scoring a candidate round is one lookup per pair. Each player's opponents
+    and byes are kept alongside it, so nothing ever has to rescan the rounds.
+    """
+    ids: Dict[str, int]
+    names: List[str]
+    penalties: List[List[int]]  # penalties[a][b], 0 if a and b never played
+    opponents: List[List[int]]  # Opponent ids per round played, BYE's id for a bye
+    rounds: int
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.penalties = []
+        self.opponents = []
+        self.rounds = 0
+
+    def id(self, name: str) -> int:
+        """
+        Returns the id of a player, assigning the next free one (and growing the matrix) on first sight
+        """
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            for row in self.penalties:
+                row.append(0)
+            self.penalties.append((player_id + 1) * [0])
+            self.opponents.append([])
+        return player_id
+
+    def record(self, new_round: List[FrozenSet[str]]):
+        self.rounds += 1
+        for pair in new_round:
+            a, b = (self.id(name) for name in pair)
+            penalty = (self.penalties[a][b] or 1) * self.rounds  # We want to heavily penalize recent matchups
+            self.penalties[a][b] = self.penalties[b][a] = penalty
+            self.opponents[a].append(b)
+            self.opponents[b].append(a)
+
+    def score(self, potential_round: List[FrozenSet[str]]) -> int:
+        """
+        Total penalty of a candidate round, in O(players)
+        """
+        score = 0
+        for pair in potential_round:
+            a, b = (self.ids.get(name) for name in pair)
+            if a is not None and b is not None:
+                score += self.penalties[a][b]
+        return score
+
+    def opponents_of(self, name: str) -> List[str]:
+        player_id = self.ids.get(name)
+        if player_id is None:
+            return []
+        return [self.names[o] for o in self.opponents[player_id] if self.names[o] != BYE]
+
+    def byes(self, name: str) -> int:
+        player_id = self.ids.get(name)
+        bye_id = self.ids.get(BYE)
+        if player_id is None or bye_id is None:
+            return 0
+        return self.opponents[player_id].count(bye_id)
+
+
+def pair_players(players: Sequence[str], history: MatchupHistory, scores: Dict[str, int] = None,
+                 rng: random.Random = random) -> List[FrozenSet[str]]:
+    """
+    Pairs every player for the next round, minimizing the total penalty of the chosen matchups.
+
+    Costs are compared in order: rematches first, then repeated byes, then the squared score difference of each
+    pair. So rematches only happen when no rematch-free round exists, nobody gets a second bye unless it's the only
+    way to avoid one, and within those limits players meet opponents with the same score (Swiss pairing). The bye
+    counts as a player with 0 points, so it goes to the lowest ranked player. Ties are broken randomly.
+
+    :param players: Names of the players to pair
+    :param history: History of the previous rounds
+    :param scores: Match points of each player, for score-grouped pairing
+    :param rng: Random source used to break ties
+    :return: List of pairs, with the bye pair (if any) last
+    """
+    entrants = list(players)
+    rng.shuffle(entrants)
+    if len(entrants) % 2 == 1:
+        entrants.append(BYE)
+    if len(entrants) < 2:
+        return []
+
+    # Only pairs that already played are looked at, removed players' matchups are skipped
+    ids = [history.id(name) for name in entrants]
+    position = {player_id: i for i, player_id in enumerate(ids)}
+    costs = {}
+    bye_total = 0
+    for i, player_id in enumerate(ids):
+        row = history.penalties[player_id]
+        for opponent_id in set(history.opponents[player_id]):
+            j = position.get(opponent_id, -1)
+            if j > i:
+                costs[(i, j)] = row[opponent_id]
+                if BYE in (entrants[i], entrants[j]):
+                    bye_total += row[opponent_id]
+
+    points = [scores.get(name, 0) if scores else 0 for name in entrants]
+    score_range = max(points) - min(points)
+    if not costs and not score_range:
+        # Nothing to avoid yet, so the shuffle is already a valid round
+        mate = [i ^ 1 for i in range(len(entrants))]
+    else:
+        n = len(entrants)
+        mismatch_limit = (n // 2) * score_range ** 2 + 1  # More than the score differences of any round add up to
+        rematch_factor = (bye_total + 1) * mismatch_limit  # More than every bye and score difference combined
+        for (i, j), penalty in costs.items():
+            costs[(i, j)] = penalty * (mismatch_limit if BYE in (entrants[i], entrants[j]) else rematch_factor)
+        ceiling = max(costs.values(), default=0) + score_range ** 2 + 1
+        edges = [(i, j, ceiling - (points[i] - points[j]) ** 2) for i in range(n) for j in range(i + 1, n)]
+        for (i, j), cost in costs.items():
+            edges[i * (2 * n - i - 1) // 2 + j - i - 1] = (i, j, ceiling - cost - (points[i] - points[j]) ** 2)
+        mate = max_weight_matching(edges, maxcardinality=True)
+
+    new_round = []
+    bye_pair = None
+    for i, j in enumerate(mate):
+        if i < j:
+            pair = frozenset((entrants[i], entrants[j]))
+            if BYE in pair:
+                bye_pair = pair
+            else:
+                new_round.append(pair)
+    if bye_pair:
+        new_round.append(bye_pair)
+    return new_round
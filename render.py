@@ -0,0 +1,230 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dis_snek.const import ACTION_ROW_MAX_ITEMS
+from dis_snek.models import ActionRow, Button, ButtonStyles, Color, ComponentTypes, Embed
+
+from assets import AssetResolver, asset_url
+from cards import Card, Path
+from cardtext import CardText
+from dispatch import custom_id
+from imagecache import ImageCache
+
+TEXT_EMBEDS = bool(os.environ.get('text_embeds'))  # Show every card as text instead of its image
+
+
+def card_url(card_name: str, path_name: str) -> str:
+    return asset_url(card_name, path_name)
+
+
+def action_rows_from_path(path: Path, disabled_card: str = None, kind: str = 'path') -> List[ActionRow]:
+    rows = list()
+    if not disabled_card:
+        disabled_card = path.name
+
+    # Make path button
+    rows.append(ActionRow(Button(
+        label=path.name,
+        custom_id=custom_id(kind, path.name, path.name),
+        style=ButtonStyles.SUCCESS,
+        disabled=True if disabled_card == path.name else False
+    )))
+
+    # Make standard & linked card buttons
+    std_cards = list()
+    linked_cards = list()
+    for card in path.cards:
+        if not card.linked:
+            btn = Button(
+                label=card.name,
+                custom_id=custom_id(kind, path.name, card.name),
+                style=ButtonStyles.PRIMARY,
+                disabled=True if disabled_card == card.name else False
+            )
+            std_cards.append(btn)
+
+        else:
+            linked_cards.append(Button(
+                label=card.name,
+                custom_id=custom_id(kind, path.name, card.name),
+                style=ButtonStyles.SECONDARY,
+                disabled=True if disabled_card == card.name else False
+            ))
+    rows.append(ActionRow(*std_cards))
+    if len(linked_cards) > 0:
+        rows.append(ActionRow(*linked_cards))
+
+    return rows
+
+
+def fits_path_layout(path: Path) -> bool:
+    """
+    Whether the /path layout can show every card of a path: one row of standard cards and one of linked cards. The
+    Heirloom path has too many, and is never displayed as a path
+    """
+    linked = sum(1 for card in path.cards if card.linked)
+    return max(linked, len(path.cards) - linked) <= ACTION_ROW_MAX_ITEMS
+
+
+def components_from_linked(card: Card) -> List[Button]:
+    buttons = [Button(
+        label=card.name,
+        custom_id=custom_id('card', card.name, card.name),
+        style=ButtonStyles.SECONDARY if card.linked else ButtonStyles.PRIMARY,
+        disabled=True
+    )]
+    for c in (card.linked_to or []):
+        buttons.append(
+            Button(
+                label=c.name,
+                custom_id=custom_id('card', card.name, c.name),
+                style=ButtonStyles.SECONDARY if c.linked else ButtonStyles.PRIMARY
+            )
+        )
+    return buttons
+
+
+def build_embed(path: Path, card: Card = None, assets: AssetResolver = None) -> Embed:
+    url = assets.url if assets else card_url
+    embed = Embed(color=Color(int(path.colors[0], 16)))
+    if card:
+        embed.title = card.name
+        if card.linked:
+            embed.color = Color(int(path.colors[1], 16))
+        embed.set_image(url=url(card.name, path.name))
+    else:
+        embed.title = f"Path of the {path.name}"
+        embed.set_image(url=url(path.name, path.name))
+
+    return embed
+
+
+def build_text_embed(path: Path, card: Card, text: CardText) -> Embed:
+    """
+    Embed showing a card's rendered text instead of its image
+    """
+    embed = Embed(title=card.name, description=text.markdown(card.text, path),
+                  color=Color(int(path.colors[1 if card.linked else 0], 16)))
+    if card.upgrade:
+        embed.add_field(f"Upgrade ({card.upgrade_cost})" if card.upgrade_cost is not None else "Upgrade",
+                        text.markdown(card.upgrade, path))
+    details = [path.name, f"cost {card.cost or '-'}"]
+    if card.types:
+        details.append(', '.join(card.types))
+    if card.purchase is not None:
+        details.append(f"purchase {card.purchase}")
+    embed.set_footer(' · '.join(details))
+    return embed
+
+
+class RenderCache(object):
+    """
+    Serialized embeds and component layouts for every card and path, built once when the catalog is loaded.
+
+    Every "selected" state of the /path and /card layouts is prerendered, so handling a click is a dictionary lookup
+    plus a shallow copy. Callers must not mutate the nested dictionaries they get back.
+
+    Given the catalog's CardText, every card also gets a text embed, shown instead of the image for the cards in
+    `text_fallback` (or for all of them with `text_embeds` set).
+    """
+    _embeds: Dict[Tuple[str, Optional[str]], dict]
+    _text_embeds: Dict[Tuple[str, str], dict]
+    text_fallback: Set[Tuple[str, str]]  # (path name, card name) of the cards shown as text
+    _path_rows: Dict[Tuple[str, str, str], List[dict]]
+    _linked_rows: Dict[Tuple[str, str], dict]
+    _buttons: Dict[Tuple[str, str, ButtonStyles, bool], dict]
+    assets: AssetResolver
+    images: Optional[ImageCache]
+    text: Optional[CardText]
+
+    def __init__(self, paths: List[Path], assets: AssetResolver = None, images: ImageCache = None,
+                 text: CardText = None):
+        self.assets = assets if assets is not None else AssetResolver(paths)
+        self.images = images
+        self.text = text
+        self._embeds = {}
+        self._text_embeds = {}
+        self.text_fallback = set()
+        self._path_rows = {}
+        self._linked_rows = {}
+        self._buttons = {}
+
+        for path in paths:
+            self._embeds[(path.name, None)] = build_embed(path, assets=self.assets).to_dict()
+            for kind in ('path', 'pack') if fits_path_layout(path) else ():
+                for selected in [path.name] + [c.name for c in path.cards]:
+                    rows = [r.to_dict() for r in action_rows_from_path(path, selected, kind)]
+                    self._path_rows[(kind, path.name, selected)] = rows
+            self.button('pack', path.name, ButtonStyles.SUCCESS, True)
+            self.button('pack', path.name, ButtonStyles.SUCCESS, False)
+
+            for card in path.cards:
+                self._embeds[(path.name, card.name)] = build_embed(path, card, self.assets).to_dict()
+                if text:
+                    self._text_embeds[(path.name, card.name)] = build_text_embed(path, card, text).to_dict()
+                for selected in [b.label for b in components_from_linked(card)]:
+                    buttons = components_from_linked(card)
+                    for b in buttons:
+                        b.disabled = b.label == selected
+                    self._linked_rows[(card.name, selected)] = ActionRow(*buttons).to_dict()
+                self.button('pack', card.name, ButtonStyles.SECONDARY, True)
+                self.button('pack', card.name, ButtonStyles.SECONDARY, False)
+
+    def embed(self, path: Path, card: Card = None, thumbnail: bool = False) -> dict:
+        """
+        Embed showing a card, or the path itself
+
+        :param path: The path of the card
+        :param card: The card, defaults to the path image
+        :param thumbnail: Whether to link the resized image, when the image cache has one on its mirror
+        :return: A serialized embed
+        """
+        if card and self._text_embeds and (TEXT_EMBEDS or (path.name, card.name) in self.text_fallback):
+            return dict(self._text_embeds[(path.name, card.name)])
+        embed = dict(self._embeds[(path.name, card.name if card else None)])
+        if self.images:
+            url = self.images.url(card.name if card else path.name, path.name, thumbnail)
+            if url:
+                embed['image'] = {'url': url}
+        return embed
+
+    def fall_back_to_text(self, keys: Iterable[Tuple[str, str]]):
+        """
+        Shows cards as text from now on, e.g. those whose images AssetResolver.verify found missing or too slow
+
+        :param keys: (path name, card name) of the cards, paths themselves are ignored
+        """
+        self.text_fallback.update(key for key in keys if key in self._text_embeds)
+
+    def path_rows(self, path: Path, selected: str = None, kind: str = 'path') -> List[dict]:
+        """
+        Action rows for the /path layout
+
+        :param path: The displayed path
+        :param selected: Name of the selected (disabled) card or path, defaults to the path itself
+        :param kind: View type the buttons' custom_ids are routed to
+        :return: List of serialized action rows
+        """
+        return list(self._path_rows[(kind, path.name, selected or path.name)])
+
+    def linked_row(self, card: Card, selected: str) -> dict:
+        """
+        Action row for a card and every card linked to it
+
+        :param card: The card the view was opened for
+        :param selected: Name of the selected (disabled) card
+        :return: A serialized action row
+        """
+        return dict(self._linked_rows[(card.name, selected)])
+
+    def button(self, kind: str, label: str, style: ButtonStyles, disabled: bool) -> dict:
+        key = (kind, label, style, disabled)
+        btn = self._buttons.get(key)
+        if btn is None:
+            btn = self._buttons[key] = Button(label=label, custom_id=custom_id(kind, label), style=style,
+                                              disabled=disabled).to_dict()
+        return btn
+
+    def button_row(self, kind: str, labels: List[str], style: ButtonStyles, selected: str) -> dict:
+        return {'type': ComponentTypes.ACTION_ROW,
+                'components': [self.button(kind, label, style, label == selected) for label in labels]}
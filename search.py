@@ -0,0 +1,325 @@
+import bisect
+import re
+import typing
+from collections import Counter
+
+from cardtext import CardText, macros, parse_leniently
+
+MAX_QUERY_LENGTH = 100  # Discord never sends option values longer than this
+
+_token_split = re.compile(r"[\s\-']+")
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())[:MAX_QUERY_LENGTH]
+
+
+def trigrams(text: str) -> typing.Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameSearch(object):
+    """
+    Prebuilt autocomplete index over a fixed set of names.
+
+    Lookups walk a prefix trie for the full name and for every word of the name, and fall back to n-gram
+    indexes for substrings and typos. The work per keystroke only depends on the postings of the query's trigrams,
+    never on scanning every name.
+    """
+    names: typing.List[str]
+
+    def __init__(self, names: typing.Iterable[str]):
+        self.names = sorted(set(names), key=lambda n: (n.casefold(), n))
+        self._folded = [normalize(n) for n in self.names]
+        self._name_trie = {}
+        self._token_trie = {}
+        self._substrings: typing.Dict[str, typing.List[int]] = {}
+        self._trigrams: typing.Dict[str, typing.List[int]] = {}
+        self._trigram_counts = []
+
+        for i, folded in enumerate(self._folded):
+            self._insert(self._name_trie, folded, i)
+            for token in _token_split.split(folded):
+                if token:
+                    self._insert(self._token_trie, token, i)
+            for gram in {folded[j:j + n] for n in (1, 2, 3) for j in range(len(folded) - n + 1)}:
+                self._substrings.setdefault(gram, []).append(i)
+            grams = trigrams(folded)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams.setdefault(gram, []).append(i)
+
+    @staticmethod
+    def _insert(trie: dict, key: str, i: int):
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+            ids = node.setdefault(None, [])
+            if not ids or ids[-1] != i:
+                ids.append(i)
+
+    @staticmethod
+    def _prefixed(trie: dict, prefix: str) -> typing.List[int]:
+        node = trie
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node.get(None, [])
+
+    def search(self, query: str, limit: int = 10) -> typing.List[str]:
+        """
+        Ranks names against a partial query: exact match, then prefix, word prefix, substring and finally fuzzy
+        trigram matches. Ties are broken by shorter names first.
+
+        :param query: The partial name typed so far
+        :param limit: Maximum number of names to return
+        :return: Up to `limit` names, best match first
+        """
+        q = normalize(query)
+        if not q:
+            return self.names[:limit]
+
+        if len(q) <= 3:
+            cutoff = 0
+        elif 3 < len(q) <= 6:
+            cutoff = 0.3
+        else:
+            cutoff = 0.5
+
+        tiers: typing.Dict[int, int] = {}
+        for i in self._prefixed(self._name_trie, q):
+            tiers[i] = 4 if self._folded[i] == q else 3
+
+        tokens = [t for t in _token_split.split(q) if t]
+        if tokens:
+            matched = None
+            for token in tokens:
+                ids = set(self._prefixed(self._token_trie, token))
+                matched = ids if matched is None else matched & ids
+            for i in matched:
+                tiers.setdefault(i, 2)
+
+        q_grams = trigrams(q)
+        shared = Counter()
+        for gram in q_grams:
+            shared.update(self._trigrams.get(gram, ()))
+
+        if len(q) <= 3:
+            # Too short to have inner trigrams, so substring matches come straight from the n-gram postings
+            for i in self._substrings.get(q, ()):
+                shared.setdefault(i, 0)
+
+        scored = []
+        for i, count in shared.items():
+            similarity = 2 * count / (len(q_grams) + self._trigram_counts[i])
+            tier = tiers.pop(i, None)
+            if tier is None:
+                if q in self._folded[i]:
+                    tier = 1
+                elif similarity >= cutoff:
+                    tier = 0
+                else:
+                    continue
+            scored.append((-tier, -similarity, len(self.names[i]), i))
+        scored.extend((-tier, 0, len(self.names[i]), i) for i, tier in tiers.items())
+
+        scored.sort()
+        return [self.names[s[3]] for s in scored[:limit]]
+
+
+class QueryError(ValueError):
+    pass
+
+
+_query_tokens = re.compile(r'[^\s()"]+:"[^"]*"|"[^"]*"|\(|\)|[^\s()]+')
+_comparison = re.compile(r'^([a-z_]+)(<=|>=|<|>|=|:)(.*)$')
+_words = re.compile(r"\\?[\w']+")
+_ranges = {'purchase': 'purchase', 'upgrade': 'upgrade_cost', 'cost': 'cost'}
+_fields = {'text': 'text', 'upgrade': 'upgrade', 'name': 'name', 'type': 'type', 't': 'type', 'path': 'path',
+           'p': 'path', 'cost': 'cost', 'purchase': 'purchase'}
+
+
+def words(text: str) -> typing.List[str]:
+    return _words.findall(text.casefold())
+
+
+def card_words(source: typing.Optional[str], path: typing.Any, text: CardText = None) -> typing.List[str]:
+    """
+    Words of a card's text or upgrade: those of its plain text rendering when a CardText is given, plus the name of
+    every macro it uses (\\attack, \\sequence...)
+    """
+    if not source:
+        return []
+    if text is None:
+        return words(source)
+    used = macros(parse_leniently(source))
+    return words(text.plain(source, path)) + ['\\' + name.casefold() for name in sorted(used)]
+
+
+def sorted_cost(cost: str) -> str:
+    return ''.join(sorted(cost.upper()))
+
+
+class CardSearch(object):
+    """
+    Inverted index over the cards of a catalog, for /search queries.
+
+    Every word of a card's text, upgrade and name, its types, path and cost map to the set of card ids that have them,
+    and the numeric fields are kept sorted for range queries. A query is parsed into set operations on those postings,
+    so answering it never looks at the cards themselves. Given the catalog's CardText, texts are indexed from their
+    plain rendering, so that \\burn{burned} is found as burned.
+
+    Query syntax: words match the text or the upgrade (a trailing * matches any word with that prefix), and
+    field:value restricts a match to one field: text, upgrade, name, type (t), path (p), cost (the exact symbols, in any
+    order) and purchase. purchase, upgrade (its cost) and cost (its number of symbols) also take <, <=, >, >= and =.
+    Terms are combined with AND (implicit), OR, NOT or a leading -, and grouped with parentheses.
+    """
+    cards: typing.List[typing.Tuple[typing.Any, typing.Any]]  # Card id -> (Card, Path)
+
+    def __init__(self, paths: typing.Iterable[typing.Any], text: CardText = None):
+        self.cards = []
+        self._postings: typing.Dict[str, typing.Dict[str, typing.Set[int]]] = {
+            field: {} for field in ('word', 'text', 'upgrade', 'name', 'type', 'path', 'cost')}
+        self._vocabulary: typing.Dict[str, typing.List[str]] = {}
+        self._numbers: typing.Dict[str, typing.Tuple[typing.List[int], typing.List[int]]] = {}
+
+        numbers = {field: [] for field in _ranges.values()}
+        for path in paths:
+            for card in path.cards:
+                i = len(self.cards)
+                self.cards.append((card, path))
+                terms = {
+                    'text': card_words(card.text, path, text),
+                    'upgrade': card_words(card.upgrade, path, text),
+                    'name': words(card.name),
+                    'type': [t.casefold() for t in card.types],
+                    'path': [path.name.casefold()],
+                    'cost': [sorted_cost(card.cost or '')],
+                }
+                terms['word'] = terms['text'] + terms['upgrade']
+                for field, values in terms.items():
+                    postings = self._postings[field]
+                    for value in values:
+                        postings.setdefault(value, set()).add(i)
+                for field, value in (('purchase', card.purchase), ('upgrade_cost', card.upgrade_cost),
+                                     ('cost', len(card.cost or ''))):
+                    if value is not None:
+                        numbers[field].append((value, i))
+
+        self._all = frozenset(range(len(self.cards)))
+        for field, postings in self._postings.items():
+            self._vocabulary[field] = sorted(postings)
+        for field, values in numbers.items():
+            values.sort()
+            self._numbers[field] = ([v for v, _ in values], [i for _, i in values])
+
+    def _term(self, field: str, value: str) -> typing.Set[int]:
+        postings = self._postings[field]
+        if value.endswith('*'):
+            vocabulary = self._vocabulary[field]
+            prefix = value[:-1]
+            matched = set()
+            for word in vocabulary[bisect.bisect_left(vocabulary, prefix):]:
+                if not word.startswith(prefix):
+                    break
+                matched |= postings[word]
+            return matched
+        return postings.get(value, set())
+
+    def _words(self, field: str, text: str) -> typing.Set[int]:
+        terms = words(text)
+        if not terms:
+            return set()
+        if text.endswith('*'):
+            terms[-1] += '*'
+        matched = self._term(field, terms[0])
+        for term in terms[1:]:
+            matched = matched & self._term(field, term)
+        return set(matched)
+
+    def _range(self, field: str, op: str, value: str) -> typing.Set[int]:
+        try:
+            number = int(value)
+        except ValueError:
+            raise QueryError(f"'{value}' is not a number") from None
+        values, ids = self._numbers[field]
+        lo, hi = 0, len(values)
+        if op in ('>', '>='):
+            lo = (bisect.bisect_right if op == '>' else bisect.bisect_left)(values, number)
+        elif op in ('<', '<='):
+            hi = (bisect.bisect_left if op == '<' else bisect.bisect_right)(values, number)
+        else:
+            lo, hi = bisect.bisect_left(values, number), bisect.bisect_right(values, number)
+        return set(ids[lo:hi])
+
+    def _atom(self, token: str) -> typing.Set[int]:
+        match = _comparison.match(token.casefold())
+        if match and match.group(1) in _fields:
+            name, op, value = match.groups()
+            value = value.strip('"')
+            if op != ':' or (name == 'purchase'):
+                if name not in _ranges:
+                    raise QueryError(f"{name} can't be compared with {op}")
+                return self._range(_ranges[name], '=' if op == ':' else op, value)
+            field = _fields[name]
+            if field in ('type', 'path'):
+                return self._term(field, ' '.join(value.split()))
+            if field == 'cost':
+                return self._term(field, sorted_cost(value))
+            return self._words(field, value)
+        if match and match.group(2) == ':':
+            raise QueryError(f"Unknown field '{match.group(1)}'")
+        return self._words('word', token.strip('"'))
+
+    def search(self, query: str) -> typing.List[typing.Tuple[typing.Any, typing.Any]]:
+        """
+        Finds the cards matching a query
+
+        :param query: The query, see the class documentation for the syntax
+        :return: (Card, Path) of every match, in catalog order
+        :raises QueryError: If the query can't be parsed
+        """
+        tokens = _query_tokens.findall(query)
+        if not tokens:
+            raise QueryError("The query is empty")
+        ids, position = self._or(tokens, 0)
+        if position < len(tokens):
+            raise QueryError(f"Unexpected '{tokens[position]}'")
+        return [self.cards[i] for i in sorted(ids)]
+
+    def _or(self, tokens: typing.List[str], i: int) -> typing.Tuple[typing.Set[int], int]:
+        ids, i = self._and(tokens, i)
+        while i < len(tokens) and tokens[i] == 'OR':
+            more, i = self._and(tokens, i + 1)
+            ids = ids | more
+        return ids, i
+
+    def _and(self, tokens: typing.List[str], i: int) -> typing.Tuple[typing.Set[int], int]:
+        ids, i = self._not(tokens, i)
+        while i < len(tokens) and tokens[i] not in ('OR', ')'):
+            if tokens[i] == 'AND':
+                i += 1
+            more, i = self._not(tokens, i)
+            ids = ids & more
+        return ids, i
+
+    def _not(self, tokens: typing.List[str], i: int) -> typing.Tuple[typing.Set[int], int]:
+        if i >= len(tokens):
+            raise QueryError("The query ends too early")
+        token = tokens[i]
+        if token in ('NOT', '-') or token.startswith('-'):
+            if token in ('NOT', '-'):
+                ids, i = self._not(tokens, i + 1)
+            else:
+                ids, i = self._not([token[1:]], 0)[0], i + 1
+            return self._all - ids, i
+        if token == '(':
+            ids, i = self._or(tokens, i + 1)
+            if i >= len(tokens) or tokens[i] != ')':
+                raise QueryError("Missing ')'")
+            return ids, i + 1
+        if token in ('AND', 'OR', ')'):
+            raise QueryError(f"Unexpected '{token}'")
+        return self._atom(token), i + 1
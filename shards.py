@@ -0,0 +1,35 @@
+import copy
+import inspect
+
+from dis_snek.models import Scale
+from dis_snek.models.application_commands import InteractionCommand
+from dis_snek.models.command import BaseCommand
+from dis_snek.models.listener import Listener
+
+
+def _unbound(member):
+    """
+    A copy of a command or listener declared on a scale class, with its own copy of everything a client changes
+    """
+    member = copy.copy(member)
+    if isinstance(member, InteractionCommand):
+        member.cmd_id = {}
+        member.checks = list(member.checks)
+        if getattr(member, 'options', None):
+            member.options = copy.deepcopy(member.options)  # /path changes its choices when the card data does
+    return member
+
+
+class ShardScale(Scale):
+    """
+    A scale that can be grown on several shard clients of one process.
+
+    dis_snek binds the commands and listeners declared on a scale class to the first instance it makes of it, so the
+    clients after the first would call the first one's scale. Every instance is made from a subclass of its own instead,
+    holding copies of them
+    """
+    def __new__(cls, client, *args, **kwargs):
+        members = inspect.getmembers(cls, lambda member: isinstance(member, (BaseCommand, Listener)))
+        namespace = {'__module__': cls.__module__, '__doc__': cls.__doc__, '__qualname__': cls.__qualname__}
+        namespace.update((name, _unbound(member)) for name, member in members)
+        return super().__new__(type(cls.__name__, (cls,), namespace), client, *args, **kwargs)
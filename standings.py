@@ -0,0 +1,156 @@
+from fractions import Fraction
+from typing import List, NamedTuple, Tuple
+
+from pairing import MatchupHistory
+
+WIN_POINTS = 3
+DRAW_POINTS = 1
+BYE_GAMES = (2, 0)  # A bye counts as a match won 2-0
+FLOOR = Fraction(1, 3)  # Opponents' percentages are floored at 33% so that losing to a weak player doesn't hurt as much
+
+
+def match_points(games: int, opponent_games: int) -> int:
+    if games > opponent_games:
+        return WIN_POINTS
+    elif games == opponent_games:
+        return DRAW_POINTS
+    return 0
+
+
+class Standing(NamedTuple):
+    name: str
+    points: int
+    wins: int
+    losses: int
+    draws: int
+    omw: Fraction  # Opponents' match-win percentage
+    gw: Fraction  # Game-win percentage
+    ogw: Fraction  # Opponents' game-win percentage
+
+
+class Standings(object):
+    """
+    Swiss standings with tie-breakers, maintained incrementally.
+
+    Every player (by MatchupHistory id) keeps running totals, and the sums of their opponents' match-win and game-win
+    percentages. Reporting a result updates the two players, then pushes the change in their percentages to each of
+    their opponents, so a report costs O(rounds) and sorting the standings never looks at the rounds again.
+    Byes count as a win for the player but are left out of everybody's tie-breakers.
+    """
+    history: MatchupHistory
+    wins: List[int]
+    draws: List[int]
+    matches: List[int]
+    games_won: List[int]
+    games: List[int]
+    opponents: List[List[int]]  # Ids of the opponents each player has a reported result against
+    opponent_mw: List[Fraction]  # Sum of the opponents' match-win percentages
+    opponent_gw: List[Fraction]  # Sum of the opponents' game-win percentages
+
+    def __init__(self, history: MatchupHistory):
+        self.history = history
+        self.wins = []
+        self.draws = []
+        self.matches = []
+        self.games_won = []
+        self.games = []
+        self.opponents = []
+        self.opponent_mw = []
+        self.opponent_gw = []
+
+    def _id(self, name: str) -> int:
+        player_id = self.history.id(name)
+        while len(self.wins) <= player_id:
+            for totals in (self.wins, self.draws, self.matches, self.games_won, self.games):
+                totals.append(0)
+            self.opponents.append([])
+            self.opponent_mw.append(Fraction(0))
+            self.opponent_gw.append(Fraction(0))
+        return player_id
+
+    def _points(self, player_id: int) -> int:
+        return WIN_POINTS * self.wins[player_id] + DRAW_POINTS * self.draws[player_id]
+
+    def _mw(self, player_id: int) -> Fraction:
+        if not self.matches[player_id]:
+            return FLOOR
+        return max(Fraction(self._points(player_id), WIN_POINTS * self.matches[player_id]), FLOOR)
+
+    def _gw(self, player_id: int) -> Fraction:
+        if not self.games[player_id]:
+            return FLOOR
+        return max(Fraction(self.games_won[player_id], self.games[player_id]), FLOOR)
+
+    def _update(self, player_id: int, games: int, opponent_games: int, sign: int = 1):
+        """
+        Adds (or with sign -1, removes) one match result to a player's totals, then updates their opponents' sums
+        """
+        mw, gw = self._mw(player_id), self._gw(player_id)
+        points = match_points(games, opponent_games)
+        self.wins[player_id] += sign * (points == WIN_POINTS)
+        self.draws[player_id] += sign * (points == DRAW_POINTS)
+        self.matches[player_id] += sign
+        self.games_won[player_id] += sign * games
+        self.games[player_id] += sign * (games + opponent_games)
+
+        mw_change, gw_change = self._mw(player_id) - mw, self._gw(player_id) - gw
+        if mw_change or gw_change:
+            for opponent_id in self.opponents[player_id]:
+                self.opponent_mw[opponent_id] += mw_change
+                self.opponent_gw[opponent_id] += gw_change
+
+    def record_bye(self, name: str):
+        self._update(self._id(name), *BYE_GAMES)
+
+    def record_result(self, name: str, opponent: str, games: int, opponent_games: int,
+                      previous: Tuple[int, int] = None):
+        """
+        Records the result of one match
+
+        :param name: One of the players
+        :param opponent: The other player
+        :param games: Games won by `name`
+        :param opponent_games: Games won by `opponent`
+        :param previous: The (games, opponent_games) reported earlier for this match, when correcting a result
+        """
+        player_id, opponent_id = self._id(name), self._id(opponent)
+        if previous is None:
+            self.opponents[player_id].append(opponent_id)
+            self.opponents[opponent_id].append(player_id)
+            self.opponent_mw[player_id] += self._mw(opponent_id)
+            self.opponent_mw[opponent_id] += self._mw(player_id)
+            self.opponent_gw[player_id] += self._gw(opponent_id)
+            self.opponent_gw[opponent_id] += self._gw(player_id)
+        else:
+            self._update(player_id, previous[0], previous[1], -1)
+            self._update(opponent_id, previous[1], previous[0], -1)
+        self._update(player_id, games, opponent_games)
+        self._update(opponent_id, opponent_games, games)
+
+    def points(self, name: str) -> int:
+        player_id = self.history.ids.get(name)
+        if player_id is None or player_id >= len(self.wins):
+            return 0
+        return self._points(player_id)
+
+    def standing(self, name: str) -> Standing:
+        player_id = self.history.ids.get(name)
+        if player_id is None or player_id >= len(self.wins):  # No result yet, and reading mustn't grow the totals
+            return Standing(name, 0, 0, 0, 0, Fraction(0), Fraction(0), Fraction(0))
+        played = len(self.opponents[player_id])
+        return Standing(
+            name=name,
+            points=self._points(player_id),
+            wins=self.wins[player_id],
+            losses=self.matches[player_id] - self.wins[player_id] - self.draws[player_id],
+            draws=self.draws[player_id],
+            omw=self.opponent_mw[player_id] / played if played else Fraction(0),
+            gw=self._gw(player_id) if self.games[player_id] else Fraction(0),
+            ogw=self.opponent_gw[player_id] / played if played else Fraction(0),
+        )
+
+    def ranked(self, players: List[str]) -> List[Standing]:
+        """
+        Standings of the given players, best first: by points, then OMW%, GW% and OGW%
+        """
+        return sorted((self.standing(p) for p in players), key=lambda s: (s.points, s.omw, s.gw, s.ogw), reverse=True)
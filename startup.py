@@ -0,0 +1,162 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+REPORT_MODULES = 10  # Slowest modules listed in the startup report
+
+
+class _TimedLoader(object):
+    """
+    Stands in for a module's loader just long enough to time executing the module
+    """
+    def __init__(self, loader, name: str, timer: 'ImportTimer'):
+        self.loader = loader
+        self.name = name
+        self.timer = timer
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # The module only ever sees its real loader, so that nothing importing resources through it is affected
+        module.__loader__ = self.loader
+        if getattr(module, '__spec__', None) is not None:
+            module.__spec__.loader = self.loader
+        self.timer.exec_module(self.loader, module, self.name)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTimer(object):
+    """
+    Meta path finder timing every module imported while it is installed, like `python -X importtime` but in the
+    process itself. It finds modules through the other finders and only wraps the loader they return.
+
+    A module's self time excludes the modules it imported in turn, its cumulative time includes them
+    """
+    modules: Dict[str, Tuple[float, float]]  # Module name -> (self seconds, cumulative seconds)
+
+    def __init__(self):
+        self.modules = {}
+        self._local = threading.local()  # The catalog can be loaded on another thread, which may import too
+
+    def find_spec(self, name: str, path=None, target=None):
+        if getattr(self._local, 'finding', False):
+            return None  # A finder importing something while looking for a module
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, name, self)
+        return spec
+
+    def exec_module(self, loader, module, name: str):
+        stack = self._local.__dict__.setdefault('stack', [])  # Time spent in nested imports, per module
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.modules[name] = (elapsed - nested, elapsed)
+
+    def slowest(self, count: int = REPORT_MODULES) -> List[Tuple[str, float, float]]:
+        """
+        The modules that took longest to execute themselves, as (name, self seconds, cumulative seconds)
+        """
+        ranked = sorted(self.modules.items(), key=lambda item: item[1][0], reverse=True)
+        return [(name, own, cumulative) for name, (own, cumulative) in ranked[:count]]
+
+
+class StartupTimer(object):
+    """
+    Times the phases of starting the bot, from the moment this module is imported. With several shard clients in one
+    process every phase is recorded the first time it completes, which is when the first shard could serve
+    """
+    started: float
+    phases: Dict[str, Tuple[float, float]]  # Phase name -> (start, seconds), the start relative to `started`
+    imports: Optional[ImportTimer]
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.imports = None
+        self.reported = False
+        self._begun = {}
+
+    def begin(self, name: str):
+        self._begun.setdefault(name, time.perf_counter())
+
+    def end(self, name: str):
+        if name in self._begun and name not in self.phases:
+            start = self._begun[name]
+            self.phases[name] = (start - self.started, time.perf_counter() - start)
+
+    @contextmanager
+    def phase(self, name: str):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def report(self) -> List[str]:
+        """
+        The startup report: the time since the process started importing, every phase in the order it began, and the
+        modules that were slowest to import
+        """
+        lines = [f"Started in {time.perf_counter() - self.started:.2f}s: " + ', '.join(
+            f"{name} {seconds:.2f}s (at {start:.2f}s)"
+            for name, (start, seconds) in sorted(self.phases.items(), key=lambda item: item[1][0]))]
+        if self.imports and self.imports.modules:
+            modules = self.imports.modules
+            lines.append(f"Imported {len(modules)} modules in {sum(own for own, _ in modules.values()):.2f}s, "
+                         f"slowest:")
+            for name, own, cumulative in self.imports.slowest():
+                lines.append(f"  {name}: {own * 1e3:.1f}ms ({cumulative * 1e3:.1f}ms with its imports)")
+        return lines
+
+    def log_report(self):
+        """
+        Logs the report once per process, and stops timing imports
+        """
+        if self.reported:
+            return
+        self.reported = True
+        uninstall()
+        for line in self.report():
+            logging.info(line)
+
+
+timer = StartupTimer()
+
+
+def install():
+    """
+    Starts timing imports and the `imports` phase. Call it before importing anything else
+    """
+    if timer.imports is None:
+        timer.imports = ImportTimer()
+        sys.meta_path.insert(0, timer.imports)
+    timer.begin('imports')
+
+
+def uninstall():
+    if timer.imports in sys.meta_path:
+        sys.meta_path.remove(timer.imports)
@@ -0,0 +1,222 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+CREATE_TABLE = ("CREATE TABLE IF NOT EXISTS state "
+                "(kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (kind, key))")
+
+
+class StateStore(abc.ABC):
+    """
+    Async key/value store for state that should survive a restart (open views, tournaments).
+
+    Values are JSON-serializable dicts grouped by kind. Writes are buffered and flushed in one batch every
+    `flush_interval` seconds, so handlers never wait on the database; only the latest write per key is kept.
+    """
+    flush_interval: float
+    _pending: Dict[Tuple[str, str], Optional[str]]
+
+    def __init__(self, flush_interval: float = 2.0):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._connected: Optional[asyncio.Future] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        """
+        Connects to the database. Safe to call from every scale, only the first call actually connects
+        """
+        if self._connected is None:
+            self._connected = asyncio.ensure_future(self._connect())
+        await self._connected
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._connected:
+            await self.flush()
+            await self._close()
+            self._connected = None
+
+    def put(self, kind: str, key, value: dict):
+        self._pending[(kind, str(key))] = json.dumps(value)
+
+    def delete(self, kind: str, key):
+        self._pending[(kind, str(key))] = None
+
+    async def load(self, kind: str) -> Dict[str, dict]:
+        """
+        Loads every stored value of one kind, including writes that haven't been flushed yet
+
+        :param kind: The kind of state, e.g. "view" or "tournament"
+        :return: Dict of key to value
+        """
+        values = {key: json.loads(value) for key, value in await self._load(kind)}
+        for (pending_kind, key), value in self._pending.items():
+            if pending_kind == kind:
+                if value is None:
+                    values.pop(key, None)
+                else:
+                    values[key] = json.loads(value)
+        return values
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch = [(kind, key, value) for (kind, key), value in self._pending.items()]
+        self._pending = {}
+        try:
+            await self._write(batch)
+        except Exception as e:
+            logging.warning(f"Failed to write {len(batch)} state changes, retrying later: {e}")
+            for kind, key, value in batch:
+                self._pending.setdefault((kind, key), value)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    @abc.abstractmethod
+    async def _connect(self):
+        ...
+
+    @abc.abstractmethod
+    async def _close(self):
+        ...
+
+    @abc.abstractmethod
+    async def _load(self, kind: str) -> List[Tuple[str, str]]:
+        ...
+
+    @abc.abstractmethod
+    async def _write(self, batch: List[Tuple[str, str, Optional[str]]]):
+        ...
+
+
+class SQLiteStore(StateStore):
+    """
+    Store backed by a local SQLite file, used for tests and local runs. Queries run on a single worker thread
+    """
+
+    def __init__(self, filename: str = 'glorybot.db', flush_interval: float = 2.0):
+        super().__init__(flush_interval)
+        self.filename = filename
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _connect(self):
+        def connect():
+            self._db = sqlite3.connect(self.filename, check_same_thread=False)
+            self._db.execute(CREATE_TABLE)
+            self._db.commit()
+        await self._run(connect)
+
+    async def _close(self):
+        if self._db:
+            await self._run(self._db.close)
+            self._db = None
+
+    async def _load(self, kind: str) -> List[Tuple[str, str]]:
+        return await self._run(lambda: self._db.execute("SELECT key, value FROM state WHERE kind = ?", (kind,))
+                               .fetchall())
+
+    async def _write(self, batch: List[Tuple[str, str, Optional[str]]]):
+        def write():
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO state (kind, key, value) VALUES (?, ?, ?)",
+                                     [row for row in batch if row[2] is not None])
+                self._db.executemany("DELETE FROM state WHERE kind = ? AND key = ?",
+                                     [row[:2] for row in batch if row[2] is None])
+        await self._run(write)
+
+
+class PostgresStore(StateStore):
+    """
+    Store backed by Postgres through an aiopg connection pool, used in production
+    """
+
+    def __init__(self, dsn: str, flush_interval: float = 2.0):
+        super().__init__(flush_interval)
+        self.dsn = dsn
+        self._pool = None
+
+    async def _connect(self):
+        import aiopg
+
+        self._pool = await aiopg.create_pool(self.dsn)
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(CREATE_TABLE)
+
+    async def _close(self):
+        if self._pool:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def _load(self, kind: str) -> List[Tuple[str, str]]:
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT key, value FROM state WHERE kind = %s", (kind,))
+                return await cur.fetchall()
+
+    async def _write(self, batch: List[Tuple[str, str, Optional[str]]]):
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                # aiopg connections are in autocommit mode, so the batch is wrapped in an explicit transaction
+                await cur.execute("BEGIN")
+                try:
+                    for kind, key, value in batch:
+                        if value is None:
+                            await cur.execute("DELETE FROM state WHERE kind = %s AND key = %s", (kind, key))
+                        else:
+                            await cur.execute("INSERT INTO state (kind, key, value) VALUES (%s, %s, %s) "
+                                              "ON CONFLICT (kind, key) DO UPDATE SET value = EXCLUDED.value",
+                                              (kind, key, value))
+                except Exception:
+                    await cur.execute("ROLLBACK")
+                    raise
+                await cur.execute("COMMIT")
+
+
+def shard_kind(kind: str, client) -> str:
+    """
+    The kind to store one gateway shard's state under. Processes owning different shards share the store, and each
+    must only restore the views and tournaments of its own guilds; an unsharded client keeps the plain kind
+
+    :param kind: The kind of state, e.g. "view"
+    :param client: The Snake of the shard
+    :return: e.g. "view 3/8" for shard 3 of 8
+    """
+    total_shards = getattr(client, 'total_shards', 1)
+    if total_shards <= 1:
+        return kind
+    return f"{kind} {client._connection_state.shard_id}/{total_shards}"
+
+
+_store: Optional[StateStore] = None
+
+
+def get_store() -> StateStore:
+    """
+    Returns the shared state store, using Postgres when DATABASE_URL is set and a local SQLite file otherwise
+    """
+    global _store
+    if _store is None:
+        if os.environ.get('DATABASE_URL'):
+            _store = PostgresStore(os.environ['DATABASE_URL'])
+        else:
+            _store = SQLiteStore(os.environ.get('state_db', 'glorybot.db'))
+    return _store
@@ -0,0 +1,137 @@
+"""
+Stand-ins for the dis_snek client and contexts, shared by the tests and benchmarks.loadtest. They keep whatever the
+scales register and record what would have been sent back to Discord
+"""
+import asyncio
+import itertools
+import random
+from collections import defaultdict
+
+import pytest
+
+import store
+
+snowflakes = itertools.count(10 ** 17)
+rtt = 0.0  # Simulated round trip to Discord of every reply, in seconds
+
+
+@pytest.fixture(autouse=True)
+def state_store(tmp_path, monkeypatch) -> store.SQLiteStore:
+    """
+    Gives every test a state store of its own in tmp_path, instead of a database in the working directory
+    """
+    state = store.SQLiteStore(str(tmp_path / 'state.db'))
+    monkeypatch.setattr(store, '_store', state)
+    return state
+
+
+async def discord_round_trip():
+    if rtt:
+        await asyncio.sleep(rtt * random.uniform(0.5, 1.5))
+
+
+class FakeUser(object):
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return f"user {self.id}"
+
+
+class FakeMessage(object):
+    """
+    Only what the handlers and the router read from a message, so that the memory per view is that of the bot's own
+    bookkeeping
+    """
+    __slots__ = ('id', '_channel_id', 'components', 'custom_ids')
+
+    def __init__(self, channel_id: int, components):
+        self.id = next(snowflakes)
+        self._channel_id = channel_id
+        self.components = []
+        self.set_components(components)
+
+    def set_components(self, components):
+        if isinstance(components, dict):
+            components = [components]
+        self.custom_ids = [c['custom_id'] for row in (components or []) for c in row.get('components', ())
+                           if isinstance(row, dict)]
+
+    async def edit(self, **kwargs):
+        await discord_round_trip()
+
+
+class FakeInteractionContext(object):
+    def __init__(self, author: FakeUser, guild_id: int, channel_id: int, **kwargs):
+        self.author = author
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.data = {'channel_id': str(channel_id)}
+        self.kwargs = kwargs
+        self.args = []
+        self.sent = []
+
+    async def send(self, content: str = None, components=None, **kwargs) -> FakeMessage:
+        await discord_round_trip()
+        self.sent.append(content or kwargs)
+        return FakeMessage(self.channel_id, components)
+
+
+class FakeAutocompleteContext(FakeInteractionContext):
+    async def send(self, choices=None, **kwargs):
+        await discord_round_trip()
+        self.sent.append(choices)
+
+
+class FakeComponentContext(FakeInteractionContext):
+    edits = 0  # Message edits made by all clicks
+
+    def __init__(self, author: FakeUser, message: FakeMessage, custom_id: str):
+        super().__init__(author, 0, message._channel_id)
+        self.message = message
+        self.custom_id = custom_id
+
+    async def defer(self, ephemeral=False, edit_origin=False):
+        await discord_round_trip()
+
+    async def edit_origin(self, components=None, **kwargs):
+        FakeComponentContext.edits += 1
+        await discord_round_trip()
+        self.message.set_components(components)
+        self.sent.append(kwargs)
+
+
+class FakeCache(object):
+    async def get_message(self, channel_id, message_id):
+        return None
+
+
+class FakeSnake(object):
+    """
+    Stands in for the client: keeps whatever the scales register, keyed like dis_snek's own interaction table
+    """
+    def __init__(self):
+        self.interactions = {}
+        self.listeners = defaultdict(list)
+        self.scales = {}
+        self.cache = FakeCache()
+
+    def add_interaction(self, command):
+        self.interactions[command.resolved_name] = command
+
+    def add_listener(self, listener):
+        self.listeners[listener.event].append(listener)
+
+    def add_component_callback(self, command):
+        pass
+
+    def add_message_command(self, command):
+        pass
+
+    async def synchronise_interactions(self):
+        pass
+
+    async def dispatch(self, event: str):
+        for listener in self.listeners[event]:
+            await listener.callback()
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import cardscale
+from dispatch import custom_id
+from tests.conftest import FakeComponentContext, FakeInteractionContext, FakeMessage, FakeSnake, FakeUser
+
+
+def click(path_name: str, selected: str) -> FakeComponentContext:
+    """
+    Clicks one button of a /path view that shows its first card, and returns the context once the edit is made
+    """
+    async def run():
+        scale = cardscale.CardScale(FakeSnake())
+        path = cardscale.generation.index.path(path_name)
+        message = FakeMessage(1, cardscale.generation.renders.path_rows(path, path.cards[0].name))
+        scale.router.open(message, 'path')
+        ctx = FakeComponentContext(FakeUser(1), message, custom_id('path', path_name, selected))
+        await scale.router.dispatch(ctx)
+        await scale.router.flush_edits()
+        scale.router.expiry.stop()
+        scale.router.timeouts.stop()
+        return ctx
+    return asyncio.run(run())
+
+
+def test_card_button_shows_the_card():
+    path = cardscale.generation.index.path('Archer')
+    card = path.cards[1]
+    ctx = click(path.name, card.name)
+    assert ctx.sent == [{'embeds': cardscale.generation.renders.embed(path, card)}]
+
+
+def test_path_button_shows_the_path():
+    path = cardscale.generation.index.path('Archer')
+    ctx = click(path.name, path.name)
+    assert ctx.sent == [{'embeds': cardscale.generation.renders.embed(path)}]
+
+
+def test_unknown_card_is_ignored():
+    ctx = click('Archer', 'No Such Card')
+    assert ctx.sent == []
+
+
+def test_failed_lazy_load_is_reported_and_retried(monkeypatch):
+    loaded = cardscale.generation
+    attempts = []
+
+    def load_generation():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("Corrupt snapshot")
+        return loaded
+
+    monkeypatch.setattr(cardscale, 'generation', None)
+    monkeypatch.setattr(cardscale, '_loading', None)
+    monkeypatch.setattr(cardscale, 'load_generation', load_generation)
+
+    async def run():
+        scale = cardscale.CardScale(FakeSnake())
+        with pytest.raises(ValueError):
+            await cardscale.catalog_ready()
+        failed = FakeInteractionContext(FakeUser(1), 1, 2)
+        await scale.client.interactions['random_heirloom'](failed)  # Answers the error, and loads again
+        await cardscale.catalog_ready()
+        retried = FakeInteractionContext(FakeUser(1), 1, 2)
+        await scale.client.interactions['random_heirloom'](retried)
+        scale.router.expiry.stop()
+        scale.router.timeouts.stop()
+        return failed.sent, retried.sent
+
+    failed, retried = asyncio.run(run())
+    assert failed == [cardscale.LOAD_FAILED]
+    assert len(attempts) == 2
+    assert cardscale.generation is loaded and 'embeds' in retried[0]
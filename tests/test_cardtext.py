@@ -0,0 +1,33 @@
+import logging
+
+from cards import Path
+from cardtext import CardText
+from search import CardSearch
+
+MALFORMED = '''path: Typo
+resources: SFF
+colors: 284A30 - 7F8853
+
+cards:
+- Loose Brace:
+    cost: A
+    text: >
+        \\sequence [\\attack{2}] [\\textbf{Recall} me}.
+- Fine:
+    cost: A
+    text: >
+        \\attack{1}
+'''
+
+
+def test_malformed_markup_keeps_the_card(caplog):
+    with caplog.at_level(logging.WARNING):
+        path = Path.from_text(MALFORMED, 'paths/typo.yaml')
+    card = path.card_by_name('Loose Brace')
+    assert 'sequence' in card.types  # Found in the text as it is written
+    assert 'paths/typo.yaml: Loose Brace' in caplog.text
+
+    text = CardText([path])
+    assert text.plain(card.text, path) == card.text
+    assert text.plain(path.card_by_name('Fine').text, path) == 'attack 1'
+    assert [c.name for c, _ in CardSearch([path], text).search('recall')] == ['Loose Brace']
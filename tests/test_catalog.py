@@ -0,0 +1,63 @@
+import asyncio
+import os
+import pickle
+import shutil
+
+import pytest
+
+import catalog
+
+
+@pytest.mark.parametrize('contents', [
+    pickle.dumps(42),  # Not a (digest, files) tuple
+    pickle.dumps(('digest', {}))[:-1],  # Truncated
+    b'\x80\x04\x8c\x0bno_such_mod\x94\x8c\x03Foo\x94\x93\x94.',  # Refers to a module that no longer exists
+])
+def test_stale_snapshot_is_rebuilt(tmp_path, contents):
+    snapshot = tmp_path / 'catalog.pickle'
+    snapshot.write_bytes(contents)
+    version, files = catalog.load_files(str(snapshot))
+    assert version == catalog.content_hash()
+    assert len(files) == len(catalog.yaml_files())
+    assert pickle.loads(snapshot.read_bytes())[0] == version
+
+
+def test_watcher_reloads_the_files_that_parse(tmp_path, monkeypatch):
+    (tmp_path / 'paths').mkdir()
+    for name in ('archer.yaml', 'assassin.yaml'):
+        shutil.copy(os.path.join('paths', name), tmp_path / 'paths' / name)
+    monkeypatch.chdir(tmp_path)
+    archer, assassin = tmp_path / 'paths' / 'archer.yaml', tmp_path / 'paths' / 'assassin.yaml'
+    snapshot = str(tmp_path / 'catalog.pickle')
+    version, files = catalog.load_files(snapshot)
+    reloads = []
+
+    async def on_reload(new_version, new_files):
+        reloads.append((new_version, new_files))
+
+    async def poll(watcher):
+        return await watcher.poll()
+
+    watcher = catalog.CatalogWatcher(version, files, on_reload, snapshot=snapshot)
+    broken = assassin.read_text()
+    archer.write_text(archer.read_text() + NEW_CARD)
+    assassin.write_text(broken + '\n- {unfinished\n')
+    assert asyncio.run(poll(watcher))
+    assert watcher.files['paths/archer.yaml'].card_by_name('Test Shot')
+    assert watcher.files['paths/assassin.yaml'] is files['paths/assassin.yaml']
+    assert not asyncio.run(poll(watcher))  # The broken file isn't parsed again until it changes
+
+    assassin.write_text(broken)
+    assert not asyncio.run(poll(watcher))  # Back to the path that was kept
+    assert watcher.files['paths/archer.yaml'].card_by_name('Test Shot')
+    assert watcher.version == catalog.content_hash() == reloads[-1][0]
+    digest, stored = pickle.loads(open(snapshot, 'rb').read())
+    assert digest == watcher.version and stored['paths/archer.yaml'].card_by_name('Test Shot')
+
+
+NEW_CARD = '''
+- Test Shot:
+    cost: A
+    text: >
+        \\attack{2}
+'''
@@ -0,0 +1,95 @@
+import asyncio
+
+from dispatch import ComponentRouter
+
+
+class Message(object):
+    def __init__(self):
+        self.id = 1
+        self._channel_id = 2
+
+
+class Click(object):
+    """
+    A component context whose replies take `delay` seconds, recording them in the order they are made
+    """
+    def __init__(self, log: list, message: Message, delay: float = 0.01, fail: bool = False):
+        self.log = log
+        self.message = message
+        self.delay = delay
+        self.fail = fail
+
+    async def defer(self, ephemeral=False, edit_origin=False):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("Unknown interaction")
+        self.log.append('defer')
+
+    async def edit_origin(self, **payload):
+        await asyncio.sleep(self.delay)
+        self.log.append(payload['embeds'])
+
+
+def run(clicks):
+    async def main():
+        router = ComponentRouter()
+        view = router.open(Message(), 'path')
+        await clicks(router, view)
+        await router.flush_edits()
+        router.expiry.stop()
+        router.timeouts.stop()
+        return router
+    return asyncio.run(asyncio.wait_for(main(), 5))  # A click left waiting would hang the test
+
+
+def test_first_click_edits_right_away():
+    log = []
+
+    async def clicks(router, view):
+        await router.edit(Click(log, view.message), view, embeds='a')
+        assert log == ['a']
+
+    assert not run(clicks)._edits
+
+
+def test_clicks_during_an_edit_are_coalesced():
+    log = []
+
+    async def clicks(router, view):
+        first = asyncio.ensure_future(router.edit(Click(log, view.message), view, embeds='a'))
+        await asyncio.sleep(0)
+        await asyncio.gather(*(router.edit(Click(log, view.message, 0.001 * i), view, embeds=e)
+                               for i, e in enumerate('bcd')))
+        await first
+
+    router = run(clicks)
+    assert log == ['defer', 'defer', 'defer', 'a', 'd']
+    assert not router._edits
+
+
+def test_identical_payload_is_not_edited():
+    log = []
+
+    async def clicks(router, view):
+        await router.edit(Click(log, view.message), view, embeds='a')
+        await router.edit(Click(log, view.message), view, embeds='a')
+
+    run(clicks)
+    assert log == ['a', 'defer']
+
+
+def test_failed_acknowledgement_does_not_leave_the_edit_pending():
+    log = []
+
+    async def clicks(router, view):
+        first = asyncio.ensure_future(router.edit(Click(log, view.message, 0.02), view, embeds='a'))
+        await asyncio.sleep(0)
+        try:
+            await router.edit(Click(log, view.message, fail=True), view, embeds='b')
+        except ConnectionError:
+            pass
+        await first
+
+    router = run(clicks)
+    assert log == ['a']
+    assert not router._edits
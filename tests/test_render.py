@@ -0,0 +1,11 @@
+from catalog import load_paths
+from render import RenderCache, fits_path_layout
+
+
+def test_only_paths_that_fit_get_path_rows():
+    paths = load_paths()
+    renders = RenderCache(paths)
+    assert [p.name for p in paths if not fits_path_layout(p)] == ['Heirloom']
+    for path in paths:
+        for kind in ('path', 'pack'):
+            assert ((kind, path.name, path.name) in renders._path_rows) == (path.name != 'Heirloom')
@@ -0,0 +1,39 @@
+import asyncio
+
+import cardscale
+from tests.conftest import FakeInteractionContext, FakeSnake, FakeUser
+import tournament
+
+
+def test_every_client_calls_its_own_scales(monkeypatch):
+    monkeypatch.setenv('hot_reload', '1')
+    monkeypatch.setattr(cardscale, 'scales', [])
+    clients = [FakeSnake(), FakeSnake()]
+    cards = [cardscale.CardScale(client) for client in clients]
+    tournaments = [tournament.TournamentScale(client) for client in clients]
+
+    async def run():
+        for channel_id, client in enumerate(clients):
+            ctx = FakeInteractionContext(FakeUser(1), 1, channel_id, path_name='Archer')
+            await client.interactions['path'](ctx, path_name='Archer')
+            await client.interactions['tournament create'](FakeInteractionContext(FakeUser(1), 1, channel_id))
+        opened = [([view.channel_id for view in scale.router.views.values()],
+                   [channel_id for channel_id in (0, 1) if tournaments_scale.active_tournaments.get(1, channel_id)])
+                  for scale, tournaments_scale in zip(cards, tournaments)]
+
+        watchers = []
+        for _ in range(2):
+            for client in clients:
+                await client.dispatch('startup')
+            watchers.append([scale.watcher for scale in cards])
+        for scale in cards:
+            if scale.watcher:
+                scale.watcher.stop()
+            scale.router.expiry.stop()
+            scale.router.timeouts.stop()
+        return opened, watchers
+
+    opened, (started, restarted) = asyncio.run(run())
+    assert opened == [([0], [0]), ([1], [1])]
+    assert started[0] is not None and started[1] is None  # Only the first scale of the process watches the card data
+    assert restarted == started
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from dispatch import ComponentRouter
+from pairing import BYE
+from store import SQLiteStore
+from tournament import Tournament
+
+
+class Message(object):
+    def __init__(self, message_id: int, channel_id: int):
+        self.id = message_id
+        self._channel_id = channel_id
+
+
+class Counter(object):
+    def __init__(self, count: int):
+        self.count = count
+
+    def to_dict(self) -> dict:
+        return {'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Counter':
+        return cls(data['count'])
+
+
+async def clicked(ctx, view, parts):
+    pass
+
+
+def router(store: SQLiteStore) -> ComponentRouter:
+    router = ComponentRouter(store)
+    router.register('counter', clicked, stateless=False, load_state=Counter.from_dict)
+    return router
+
+
+def test_writes_are_flushed_and_loaded(tmp_path):
+    filename = str(tmp_path / 'state.db')
+
+    async def run():
+        store = SQLiteStore(filename)
+        await store.connect()
+        store.put('view', 1, {'a': 1})
+        store.put('view', 2, {'b': 2})
+        store.put('tournament', 1, {'c': 3})
+        await store.flush()
+        store.put('view', 2, {'b': 3})
+        store.delete('view', 1)
+        store.put('view', 4, {'d': 4})
+        unflushed = await store.load('view')
+        await store.close()
+
+        reopened = SQLiteStore(filename)
+        await reopened.connect()
+        try:
+            return unflushed, await reopened.load('view'), await reopened.load('tournament')
+        finally:
+            await reopened.close()
+
+    unflushed, views, tournaments = asyncio.run(run())
+    assert unflushed == {'2': {'b': 3}, '4': {'d': 4}}  # The pending writes overlay the stored values
+    assert views == unflushed  # Written out on close
+    assert tournaments == {'1': {'c': 3}}
+
+
+def test_router_restores_open_views(tmp_path):
+    filename = str(tmp_path / 'state.db')
+
+    async def run():
+        store = SQLiteStore(filename)
+        await store.connect()
+        opened = router(store)
+        view = opened.open(Message(10, 20), 'counter', state=Counter(3), hidden=True)
+        store.put('view', 11, {'kind': 'gone', 'channel_id': 20, 'message_id': 11, 'expires_at': time.time() + 60,
+                               'state': None, 'hidden': False})
+        opened.expiry.stop()
+        await store.close()
+
+        store = SQLiteStore(filename)
+        await store.connect()
+        restored = router(store)
+        await restored.restore()
+        restored.expiry.stop()
+        try:
+            return view, restored.views, await store.load('view')
+        finally:
+            await store.close()
+
+    view, views, stored = asyncio.run(run())
+    assert list(views) == [10]
+    restored = views[10]
+    assert (restored.kind, restored.channel_id, restored.hidden) == ('counter', 20, True)
+    assert restored.state.count == 3
+    assert abs(restored.expires - view.expires) < 1  # The same deadline, carried over in wall clock time
+    assert list(stored) == ['10']  # The view of an unknown kind is dropped from the store
+
+
+def test_tournament_round_trips_through_the_store(tmp_path):
+    filename = str(tmp_path / 'state.db')
+    tournament = Tournament(None)
+    for name in ('Ann', 'Bob', 'Cid'):
+        tournament.add(name)
+    tournament.next_round()
+    player = next(p for pair in tournament.rounds[-1] if BYE not in pair for p in sorted(pair))
+    tournament.report(player, 2, 1)
+
+    async def run():
+        store = SQLiteStore(filename)
+        await store.connect()
+        store.put('tournament', '1:2', tournament.to_dict())
+        await store.close()
+
+        store = SQLiteStore(filename)
+        await store.connect()
+        try:
+            return await store.load('tournament')
+        finally:
+            await store.close()
+
+    restored = Tournament.from_dict(asyncio.run(run())['1:2'])
+    assert restored.to_dict() == tournament.to_dict()
+    assert restored.standings.ranked(restored.players) == tournament.standings.ranked(tournament.players)
@@ -1,92 +1,229 @@
 from typing import Union, List, Optional, Dict, Tuple, Set, FrozenSet
 
-import random
+import asyncio
+import itertools
+import logging
 
 from dis_snek import Snake
-from dis_snek.models import Member, GuildChannel, User, Scale, slash_command, slash_option, OptionTypes, \
-    InteractionContext, check, AutocompleteContext
+from dis_snek.models import Member, GuildChannel, User, slash_command, slash_option, OptionTypes, \
+    InteractionContext, check, AutocompleteContext, listen
+
+from cache import LRUCache
+from pairing import BYE, MatchupHistory, pair_players
+from search import normalize
+from shards import ShardScale
+from standings import Standings
+from store import StateStore, get_store, shard_kind
 
 
 class Tournament(object):
-    owners: List[Member]
+    owners: List[int]  # User ids
     players: List[str]
     rounds: List[List[FrozenSet[str]]]
+    results: List[Dict[str, int]]  # Games won by each player who reported, per round
+    history: MatchupHistory  # Derived from the rounds, never stored
+    standings: Standings  # Derived from the rounds and results, never stored
+    version: int  # Bumped whenever the player list changes
 
     def __init__(self, creator: Member):
-        self.owners = [creator]
+        self.owners = [int(creator.id)] if creator else []
         self.players = []
         self.rounds = []
+        self.results = []
+        self.history = MatchupHistory()
+        self.standings = Standings(self.history)
+        self.version = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'owners': self.owners,
+            'players': self.players,
+            'rounds': [[sorted(pair) for pair in r] for r in self.rounds],
+            'results': self.results,
+            'version': self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Tournament':
+        tournament = cls(None)
+        tournament.owners = data['owners']
+        tournament.players = data['players']
+        results = data.get('results', [])
+        for i, r in enumerate(data['rounds']):
+            tournament._record_round([frozenset(pair) for pair in r])
+            if i < len(results):
+                for pair in tournament.rounds[i]:
+                    name, opponent = sorted(pair)
+                    if name in results[i]:
+                        tournament._record_result(name, opponent, results[i][name], results[i][opponent])
+        tournament.version = data['version']
+        return tournament
 
     def add(self, name: str):
         if name in self.players:
             raise ValueError
         self.players.append(name)
+        self.version += 1
 
     def remove(self, name: str):
         self.players.remove(name)  # Throws a ValueError if the name doesn't exist
+        self.version += 1
 
-    def _generate_round(self) -> List[FrozenSet[str]]:
-        new_round = []
-        active_players = self.players.copy()
-        random.shuffle(active_players)
+    def matching_players(self, partial_name: str, limit: int = 25) -> List[str]:
+        """
+        Finds the players whose names contain the partial name, names starting with it first
 
-        while len(active_players) > 1:
-            pair = frozenset({active_players.pop(), active_players.pop()})
-            new_round.append(pair)
-        if len(active_players) == 1:  # This means we have an odd # of players and need a bye
-            new_round.append(frozenset({"bye", active_players.pop()}))
+        :param partial_name: The partial player name typed so far
+        :param limit: Maximum number of names to return (Discord accepts at most 25 choices)
+        :return: Matching player names
+        """
+        q = normalize(partial_name)
+        matches = [p for p in self.players if q in normalize(p)]
+        matches.sort(key=lambda p: not normalize(p).startswith(q))
+        return matches[:limit]
 
-        return new_round
+    def _record_round(self, new_round: List[FrozenSet[str]]):
+        self.rounds.append(new_round)
+        self.results.append({})
+        self.history.record(new_round)
+        for pair in new_round:
+            if BYE in pair:
+                self.standings.record_bye(next(p for p in pair if p != BYE))
+
+    def _record_result(self, name: str, opponent: str, games: int, opponent_games: int):
+        results = self.results[-1]
+        previous = (results[name], results[opponent]) if name in results else None
+        results[name] = games
+        results[opponent] = opponent_games
+        self.standings.record_result(name, opponent, games, opponent_games, previous)
+
+    def report(self, name: str, games: int, opponent_games: int) -> str:
+        """
+        Records the result of a player's match in the current round. Reporting again corrects the previous result
+
+        :param name: Name of the reporting player
+        :param games: Games won by the player
+        :param opponent_games: Games won by their opponent
+        :return: The opponent's name
+        :raises ValueError: If the player has no match to report in the current round
+        """
+        if not self.rounds:
+            raise ValueError("The tournament hasn't started yet")
+        pair = next((p for p in self.rounds[-1] if name in p), None)
+        if pair is None:
+            raise ValueError(f"{name} isn't playing this round")
+        if BYE in pair:
+            raise ValueError(f"{name} has the bye this round")
+        opponent = next(p for p in pair if p != name)
+        self._record_result(name, opponent, games, opponent_games)
+        return opponent
 
     def _evaluate_round(self, potential_round: List[FrozenSet[str]]) -> int:
-        matchup_scores = dict()
-        for i, previous_round in enumerate(self.rounds):
-            for pair in previous_round:
-                if pair not in matchup_scores:
-                    matchup_scores[pair] = i + 1
-                else:
-                    matchup_scores[pair] *= i + 1  # We want to heavily penalize recent matchups
-
-        score = 0
-        for pair in potential_round:
-            if pair in matchup_scores:
-                score += matchup_scores[pair]
-
-        print(f"Total score for round {potential_round} is {score}")
-        return score
+        return self.history.score(potential_round)
 
     def next_round(self) -> List[FrozenSet[str]]:
-        if len(self.rounds) == 0:
-            new_round = self._generate_round()
-        else:
-            potential_rounds = []
-            for _ in range(100):
-                r = self._generate_round()
-                potential_rounds.append((r, self._evaluate_round(r)))
+        new_round = pair_players(self.players, self.history, {p: self.standings.points(p) for p in self.players})
+        logging.debug(f"Round {len(self.rounds) + 1} pairings have a penalty of {self._evaluate_round(new_round)}")
+        self._record_round(new_round)
+        return new_round
 
-            potential_rounds.sort(key=lambda x: x[1])  # Sort by lowest (best) scores
-            new_round = potential_rounds[0][0]
 
-        self.rounds.append(new_round)
-        return new_round
+class ActiveTournament(object):
+    __slots__ = ('tournament', 'guild_id', 'channel_id', 'lock', 'serial')
+
+    tournament: Tournament
+    guild_id: int  # 0 in DMs
+    channel_id: int
+    lock: asyncio.Lock  # Held while a command changes the tournament
+    serial: int  # Tells apart the tournaments run one after another in the same channel
+
+    _serials = itertools.count()
+
+    def __init__(self, tournament: Tournament, guild_id: int, channel_id: int):
+        self.tournament = tournament
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.lock = asyncio.Lock()
+        self.serial = next(ActiveTournament._serials)
+
+    @property
+    def key(self) -> str:
+        return f"{self.guild_id}:{self.channel_id}"
+
+
+class TournamentRegistry(object):
+    """
+    Active tournaments, sharded by guild and then keyed by channel id, so finding the tournament of a command is two
+    dict lookups no matter how many events are running across guilds
+    """
+    _guilds: Dict[int, Dict[int, ActiveTournament]]
+
+    def __init__(self):
+        self._guilds = {}
+
+    def __len__(self):
+        return sum(len(channels) for channels in self._guilds.values())
+
+    def get(self, guild_id: int, channel_id: int) -> Optional[ActiveTournament]:
+        channels = self._guilds.get(guild_id)
+        return channels.get(channel_id) if channels else None
+
+    def add(self, active: ActiveTournament):
+        self._guilds.setdefault(active.guild_id, {})[active.channel_id] = active
+
+    def remove(self, guild_id: int, channel_id: int) -> Optional[ActiveTournament]:
+        channels = self._guilds.get(guild_id)
+        if not channels:
+            return None
+        active = channels.pop(channel_id, None)
+        if not channels:
+            del self._guilds[guild_id]
+        return active
+
+
+def context_key(ctx: Union[InteractionContext, AutocompleteContext]) -> Tuple[int, int]:
+    """
+    Returns the (guild id, channel id) a command was used in. Read from the interaction itself, since the channel
+    object is only set when it happens to be cached
+    """
+    return int(ctx.guild_id or 0), int(ctx.data['channel_id'])
 
 
-class TournamentScale(Scale):
-    active_tournaments: List[Tuple[Tournament, GuildChannel]]
+class TournamentScale(ShardScale):
+    active_tournaments: TournamentRegistry
+    autocomplete_cache: LRUCache
+    store: StateStore
 
     def __init__(self, client: Snake):
         self.client = client
-        self.active_tournaments = []
-
-    async def valid_tournaments_check(self, ctx: InteractionContext) -> bool:
-        if len(self.active_tournaments) == 0:
-            await ctx.send(f"Error: There are no active tournaments")
-            return False
-        tournament = next(filter(lambda t: t[1] == ctx.channel, self.active_tournaments), None)
-        if not tournament:
+        self.active_tournaments = TournamentRegistry()
+        self.autocomplete_cache = LRUCache(maxsize=512)
+        self.store = get_store()
+        self.state_kind = shard_kind('tournament', client)
+        self._started = False
+
+    @listen()
+    async def on_startup(self):
+        if self._started:
+            return  # Already restored
+        self._started = True
+        await self.store.connect()
+        for key, data in (await self.store.load(self.state_kind)).items():
+            guild_id, channel_id = map(int, key.split(':'))
+            self.active_tournaments.add(ActiveTournament(Tournament.from_dict(data), guild_id, channel_id))
+        logging.info(f"Restored {len(self.active_tournaments)} tournaments")
+
+    def save(self, active: ActiveTournament):
+        self.store.put(self.state_kind, active.key, active.tournament.to_dict())
+
+    async def active_tournament(self, ctx: InteractionContext) -> Optional[ActiveTournament]:
+        """
+        Finds the tournament running in the channel of a command, telling the user if there isn't one
+        """
+        active = self.active_tournaments.get(*context_key(ctx))
+        if not active:
             await ctx.send(f"Error: There is no active tournament in this channel")
-            return False
-        return True
+        return active
 
     @slash_command(
         name="tournament",
@@ -95,11 +232,13 @@ class TournamentScale(Scale):
         sub_cmd_description="Create a new Glorybound tournament in this channel",
     )
     async def tournament(self, ctx: InteractionContext):
-        tournament = next(filter(lambda t: t[1] == ctx.channel, self.active_tournaments), None)
-        if tournament:
+        guild_id, channel_id = context_key(ctx)
+        if self.active_tournaments.get(guild_id, channel_id):
             await ctx.send(f"Error: There is already an active tournament in this channel")
             return
-        self.active_tournaments.append((Tournament(ctx.author), ctx.channel))
+        active = ActiveTournament(Tournament(ctx.author), guild_id, channel_id)
+        self.active_tournaments.add(active)
+        self.save(active)
         await ctx.send(f"New tournament created by {ctx.author.mention}")
 
     @tournament.subcommand(sub_cmd_name="add",
@@ -116,17 +255,14 @@ class TournamentScale(Scale):
         :param player_name: Name of the player to be added (as a string)
         :sends: A message confirming that the player has been added
         """
-        if len(self.active_tournaments) == 0:
-            await ctx.send(f"Error: There are no active tournaments")
-            return
-        tournament = next(filter(lambda t: t[1] == ctx.channel, self.active_tournaments), None)
-        if not tournament:
-            await ctx.send(f"Error: There is no active tournament in this channel")
+        active = await self.active_tournament(ctx)
+        if not active:
             return
-
-        tournament_obj: Tournament = tournament[0]
+        tournament_obj = active.tournament
         try:
-            tournament_obj.add(player_name)
+            async with active.lock:
+                tournament_obj.add(player_name)
+                self.save(active)
             await ctx.send(f"{player_name} added to the tournament!")
         except ValueError:
             await ctx.send(f"Error: {player_name} is already in the tournament")
@@ -146,46 +282,86 @@ class TournamentScale(Scale):
         :sends: A message confirming that the player has been removed,
                 or an error message stating that the player is not part of the tournament.
         """
-        if len(self.active_tournaments) == 0:
-            await ctx.send(f"Error: There are no active tournaments")
-            return
-        tournament = next(filter(lambda t: t[1] == ctx.channel, self.active_tournaments), None)
-        if not tournament:
-            await ctx.send(f"Error: There is no active tournament in this channel")
+        active = await self.active_tournament(ctx)
+        if not active:
             return
-
-        tournament_obj: Tournament = tournament[0]
+        tournament_obj = active.tournament
         try:
-            tournament_obj.remove(player_name)
+            async with active.lock:
+                tournament_obj.remove(player_name)
+                self.save(active)
             await ctx.send(f"{player_name} removed from the tournament")
         except ValueError:
             await ctx.send(f"Error: {player_name} is not in the tournament")
 
+    @tournament.subcommand(sub_cmd_name="report",
+                           sub_cmd_description="Reports the result of a match in the current round")
+    @slash_option(name="player_name",
+                  opt_type=OptionTypes.STRING,
+                  description="Player reporting the result",
+                  required=True)
+    @slash_option(name="games_won",
+                  opt_type=OptionTypes.INTEGER,
+                  description="Games won by the player",
+                  required=True,
+                  min_value=0)
+    @slash_option(name="games_lost",
+                  opt_type=OptionTypes.INTEGER,
+                  description="Games won by their opponent",
+                  required=True,
+                  min_value=0)
+    async def tournament_report(self, ctx: InteractionContext, player_name: str, games_won: int, games_lost: int):
+        """
+        Records the result of a player's match in the current round. Reporting again corrects the result
+
+        :param ctx: The invoked InteractionContext
+        :param player_name: Name of the player reporting the result
+        :param games_won: Games won by the player
+        :param games_lost: Games won by their opponent
+        :sends: A message confirming the result, or an error message if the player has no match this round
+        """
+        active = await self.active_tournament(ctx)
+        if not active:
+            return
+        tournament_obj = active.tournament
+        try:
+            async with active.lock:
+                opponent = tournament_obj.report(player_name, games_won, games_lost)
+                self.save(active)
+        except ValueError as e:
+            await ctx.send(f"Error: {e}")
+            return
+        if games_won == games_lost:
+            await ctx.send(f"**{player_name}** and **{opponent}** drew {games_won}-{games_lost}")
+        else:
+            winner, loser = (player_name, opponent) if games_won > games_lost else (opponent, player_name)
+            await ctx.send(f"**{winner}** beat **{loser}** {max(games_won, games_lost)}-{min(games_won, games_lost)}")
+
     @tournament_remove.autocomplete("player_name")
-    async def autocomplete_players(self, ctx: AutocompleteContext, player_name: str):
-        tournament = next(filter(lambda t: t[1] == ctx.channel, self.active_tournaments), None)
-        print(tournament)
-        if tournament:
-            players = [{'name': p, 'value': p} for p in tournament[0].players]
-            print(players)
+    @tournament_report.autocomplete("player_name")
+    async def autocomplete_players(self, ctx: AutocompleteContext, player_name: str, **kwargs):
+        active = self.active_tournaments.get(*context_key(ctx))
+        if active:
+            tournament_obj = active.tournament
+            players = self.autocomplete_cache.get_or_compute(
+                (active.key, active.serial, tournament_obj.version, normalize(player_name)),
+                lambda: [{'name': p, 'value': p} for p in tournament_obj.matching_players(player_name)])
             await ctx.send(choices=players)
         else:
-            return ctx.send(choices=[])
+            await ctx.send(choices=[])
 
     @tournament.subcommand(sub_cmd_name="next_round",
                            sub_cmd_description="Starts the next round of the tournament")
     async def tournament_next_round(self, ctx: InteractionContext):
-        if len(self.active_tournaments) == 0:
-            await ctx.send(f"Error: There are no active tournaments")
-            return
-        tournament = next(filter(lambda t: t[1] == ctx.channel, self.active_tournaments), None)
-        if not tournament:
-            await ctx.send(f"Error: There is no active tournament in this channel")
+        active = await self.active_tournament(ctx)
+        if not active:
             return
-
-        tournament_obj: Tournament = tournament[0]
-
-        new_round = tournament_obj.next_round()
+        tournament_obj = active.tournament
+        async with active.lock:
+            # Pairing a large event takes a while, so it runs on a worker thread. The lock keeps other commands from
+            # changing the tournament in the meantime
+            new_round = await asyncio.get_event_loop().run_in_executor(None, tournament_obj.next_round)
+            self.save(active)
         message_txt = f"Round {len(tournament_obj.rounds)} pairings:"
         for pair in new_round:
             p = list(pair)
@@ -196,6 +372,26 @@ class TournamentScale(Scale):
 
         await ctx.send(message_txt)
 
+    @tournament.subcommand(sub_cmd_name="standings",
+                           sub_cmd_description="Shows the current standings of the tournament")
+    async def tournament_standings(self, ctx: InteractionContext):
+        active = await self.active_tournament(ctx)
+        if not active:
+            return
+        tournament_obj = active.tournament
+        async with active.lock:  # Not while a round is being paired or a result recorded
+            standings = tournament_obj.standings.ranked(tournament_obj.players)
+            message_txt = f"Standings after round {len(tournament_obj.rounds)}:"
+        for rank, s in enumerate(standings, start=1):
+            line = (f"\n{rank}. **{s.name}** {s.points} pts ({s.wins}-{s.losses}-{s.draws})"
+                    f"  OMW {float(s.omw):.1%}  GW {float(s.gw):.1%}  OGW {float(s.ogw):.1%}")
+            if len(message_txt) + len(line) > 1900:  # Discord messages are limited to 2000 characters
+                message_txt += f"\n... and {len(standings) - rank + 1} more"
+                break
+            message_txt += line
+
+        await ctx.send(message_txt)
+
 
 def setup(snek):
     TournamentScale(snek)